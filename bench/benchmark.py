@@ -0,0 +1,320 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'code'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'run'))
+import optimize
+import optimize2
+import optimize_graph
+from cost_kernel import batch_total_costs
+from lp_solver import solve_fuel_mix_lp
+from scenario_runner import scenario_inputs, run_scenarios
+from run import base_scenarios, build_scenarios
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Benchmarks for the cost kernel, the optimizers and the run.py sweep.
+#   kernel: objective evaluations per second (scalar and batched)
+#   solve:  one optimize_fuel_mix solve per fuel set, with the gap to the exact
+#           optimum where one is available (lp_solver.py, optimize2 model)
+#   sweep:  the full run.py year x CO2 price sweep, result cache disabled
+#   startup: fresh interpreters running run.py --help, importing the optimizers
+#           and answering one run.py scenario from the result cache; each must
+#           finish within --startup-budget seconds
+# Every level runs in a fresh interpreter and records its wall time and peak RSS:
+# that of the level's own process and, separately, the largest of the processes it
+# started (the sweep's pool, the startup commands). --save-baseline stores the results
+# and later runs are compared against them: timings that got worse by more than
+# --tolerance and costs that got worse by more than --quality-tolerance are
+# flagged and the exit status is 1.
+
+bench_dir = os.path.dirname(os.path.abspath(__file__))
+default_baseline = os.path.join(bench_dir, 'baseline.json')
+code_dir = os.path.join(bench_dir, '..', 'code')
+run_dir = os.path.join(bench_dir, '..', 'run')
+
+# Fresh-interpreter commands of the startup level
+cached_scenario_script = (
+    "from scenario_runner import run_scenarios\n"
+    "from run import base_scenarios, build_scenarios\n"
+    "run_scenarios(build_scenarios(base_scenarios, 200.8)[:1], processes=1)\n"
+)
+startup_commands = {
+    'run.py --help': [os.path.join(run_dir, 'run.py'), '--help'],
+    'import optimizers': ['-c', 'import optimize, optimize2, optimize_graph, graphicRepresentation'],
+    'cached scenario': ['-c', cached_scenario_script]
+}
+
+# Fuel sets of graphicRepresentation.py plus every fuel at once
+fuel_sets = [
+    ['LNG', 'MDO', 'VLSFO'],
+    ['VLSFO', 'MDO', 'BIO-DIESEL'],
+    ['HFO', 'VLSFO', 'MDO', 'BIO-DIESEL', 'LNG', 'E-METHANOL']
+]
+
+# Direction of each metric: +1 when higher is better, -1 when lower is better
+metric_directions = {
+    'evals_per_sec': 1,
+    'wall_time': -1,
+    'peak_rss_mb': -1,
+    'children_peak_rss_mb': -1,
+    'gap': -1,
+    'total_cost': -1
+}
+
+# High-water mark of this process (RUSAGE_SELF) or of its largest finished child (RUSAGE_CHILDREN)
+def peak_rss_mb(who='self'):
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    scale = 1 if sys.platform == 'darwin' else 1024
+    usage = resource.getrusage(resource.RUSAGE_SELF if who == 'self' else resource.RUSAGE_CHILDREN).ru_maxrss
+    return usage * scale / 1024 / 1024
+
+def fast_inputs():
+    year, CO2_price_per_ton, cost_per_MWh, E_totals, _, _, OPS_flags, OPS_details, fwind, densities = optimize_graph.get_user_input_FAST()
+    return {
+        'E_totals': E_totals,
+        'densities': densities,
+        'OPS_flags': OPS_flags,
+        'OPS_details': OPS_details,
+        'year': year,
+        'CO2_price_per_ton': CO2_price_per_ton,
+        'fwind': fwind,
+        'cost_per_MWh': cost_per_MWh
+    }
+
+# Best of `repeat` runs of `number` calls, as evaluations per second
+def evals_per_sec(function, number, repeat, evaluations_per_call=1):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        best = min(best, time.perf_counter() - start)
+    return number * evaluations_per_call / best
+
+############################## LEVELS ##############################
+def bench_kernel(repeat, seed):
+    rng = np.random.default_rng(seed)
+    inputs = fast_inputs()
+    args = (inputs['E_totals'], fuel_sets[-1], inputs['densities'], inputs['OPS_flags'], inputs['OPS_details'],
+            inputs['year'], inputs['CO2_price_per_ton'], inputs['fwind'], inputs['cost_per_MWh'])
+    population = rng.uniform(0, 100, (1500, len(fuel_sets[-1])))
+    x = population[0]
+
+    scenario = build_scenarios(base_scenarios, 200.8)[1]
+    fixed = scenario_inputs(scenario)
+    fixed_args = tuple(fixed[name] for name in ('E_totals', 'fuel_types', 'densities', 'fixed_fuel', 'MDO_tonnes', 'OPS_flags',
+                                                'OPS_details', 'year', 'CO2_price_per_ton', 'fwind', 'cost_per_MWh'))
+    fixed_x = rng.uniform(0, 50, len(fixed['fuel_types']))
+
+    results = {
+        'optimize2.objective_function': {
+            'evals_per_sec': evals_per_sec(lambda: optimize2.objective_function(x, *args), 2000, repeat)
+        },
+        'optimize_graph.objective_function': {
+            'evals_per_sec': evals_per_sec(lambda: optimize_graph.objective_function(x, *args), 2000, repeat)
+        },
+        'cost_kernel.batch_total_costs': {
+            'evals_per_sec': evals_per_sec(lambda: batch_total_costs(population, *args), 20, repeat, len(population))
+        },
+        'optimize.objective_function': {
+            'evals_per_sec': evals_per_sec(lambda: optimize.objective_function(fixed_x, *fixed_args), 2000, repeat)
+        }
+    }
+    return results
+
+def bench_solve(seed):
+    inputs = fast_inputs()
+    results = {}
+    for fuel_types in fuel_sets:
+        reference = solve_fuel_mix_lp(fuel_types=fuel_types, **inputs)
+        start = time.perf_counter()
+        result = optimize2.optimize_fuel_mix(fuel_types=fuel_types, verbose=False, seed=seed, **inputs)
+        wall_time = time.perf_counter() - start
+        results['optimize2 ' + '-'.join(fuel_types)] = {
+            'wall_time': wall_time,
+            'nfev': result.nfev,
+            'total_cost': result.total_cost,
+            'reference_cost': reference.fun,
+            'gap': (result.total_cost - reference.fun) / abs(reference.fun)
+        }
+
+    # One run.py scenario per fuel set (no exact reference for the fixed-MDO model)
+    for index, scenario in enumerate(build_scenarios(base_scenarios, 200.8)[:len(base_scenarios)]):
+        start = time.perf_counter()
+        result = optimize.optimize_fuel_mix(**scenario_inputs(scenario), verbose=False, workers=1, seed=seed)
+        results[f"optimize run.py scenario {index + 1}"] = {
+            'wall_time': time.perf_counter() - start,
+            'nfev': result.nfev,
+            'total_cost': result.total_cost
+        }
+    return results
+
+def bench_startup(repeat):
+    # Every command runs from a neutral directory, with a private result cache that
+    # is filled by one untimed run
+    with tempfile.TemporaryDirectory() as directory:
+        env = dict(os.environ, MARITIME_RESULT_CACHE_DIR=os.path.join(directory, 'cache'))
+        env['PYTHONPATH'] = os.pathsep.join([code_dir, run_dir] + ([env['PYTHONPATH']] if env.get('PYTHONPATH') else []))
+        def run(arguments):
+            start = time.perf_counter()
+            subprocess.run([sys.executable] + arguments, cwd=directory, env=env, check=True, stdout=subprocess.DEVNULL)
+            return time.perf_counter() - start
+
+        run(startup_commands['cached scenario'])
+        return {name: {'wall_time': min(run(arguments) for _ in range(repeat))} for name, arguments in startup_commands.items()}
+
+def over_budget(results, budget):
+    return [
+        f"startup/{name}/wall_time: {metrics['wall_time']:.3g} s > budget {budget:.3g} s"
+        for name, metrics in results['levels'].get('startup', {}).items()
+        if name != 'level total' and metrics['wall_time'] > budget
+    ]
+
+def bench_sweep(processes, seed):
+    scenarios = build_scenarios(base_scenarios, 200.8)
+    start = time.perf_counter()
+    run_scenarios(scenarios, processes=processes, base_seed=seed, use_cache=False, keep_results=False)
+    return {'run.py sweep': {'wall_time': time.perf_counter() - start, 'scenarios': len(scenarios)}}
+
+def run_level(level, args):
+    start = time.perf_counter()
+    if level == 'kernel':
+        results = bench_kernel(args.repeat, args.seed)
+    elif level == 'solve':
+        results = bench_solve(args.seed)
+    elif level == 'startup':
+        results = bench_startup(args.repeat)
+    else:
+        results = bench_sweep(args.processes, args.seed)
+    results['level total'] = {
+        'wall_time': time.perf_counter() - start,
+        'peak_rss_mb': peak_rss_mb('self'),
+        'children_peak_rss_mb': peak_rss_mb('children')
+    }
+    return results
+
+# Runs one level in a fresh interpreter, so its peak RSS is its own and not the
+# high-water mark left by the levels before it
+def run_level_subprocess(level, args):
+    with tempfile.TemporaryDirectory() as directory:
+        output = os.path.join(directory, 'level.json')
+        arguments = [os.path.abspath(__file__), '--level-worker', level, '--level-output', output,
+                     '--repeat', str(args.repeat), '--seed', str(args.seed)]
+        if args.processes is not None:
+            arguments += ['--processes', str(args.processes)]
+        subprocess.run([sys.executable] + arguments, check=True)
+        with open(output) as f:
+            return json.load(f)
+###############################################################################
+
+############################## BASELINES ##############################
+def compare(results, baseline, tolerance, quality_tolerance):
+    # Metrics that moved the wrong way by more than the tolerance
+    regressions = []
+    for level, benchmarks in results['levels'].items():
+        for name, metrics in benchmarks.items():
+            base_metrics = baseline.get('levels', {}).get(level, {}).get(name, {})
+            for metric, value in metrics.items():
+                direction = metric_directions.get(metric)
+                base_value = base_metrics.get(metric)
+                if direction is None or base_value is None or value is None:
+                    continue
+                if metric == 'gap':
+                    # Gaps are ~0 when healthy, so they are compared in absolute terms
+                    worse = value - base_value > quality_tolerance
+                elif metric == 'total_cost':
+                    worse = (value - base_value) / abs(base_value) > quality_tolerance
+                else:
+                    change = (value - base_value) / abs(base_value) if base_value else 0
+                    worse = direction * change < -tolerance
+                if worse:
+                    regressions.append(f"{level}/{name}/{metric}: {base_value:.6g} -> {value:.6g}")
+    return regressions
+
+def print_results(results):
+    for level, benchmarks in results['levels'].items():
+        print(f"\n[{level}]")
+        for name, metrics in benchmarks.items():
+            formatted = ", ".join(f"{metric}={value:.6g}" for metric, value in metrics.items() if value is not None)
+            print(f"  {name}: {formatted}")
+###############################################################################
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the cost kernel, the optimizers and the run.py sweep.")
+    parser.add_argument('--levels', nargs='+', choices=['kernel', 'solve', 'sweep', 'startup'], default=['kernel', 'solve'],
+                        help="Levels to run (the sweep takes minutes and is off by default)")
+    parser.add_argument('--repeat', type=int, default=3, help="Repeats of each kernel timing, the best is kept")
+    parser.add_argument('--seed', type=int, default=0, help="Seed of every solve and random population")
+    parser.add_argument('--processes', type=int, default=None, help="Process pool size of the sweep")
+    parser.add_argument('--baseline', default=default_baseline, help="Baseline file to compare against or save to")
+    parser.add_argument('--save-baseline', action='store_true', help="Store these results as the new baseline")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="Relative slowdown that counts as a regression")
+    parser.add_argument('--quality-tolerance', type=float, default=1e-6, help="Relative cost increase that counts as a regression")
+    parser.add_argument('--output', default=None, help="Also write the results to this JSON file")
+    parser.add_argument('--startup-budget', type=float, default=1.0, help="Seconds each startup command may take")
+    # Internal: run one level in this process and write its results to --level-output
+    parser.add_argument('--level-worker', choices=['kernel', 'solve', 'sweep', 'startup'], default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--level-output', default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.level_worker is not None:
+        with open(args.level_output, 'w') as f:
+            json.dump(run_level(args.level_worker, args), f)
+        return
+
+    results = {
+        'machine': {
+            'platform': platform.platform(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'cpus': os.cpu_count()
+        },
+        'seed': args.seed,
+        'levels': {}
+    }
+    for level in args.levels:
+        results['levels'][level] = run_level_subprocess(level, args)
+
+    print_results(results)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=4)
+
+    budget_failures = over_budget(results, args.startup_budget)
+    if budget_failures:
+        print("\nStartup over budget:")
+        for failure in budget_failures:
+            print(f"  {failure}")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=4)
+        print(f"\nBaseline saved to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance, args.quality_tolerance)
+        if regressions:
+            print("\nRegressions against the baseline:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print("\nNo regressions against the baseline.")
+    if budget_failures:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+import numpy as np
+from cost_kernel import mix_coefficients, linear_costs, GHGi_mix, fuel_eu_penalty, ops_costs
+from lp_solver import fixed_candidates, stationary_blend, blend_mix
+
+# Parametric CO2 price sweep for the optimize2.py model. For a fixed fuel set and
+# year the only CO2 price dependence is the EU ETS term, which is linear in the
+# price, so every candidate of the exact solver (lp_solver.py) costs
+#     a + b * CO2_price
+# along the sweep:
+#   - single fuels and pair kinks (the vertices of the compliant LP) keep the same
+#     mix, with b the ETS-counted CO2 tonnes (x 0.7 in 2025);
+#   - pair stationary points move with the price but stay in closed form.
+# The optimum is the lower envelope of these candidates. Its breakpoints are the
+# CO2 prices where the winning candidate changes; between two breakpoints the
+# optimal mix is fixed and the cost is a straight line (or, on a blend segment,
+# the closed-form stationary blend), so a dense price curve costs about as much
+# as a few solves.
+
+############################## CANDIDATES ##############################
+def _mix_costs(X, CO2_prices, coefficients, fwind, OPS_total):
+    # Total cost of mix X[k] at CO2_prices[k]
+    costs_0 = linear_costs(coefficients, 0)
+    costs_1 = linear_costs(coefficients, 1) - costs_0
+    _, Fuel_EU_penalty = fuel_eu_penalty(GHGi_mix(X, coefficients), coefficients, fwind)
+    return X @ costs_0 + CO2_prices * (X @ costs_1) + Fuel_EU_penalty + OPS_total
+
+def _blend_at(coefficients, i, j, CO2_prices, fwind, n_fuels):
+    # Stationary blend of pair (i, j) at each CO2 price (nan where there is none)
+    costs_0 = linear_costs(coefficients, 0)
+    costs_1 = linear_costs(coefficients, 1) - costs_0
+    lam = stationary_blend(
+        coefficients, i, j,
+        costs_0[i] + CO2_prices * costs_1[i],
+        costs_0[j] + CO2_prices * costs_1[j],
+        fwind
+    )
+    return lam, blend_mix(n_fuels, i, j, np.nan_to_num(lam))
+###############################################################################
+
+############################## ENVELOPE ##############################
+class _Sweep:
+    def __init__(self, E_totals, fuel_types, densities, OPS_flags, OPS_details, year, fwind, cost_per_MWh):
+        self.fuel_types = list(fuel_types)
+        self.n_fuels = len(fuel_types)
+        self.fwind = fwind
+        self.coefficients = mix_coefficients(E_totals, fuel_types, densities, OPS_flags, year)
+        OPS_penalty, OPS_cost = ops_costs(E_totals, OPS_flags, OPS_details, cost_per_MWh)
+        self.OPS_total = OPS_cost + OPS_penalty
+
+        # Lines a + b * CO2_price of the fixed candidates
+        self.fixed_mixes, self.fixed_pairs = fixed_candidates(self.coefficients, self.n_fuels)
+        self.intercepts = _mix_costs(self.fixed_mixes, 0, self.coefficients, fwind, self.OPS_total)
+        self.slopes = _mix_costs(self.fixed_mixes, 1, self.coefficients, fwind, self.OPS_total) - self.intercepts
+        self.blend_pairs = [(i, j) for i in range(self.n_fuels) for j in range(i + 1, self.n_fuels)]
+
+    def candidate_costs(self, CO2_prices):
+        # (P, K) cost of every candidate at every price, fixed candidates first
+        CO2_prices = np.asarray(CO2_prices, dtype=float)
+        columns = [self.intercepts + np.outer(CO2_prices, self.slopes)]
+        for i, j in self.blend_pairs:
+            lam, X = _blend_at(self.coefficients, i, j, CO2_prices, self.fwind, self.n_fuels)
+            costs = _mix_costs(X, CO2_prices, self.coefficients, self.fwind, self.OPS_total)
+            columns.append(np.where(np.isnan(lam), np.inf, costs)[:, np.newaxis])
+        return np.hstack(columns)
+
+    def crossing(self, low, high, label_low, label_high):
+        # CO2 price in [low, high] where candidate label_high starts beating label_low
+        n_fixed = len(self.intercepts)
+        if label_low < n_fixed and label_high < n_fixed:
+            # Two straight lines meet in closed form
+            return (self.intercepts[label_high] - self.intercepts[label_low]) / (self.slopes[label_low] - self.slopes[label_high])
+        for _ in range(60):
+            middle = (low + high) / 2
+            costs = self.candidate_costs([middle])[0]
+            if costs[label_high] < costs[label_low]:
+                high = middle
+            else:
+                low = middle
+        return (low + high) / 2
+
+    def segment(self, label, CO2_price_from, CO2_price_to):
+        n_fixed = len(self.intercepts)
+        if label < n_fixed:
+            pair = self.fixed_pairs[label]
+            return {
+                'CO2_price_from': CO2_price_from,
+                'CO2_price_to': CO2_price_to,
+                'kind': 'fixed',
+                'fuels': [self.fuel_types[k] for k in (pair or np.flatnonzero(self.fixed_mixes[label]))],
+                'x': self.fixed_mixes[label],
+                'cost_intercept': float(self.intercepts[label]),
+                'cost_slope': float(self.slopes[label])
+            }
+        i, j = self.blend_pairs[label - n_fixed]
+        return {
+            'CO2_price_from': CO2_price_from,
+            'CO2_price_to': CO2_price_to,
+            'kind': 'blend',
+            'fuels': [self.fuel_types[i], self.fuel_types[j]],
+            'x': None,
+            'cost_intercept': None,
+            'cost_slope': None,
+            'label': label
+        }
+
+    def evaluate(self, segment, CO2_prices):
+        # Optimal cost and mix on one segment, in closed form
+        if segment['kind'] == 'fixed':
+            costs = segment['cost_intercept'] + segment['cost_slope'] * CO2_prices
+            return costs, np.tile(segment['x'], (len(CO2_prices), 1))
+        i, j = self.blend_pairs[segment['label'] - len(self.intercepts)]
+        _, X = _blend_at(self.coefficients, i, j, CO2_prices, self.fwind, self.n_fuels)
+        return _mix_costs(X, CO2_prices, self.coefficients, self.fwind, self.OPS_total), X
+###############################################################################
+
+def _segments(sweep, CO2_price_min, CO2_price_max, resolution):
+    # Winning candidate on a grid that contains every line-line crossing in range,
+    # so only a blend segment shorter than the grid spacing can be missed
+    grid = [np.linspace(CO2_price_min, CO2_price_max, resolution)]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        crossings = (sweep.intercepts[:, np.newaxis] - sweep.intercepts) / (sweep.slopes - sweep.slopes[:, np.newaxis])
+    crossings = crossings[np.isfinite(crossings) & (crossings > CO2_price_min) & (crossings < CO2_price_max)]
+    grid = np.unique(np.concatenate(grid + [crossings]))
+    labels = np.argmin(sweep.candidate_costs(grid), axis=1)
+
+    segments = []
+    start = CO2_price_min
+    for k in range(1, len(grid)):
+        if labels[k] != labels[k - 1]:
+            breakpoint = sweep.crossing(grid[k - 1], grid[k], labels[k - 1], labels[k])
+            breakpoint = float(min(max(breakpoint, grid[k - 1]), grid[k]))
+            segments.append(sweep.segment(labels[k - 1], start, breakpoint))
+            start = breakpoint
+    segments.append(sweep.segment(labels[-1], start, CO2_price_max))
+    # Neighbouring grid points may hand over at the same price
+    return [segment for segment in segments if segment['CO2_price_to'] > segment['CO2_price_from']] or segments[-1:]
+
+# Breakpoints and segments of the optimal cost on [CO2_price_min, CO2_price_max].
+# Each segment holds its fuels and, for a fixed mix, the mix x and the line
+# cost = cost_intercept + cost_slope * CO2_price.
+def co2_price_breakpoints(E_totals, fuel_types, densities, OPS_flags, OPS_details, year, fwind, cost_per_MWh, CO2_price_min, CO2_price_max, resolution=256):
+    if CO2_price_max < CO2_price_min:
+        raise ValueError("CO2_price_max must not be below CO2_price_min.")
+    sweep = _Sweep(E_totals, fuel_types, densities, OPS_flags, OPS_details, year, fwind, cost_per_MWh)
+    segments = _segments(sweep, float(CO2_price_min), float(CO2_price_max), resolution)
+    return {
+        'breakpoints': [segment['CO2_price_from'] for segment in segments[1:]],
+        'segments': segments
+    }
+
+# Optimal cost and mix at every CO2 price, evaluated segment by segment
+def sweep_co2_prices(CO2_prices, E_totals, fuel_types, densities, OPS_flags, OPS_details, year, fwind, cost_per_MWh, resolution=256):
+    CO2_prices = np.asarray(CO2_prices, dtype=float)
+    if CO2_prices.size == 0:
+        raise ValueError("At least one CO2 price is required.")
+    sweep = _Sweep(E_totals, fuel_types, densities, OPS_flags, OPS_details, year, fwind, cost_per_MWh)
+    segments = _segments(sweep, float(CO2_prices.min()), float(CO2_prices.max()), resolution)
+
+    total_costs = np.empty(len(CO2_prices))
+    mixes = np.empty((len(CO2_prices), sweep.n_fuels))
+    edges = np.array([segment['CO2_price_from'] for segment in segments[1:]])
+    segment_index = np.searchsorted(edges, CO2_prices, side='right')
+    for k, segment in enumerate(segments):
+        mask = segment_index == k
+        if mask.any():
+            total_costs[mask], mixes[mask] = sweep.evaluate(segment, CO2_prices[mask])
+
+    return {
+        'CO2_prices': CO2_prices,
+        'total_cost': total_costs,
+        'x': mixes,
+        'breakpoints': [segment['CO2_price_from'] for segment in segments[1:]],
+        'segments': segments
+    }
@@ -0,0 +1,311 @@
+import numpy as np
+from fuel_calculations import calculate_GHGi_target
+from fuel_table import fuel_table
+
+# Batched versions of the cost functions in fuel_calculations.py. A population of
+# S candidate mixes over F fuels is an (S, F) array and every quantity is an (S,)
+# array, so a whole differential_evolution generation is evaluated in one pass.
+# The arithmetic follows the scalar path in the same order, so a single row gives
+# the same value as objective_function in optimize2.py.
+
+MJ_to_MWh = 0.0002777778  # Conversion factor from MJ to MWh (as in berth_scenario)
+trip_types = ['intra-eu', 'inter-eu', 'berth']
+# FuelEU remedial penalty: 2400 EUR per tonne of VLSFO-equivalent (41000 MJ) of deficit
+penalty_per_tonne_VLSFO = 2400
+VLSFO_MJ_per_tonne = 41000
+
+############################## FUEL PROPERTIES ##############################
+def fuel_property_arrays(fuel_types, densities, year, table=None):
+    # Columns of the compiled fuel table (see fuel_table.py), built once per (year, fuel set);
+    # a solve passes the table it built so the factor files are not checked per call
+    if table is None:
+        table = fuel_table(fuel_types, year, densities)
+    return table.lcv, table.wtw, table.co2, table.price
+###############################################################################
+
+############################## MIX TO FUEL AMOUNTS ##############################
+def normalize_percentages(X):
+    # Rescale rows that sum above 100%, leave the others untouched
+    sums = X.sum(axis=1, keepdims=True)
+    return np.where(sums > 100, X / sums * 100, X)
+
+def calculate_fuel_amounts(percentages, E_total, lcv):
+    return (percentages / 100 * E_total) / lcv
+
+def ops_costs(E_totals, OPS_flags, OPS_details, cost_per_MWh):
+    if OPS_flags['berth']:
+        OPS_penalty = 1.5 * OPS_details['berth']['established_power_demand'] * OPS_details['berth']['hours_at_berth']
+        OPS_cost = E_totals['berth'] * MJ_to_MWh * cost_per_MWh
+        return OPS_penalty, OPS_cost
+    return 0, 0
+###############################################################################
+
+############################## COST KERNEL ##############################
+def fuel_eu_penalty_rate(GHGi_actual):
+    # FuelEU penalty per gCO2eq of compliance deficit
+    return penalty_per_tonne_VLSFO / (GHGi_actual * VLSFO_MJ_per_tonne)
+
+def fuel_eu_penalty_amount(deficit, GHGi_actual):
+    # Penalty of a compliance deficit (>= 0), in the operation order of calculate_Fuel_EU_Penalty
+    return deficit / (GHGi_actual * VLSFO_MJ_per_tonne) * penalty_per_tonne_VLSFO
+
+def GHGi_actual(fuel_amounts, wtw):
+    # Mass-weighted intensity of one trip's (S, F) fuel amounts
+    fuel_percentages = fuel_amounts / fuel_amounts.sum(axis=1, keepdims=True) * 100
+    return ((fuel_percentages / 100) * wtw).sum(axis=1)
+
+def mix_fuel_amounts(percentages, E_totals, lcv, OPS_flags):
+    # Tonnes of each fuel per trip type; the berth burns nothing under OPS
+    fuel_amounts = {}
+    for trip_type in trip_types:
+        fuel_amounts[trip_type] = calculate_fuel_amounts(percentages, E_totals[trip_type], lcv)
+    if OPS_flags['berth']:
+        fuel_amounts['berth'] = np.zeros_like(percentages)
+    return fuel_amounts
+
+# Cost components, one function each so a traced solve times them separately and
+# evaluation_graph.py can cache the intermediate quantities
+def batch_fuel_costs(amounts_intra, amounts_inter, amounts_berth, price):
+    # Fuel costs (average prices)
+    return (amounts_intra * price).sum(axis=1) + (amounts_inter * price).sum(axis=1) + (amounts_berth * price).sum(axis=1)
+
+def batch_ETS_CO2(amounts_intra, amounts_inter, amounts_berth, co2):
+    # ETS-counted tonnes of CO2 per trip, Inter EU emissions count half
+    return (amounts_intra * co2).sum(axis=1), (amounts_inter * co2).sum(axis=1) / 2.0, (amounts_berth * co2).sum(axis=1)
+
+def ets_penalty(CO2_intra, CO2_inter, CO2_berth, year, CO2_price_per_ton):
+    EU_ETS_penalty = CO2_intra * CO2_price_per_ton + CO2_inter * CO2_price_per_ton + CO2_berth * CO2_price_per_ton
+    if year == 2025:
+        EU_ETS_penalty = EU_ETS_penalty * 0.7
+    return EU_ETS_penalty
+
+def batch_EU_ETS_penalty(amounts_intra, amounts_inter, amounts_berth, co2, year, CO2_price_per_ton):
+    CO2_intra, CO2_inter, CO2_berth = batch_ETS_CO2(amounts_intra, amounts_inter, amounts_berth, co2)
+    return CO2_intra + CO2_inter + CO2_berth, ets_penalty(CO2_intra, CO2_inter, CO2_berth, year, CO2_price_per_ton)
+
+def fuel_eu_energy(E_totals):
+    # FuelEU energy, Inter EU energy counts half
+    return E_totals['intra-eu'] + E_totals['inter-eu'] * 0.5 + E_totals['berth']
+
+def batch_GHGi_weighted(amounts_intra, amounts_inter, amounts_berth, wtw, E_totals, OPS_flags, summed_E_total):
+    # Energy-weighted GHGi of the trips, berth has no intensity under OPS
+    GHGi_actual_intra = GHGi_actual(amounts_intra, wtw)
+    GHGi_actual_inter = GHGi_actual(amounts_inter, wtw)
+    if OPS_flags['berth']:
+        GHGi_actual_berth = np.zeros_like(GHGi_actual_intra)
+    else:
+        GHGi_actual_berth = GHGi_actual(amounts_berth, wtw)
+    return (
+        (GHGi_actual_intra * E_totals['intra-eu']) +
+        (GHGi_actual_inter * (E_totals['inter-eu'] * 0.5)) +
+        (GHGi_actual_berth * E_totals['berth'])
+    ) / summed_E_total
+
+def compliance_balance(weighted_GHGi_actual, GHGi_target, fwind, summed_E_total):
+    return fwind * (GHGi_target - weighted_GHGi_actual) * summed_E_total
+
+def fuel_eu_deficit_penalty(CB, weighted_GHGi_actual):
+    return np.where(CB < 0, fuel_eu_penalty_amount(np.abs(CB), weighted_GHGi_actual), 0)
+
+def batch_Fuel_EU_penalty(amounts_intra, amounts_inter, amounts_berth, E_totals, OPS_flags, wtw, year, fwind):
+    summed_E_total = fuel_eu_energy(E_totals)
+    weighted_GHGi_actual = batch_GHGi_weighted(amounts_intra, amounts_inter, amounts_berth, wtw, E_totals, OPS_flags, summed_E_total)
+    GHGi_target = calculate_GHGi_target(year)
+    CB = compliance_balance(weighted_GHGi_actual, GHGi_target, fwind, summed_E_total)
+    return weighted_GHGi_actual, GHGi_target, CB, fuel_eu_deficit_penalty(CB, weighted_GHGi_actual)
+
+def combine_costs(fuel_costs, Fuel_EU_penalty, EU_ETS_penalty, OPS_penalty=0, OPS_cost=0):
+    with np.errstate(invalid='ignore'):
+        total_cost = fuel_costs + Fuel_EU_penalty + EU_ETS_penalty + OPS_cost + OPS_penalty
+    # All-zero mixes have no defined intensity (the scalar path raises); never select them
+    return np.where(np.isnan(total_cost), np.inf, total_cost)
+
+def evaluate_fuel_amounts(fuel_amounts, E_totals, OPS_flags, wtw, co2, price, year, CO2_price_per_ton, fwind, OPS_penalty=0, OPS_cost=0):
+    # fuel_amounts maps each trip type to an (S, F) array of tonnes
+    amounts_intra = fuel_amounts['intra-eu']
+    amounts_inter = fuel_amounts['inter-eu']
+    amounts_berth = fuel_amounts['berth']
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fuel_costs = batch_fuel_costs(amounts_intra, amounts_inter, amounts_berth, price)
+        CO2_emissions, EU_ETS_penalty = batch_EU_ETS_penalty(amounts_intra, amounts_inter, amounts_berth, co2, year, CO2_price_per_ton)
+        weighted_GHGi_actual, GHGi_target, CB, Fuel_EU_penalty = batch_Fuel_EU_penalty(
+            amounts_intra, amounts_inter, amounts_berth, E_totals, OPS_flags, wtw, year, fwind
+        )
+    total_cost = combine_costs(fuel_costs, Fuel_EU_penalty, EU_ETS_penalty, OPS_penalty, OPS_cost)
+
+    return {
+        'fuel_costs': fuel_costs,
+        'CO2_emissions': CO2_emissions,
+        'EU_ETS_penalty': EU_ETS_penalty,
+        'GHGi_actual': weighted_GHGi_actual,
+        'GHGi_target': GHGi_target,
+        'CB': CB,
+        'Fuel_EU_penalty': Fuel_EU_penalty,
+        'OPS_penalty': OPS_penalty,
+        'OPS_cost': OPS_cost,
+        'total_cost': total_cost
+    }
+
+def evaluate_fuel_mixes(X, E_totals, fuel_types, densities, OPS_flags, OPS_details, year, CO2_price_per_ton, fwind, cost_per_MWh, table=None):
+    # X is an (S, F) array of fuel energy percentages, one candidate mix per row
+    X = np.atleast_2d(np.asarray(X, dtype=float))
+    lcv, wtw, co2, price = fuel_property_arrays(fuel_types, densities, year, table)
+    fuel_amounts = mix_fuel_amounts(normalize_percentages(X), E_totals, lcv, OPS_flags)
+    OPS_penalty, OPS_cost = ops_costs(E_totals, OPS_flags, OPS_details, cost_per_MWh)
+
+    components = evaluate_fuel_amounts(fuel_amounts, E_totals, OPS_flags, wtw, co2, price, year, CO2_price_per_ton, fwind, OPS_penalty, OPS_cost)
+    components['fuel_amounts'] = fuel_amounts
+    return components
+
+def batch_total_costs(X, E_totals, fuel_types, densities, OPS_flags, OPS_details, year, CO2_price_per_ton, fwind, cost_per_MWh, table=None):
+    return evaluate_fuel_mixes(X, E_totals, fuel_types, densities, OPS_flags, OPS_details, year, CO2_price_per_ton, fwind, cost_per_MWh, table)['total_cost']
+
+############################## SCALAR KERNEL ##############################
+# One mix in plain floats, for the objectives differential_evolution calls one
+# candidate at a time. amounts_* are tonnes per column of the fuel table; the
+# arithmetic follows calculate_total_fuel_costs_and_EU_ETS_penalties and
+# calculate_total_Fuel_EU_Penalty step by step, so the result is the same as the
+# dict-based path without any per-fuel name lookups.
+def scalar_fuel_amounts(percentages, E_total, table):
+    return [(percentage / 100) * E_total / lcv for percentage, (lcv, _, _, _) in zip(percentages, table.scalars)]
+
+def _scalar_GHGi(amounts, scalars):
+    total_amount = sum(amounts)
+    GHGi = 0
+    for amount, (_, wtw, _, _) in zip(amounts, scalars):
+        GHGi += ((amount / total_amount * 100) / 100) * wtw
+    return GHGi
+
+def scalar_fuel_costs(amounts_intra, amounts_inter, amounts_berth, scalars):
+    fuel_costs = 0
+    for amounts in (amounts_intra, amounts_inter, amounts_berth):
+        trip_costs = 0
+        for amount, (_, _, _, price) in zip(amounts, scalars):
+            trip_costs += price * amount
+        fuel_costs = fuel_costs + trip_costs
+    return fuel_costs
+
+def scalar_EU_ETS_penalty(amounts_intra, amounts_inter, amounts_berth, scalars, year, CO2_price_per_ton):
+    CO2 = [0, 0, 0]
+    for trip, amounts in enumerate((amounts_intra, amounts_inter, amounts_berth)):
+        for amount, (_, _, co2, _) in zip(amounts, scalars):
+            CO2[trip] += co2 * amount
+
+    # EU ETS, Inter EU emissions count half
+    EU_ETS_penalty = CO2[0] * CO2_price_per_ton + CO2[1] / 2.0 * CO2_price_per_ton + CO2[2] * CO2_price_per_ton
+    if year == 2025:
+        EU_ETS_penalty *= 0.7
+    return EU_ETS_penalty
+
+def scalar_Fuel_EU_penalty(amounts_intra, amounts_inter, amounts_berth, table, E_totals, OPS_flags, fwind):
+    scalars = table.scalars
+    # FuelEU, Inter EU energy counts half and berth has no intensity under OPS
+    Etotal_Intra = E_totals['intra-eu']
+    Etotal_Inter = E_totals['inter-eu'] * 0.5
+    Etotal_Berth = E_totals['berth']
+    summed_E_total = Etotal_Intra + Etotal_Inter + Etotal_Berth
+    GHGi_actual_berth = 0 if OPS_flags['berth'] else _scalar_GHGi(amounts_berth, scalars)
+    weighted_GHGi_actual = (
+        (_scalar_GHGi(amounts_intra, scalars) * Etotal_Intra) +
+        (_scalar_GHGi(amounts_inter, scalars) * Etotal_Inter) +
+        (GHGi_actual_berth * Etotal_Berth)
+    ) / summed_E_total
+    CB = fwind * (table.GHGi_target - weighted_GHGi_actual) * summed_E_total
+    return fuel_eu_penalty_amount(abs(CB), weighted_GHGi_actual) if CB < 0 else 0
+
+def scalar_total_cost(amounts_intra, amounts_inter, amounts_berth, table, E_totals, OPS_flags, year, CO2_price_per_ton, fwind, OPS_penalty=0, OPS_cost=0):
+    fuel_costs = scalar_fuel_costs(amounts_intra, amounts_inter, amounts_berth, table.scalars)
+    EU_ETS_penalty = scalar_EU_ETS_penalty(amounts_intra, amounts_inter, amounts_berth, table.scalars, year, CO2_price_per_ton)
+    Fuel_EU_penalty = scalar_Fuel_EU_penalty(amounts_intra, amounts_inter, amounts_berth, table, E_totals, OPS_flags, fwind)
+    return fuel_costs + Fuel_EU_penalty + EU_ETS_penalty + OPS_cost + OPS_penalty
+###############################################################################
+
+############################## FIXED FUEL MODEL ##############################
+# optimize.py burns a fixed tonnage of fixed_fuel on each voyage and splits the
+# remaining energy by the percentages in X; the berth runs on MDO (or OPS).
+def fixed_fuel_columns(fuel_types, fixed_fuel):
+    return list(dict.fromkeys([fixed_fuel] + list(fuel_types) + ['MDO']))
+
+def fixed_fuel_amounts(X, E_totals, fuel_types, table, fixed_fuel, MDO_tonnes, OPS_flags):
+    # table is the fuel table of fixed_fuel_columns(fuel_types, fixed_fuel)
+    X = np.atleast_2d(np.asarray(X, dtype=float))
+    columns = list(table.fuels)
+    lcv = table.lcv
+
+    # Percentage of each column; the fixed fuel's own entry in X is not used
+    percentages = np.zeros((len(X), len(columns)))
+    for i, fuel in enumerate(fuel_types):
+        if fuel != fixed_fuel:
+            percentages[:, columns.index(fuel)] = X[:, i]
+
+    fuel_amounts = {}
+    for trip_type in ['intra-eu', 'inter-eu']:
+        remaining_E_total = E_totals[trip_type] - MDO_tonnes[trip_type] * lcv[0]
+        amounts = calculate_fuel_amounts(percentages, remaining_E_total, lcv)
+        amounts[:, 0] = MDO_tonnes[trip_type]
+        fuel_amounts[trip_type] = amounts
+    fuel_amounts['berth'] = np.zeros_like(percentages)
+    if not OPS_flags['berth']:
+        fuel_amounts['berth'][:, columns.index('MDO')] = E_totals['berth'] / lcv[table.index['MDO']]
+    return columns, fuel_amounts
+
+def evaluate_fixed_fuel_mixes(X, E_totals, fuel_types, densities, fixed_fuel, MDO_tonnes, OPS_flags, OPS_details, year, CO2_price_per_ton, fwind, cost_per_MWh):
+    table = fuel_table(fixed_fuel_columns(fuel_types, fixed_fuel), year, densities)
+    columns, fuel_amounts = fixed_fuel_amounts(X, E_totals, fuel_types, table, fixed_fuel, MDO_tonnes, OPS_flags)
+    lcv, wtw, co2, price = fuel_property_arrays(columns, densities, year, table)
+    OPS_penalty, OPS_cost = ops_costs(E_totals, OPS_flags, OPS_details, cost_per_MWh)
+
+    components = evaluate_fuel_amounts(fuel_amounts, E_totals, OPS_flags, wtw, co2, price, year, CO2_price_per_ton, fwind, OPS_penalty, OPS_cost)
+    components['fuel_amounts'] = fuel_amounts
+    components['fuel_columns'] = columns
+    return components
+###############################################################################
+
+############################## LINEAR STRUCTURE ##############################
+# With one mix shared by all trips (optimize2.py), fuel costs and EU ETS are linear
+# in the energy percentages and the FuelEU penalty depends on the mix only through
+# its mass-weighted intensity GHGi_mix. These coefficients describe that structure
+# for the exact solvers.
+def mix_coefficients(E_totals, fuel_types, densities, OPS_flags, year):
+    lcv, wtw, co2, price = fuel_property_arrays(fuel_types, densities, year)
+    Etotal_Berth = 0 if OPS_flags['berth'] else E_totals['berth']
+    E_fuel = E_totals['intra-eu'] + E_totals['inter-eu'] + Etotal_Berth
+    E_ETS = E_totals['intra-eu'] + E_totals['inter-eu'] / 2.0 + Etotal_Berth
+    summed_E_total = E_totals['intra-eu'] + E_totals['inter-eu'] * 0.5 + E_totals['berth']
+    return {
+        'lcv': lcv,
+        'wtw': wtw,
+        'price': price,
+        'fuel_tonnes': E_fuel / 100 / lcv,  # tonnes of each fuel per percentage point
+        'ETS_CO2': E_ETS / 100 / lcv * co2,  # ETS-counted tonnes of CO2 per percentage point
+        'ETS_factor': 0.7 if year == 2025 else 1.0,
+        'summed_E_total': summed_E_total,
+        'GHGi_weight': (E_totals['intra-eu'] + E_totals['inter-eu'] * 0.5 + Etotal_Berth) / summed_E_total,
+        'GHGi_target': calculate_GHGi_target(year)
+    }
+
+def linear_costs(coefficients, CO2_price_per_ton):
+    # Fuel cost plus EU ETS per percentage point of each fuel
+    return coefficients['price'] * coefficients['fuel_tonnes'] + coefficients['ETS_factor'] * CO2_price_per_ton * coefficients['ETS_CO2']
+
+def GHGi_mix(X, coefficients):
+    # Mass-weighted intensity of each mix, as calculate_GHGi_actual sees it
+    X = np.atleast_2d(X)
+    masses = X / coefficients['lcv']
+    return (masses * coefficients['wtw']).sum(axis=1) / masses.sum(axis=1)
+
+def fuel_eu_penalty(GHGi, coefficients, fwind):
+    weighted_GHGi_actual = coefficients['GHGi_weight'] * np.asarray(GHGi, dtype=float)
+    CB = fwind * (coefficients['GHGi_target'] - weighted_GHGi_actual) * coefficients['summed_E_total']
+    return CB, fuel_eu_deficit_penalty(CB, weighted_GHGi_actual)
+###############################################################################
+
+def batch_energy_shortfall(X, E_total, fuel_types, densities, table=None):
+    # Energy delivered by each mix minus E_total (the energy constraint of optimize2.py);
+    # a solve passes its fuel table so the LCVs are not rebuilt per call
+    X = np.atleast_2d(np.asarray(X, dtype=float))
+    lcv = table.lcv if table is not None else np.array([densities[fuel] for fuel in fuel_types], dtype=float)
+    fuel_amounts = calculate_fuel_amounts(normalize_percentages(X), E_total, lcv)
+    return (fuel_amounts * lcv).sum(axis=1) - E_total
+###############################################################################
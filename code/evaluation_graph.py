@@ -0,0 +1,147 @@
+import copy
+import numpy as np
+from cost_kernel import (
+    normalize_percentages, ops_costs, mix_fuel_amounts, batch_fuel_costs, batch_ETS_CO2, ets_penalty, fuel_eu_energy,
+    batch_GHGi_weighted, compliance_balance, fuel_eu_deficit_penalty, combine_costs
+)
+from fuel_table import fuel_table
+from fuel_calculations import calculate_GHGi_target
+
+# Dependency-tracked evaluation of the optimize2.py cost model for what-if loops.
+# The cost is split into the intermediate quantities of
+# calculate_total_fuel_costs_and_EU_ETS_penalties and calculate_total_Fuel_EU_Penalty
+# (per-trip fuel tonnes, per-trip ETS-counted CO2, energy-weighted GHGi, ...), each
+# a node with the inputs and nodes it depends on. Nodes are computed on demand and
+# kept; changing an input only invalidates the nodes downstream of it, so e.g. a new
+# CO2 price recomputes the EU ETS penalty and the total and nothing else, and a new
+# fuel price only the fuel costs and the total. Every node is one of the cost
+# kernel's component functions (the ones cost_kernel.evaluate_fuel_amounts is built
+# from), so the results are identical to batch_total_costs.
+#
+# x holds one or more mixes (S, F) of energy percentages of fuel_types, as in the
+# kernel, and every quantity is an (S,) array. fuel_prices, wtw_factors and
+# co2_factors override the factor tables for some fuels ({fuel: value}).
+
+inputs = (
+    'x', 'E_totals', 'fuel_types', 'densities', 'OPS_flags', 'OPS_details', 'year', 'CO2_price_per_ton', 'fwind',
+    'cost_per_MWh', 'fuel_prices', 'wtw_factors', 'co2_factors'
+)
+
+############################## NODES ##############################
+def _overridden(values, fuel_types, overrides, name):
+    unknown = set(overrides) - set(fuel_types)
+    if unknown:
+        raise ValueError(f"{name} given for fuels not in fuel_types: {sorted(unknown)}.")
+    values = np.array(values, dtype=float)
+    for fuel, value in overrides.items():
+        values[fuel_types.index(fuel)] = value
+    return values
+
+def _trips(fuel_amounts):
+    return fuel_amounts['intra-eu'], fuel_amounts['inter-eu'], fuel_amounts['berth']
+
+def _GHGi_weighted(fuel_amounts, wtw, E_totals, OPS_flags, summed_E_total):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return batch_GHGi_weighted(*_trips(fuel_amounts), wtw, E_totals, OPS_flags, summed_E_total)
+
+def _Fuel_EU_penalty(CB, GHGi_actual):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return fuel_eu_deficit_penalty(CB, GHGi_actual)
+
+# name -> (dependencies, function of the dependencies in that order)
+nodes = {
+    'table': (('fuel_types', 'year', 'densities'), lambda fuel_types, year, densities: fuel_table(fuel_types, year, densities)),
+    'lcv': (('table',), lambda table: table.lcv),
+    'price': (('table', 'fuel_types', 'fuel_prices'), lambda table, fuel_types, overrides: _overridden(table.price, fuel_types, overrides, 'fuel_prices')),
+    'wtw': (('table', 'fuel_types', 'wtw_factors'), lambda table, fuel_types, overrides: _overridden(table.wtw, fuel_types, overrides, 'wtw_factors')),
+    'co2': (('table', 'fuel_types', 'co2_factors'), lambda table, fuel_types, overrides: _overridden(table.co2, fuel_types, overrides, 'co2_factors')),
+    'percentages': (('x',), lambda x: normalize_percentages(np.atleast_2d(np.asarray(x, dtype=float)))),
+    'fuel_amounts': (('percentages', 'E_totals', 'lcv', 'OPS_flags'), mix_fuel_amounts),
+    'fuel_costs': (('fuel_amounts', 'price'), lambda fuel_amounts, price: batch_fuel_costs(*_trips(fuel_amounts), price)),
+    # ETS-counted tonnes of CO2 per trip (intra-eu, inter-eu, berth)
+    'ETS_CO2': (('fuel_amounts', 'co2'), lambda fuel_amounts, co2: batch_ETS_CO2(*_trips(fuel_amounts), co2)),
+    'CO2_emissions': (('ETS_CO2',), lambda ETS_CO2: ETS_CO2[0] + ETS_CO2[1] + ETS_CO2[2]),
+    'EU_ETS_penalty': (('ETS_CO2', 'year', 'CO2_price_per_ton'), lambda ETS_CO2, year, CO2_price_per_ton: ets_penalty(*ETS_CO2, year, CO2_price_per_ton)),
+    'summed_E_total': (('E_totals',), fuel_eu_energy),
+    'GHGi_actual': (('fuel_amounts', 'wtw', 'E_totals', 'OPS_flags', 'summed_E_total'), _GHGi_weighted),
+    'GHGi_target': (('year',), calculate_GHGi_target),
+    'CB': (('GHGi_actual', 'GHGi_target', 'fwind', 'summed_E_total'), compliance_balance),
+    'Fuel_EU_penalty': (('CB', 'GHGi_actual'), _Fuel_EU_penalty),
+    'OPS': (('E_totals', 'OPS_flags', 'OPS_details', 'cost_per_MWh'), ops_costs),
+    'total_cost': (('fuel_costs', 'Fuel_EU_penalty', 'EU_ETS_penalty', 'OPS'), lambda fuel_costs, Fuel_EU_penalty, EU_ETS_penalty, OPS: combine_costs(fuel_costs, Fuel_EU_penalty, EU_ETS_penalty, *OPS))
+}
+
+# Nodes reported by evaluate(), as cost_kernel.evaluate_fuel_mixes
+outputs = ('fuel_amounts', 'fuel_costs', 'CO2_emissions', 'EU_ETS_penalty', 'GHGi_actual', 'GHGi_target', 'CB', 'Fuel_EU_penalty', 'total_cost')
+###############################################################################
+
+############################## GRAPH ##############################
+def _same(a, b):
+    if isinstance(a, np.ndarray) or isinstance(b, np.ndarray):
+        return np.array_equal(a, b)
+    try:
+        return bool(a == b)
+    except ValueError:
+        # Containers of arrays
+        return False
+
+class EvaluationGraph:
+    def __init__(self, x, E_totals, fuel_types, densities, OPS_flags, OPS_details, year, CO2_price_per_ton, fwind, cost_per_MWh,
+                 fuel_prices=None, wtw_factors=None, co2_factors=None):
+        self.values = {}
+        self.computations = {name: 0 for name in nodes}  # times each node was (re)computed
+        # Direct dependents of every input and node
+        self.dependents = {name: [] for name in inputs + tuple(nodes)}
+        for name, (dependencies, _) in nodes.items():
+            for dependency in dependencies:
+                self.dependents[dependency].append(name)
+        self.update(
+            x=x, E_totals=E_totals, fuel_types=list(fuel_types), densities=densities, OPS_flags=OPS_flags, OPS_details=OPS_details,
+            year=year, CO2_price_per_ton=CO2_price_per_ton, fwind=fwind, cost_per_MWh=cost_per_MWh,
+            fuel_prices=fuel_prices or {}, wtw_factors=wtw_factors or {}, co2_factors=co2_factors or {}
+        )
+
+    def _invalidate(self, name):
+        stack = list(self.dependents[name])
+        while stack:
+            node = stack.pop()
+            if node in self.values:
+                del self.values[node]
+                stack.extend(self.dependents[node])
+
+    # Change some inputs; nodes that depend on an input whose value really changed are dropped
+    def update(self, **changes):
+        unknown = set(changes) - set(inputs)
+        if unknown:
+            raise ValueError(f"Unknown inputs {sorted(unknown)}, expected some of {list(inputs)}.")
+        for name, value in changes.items():
+            if name in self.values and _same(self.values[name], value):
+                continue
+            # A copy, so later in-place edits by the caller are seen as changes
+            self.values[name] = list(value) if name == 'fuel_types' else copy.deepcopy(value)
+            self._invalidate(name)
+
+    def get(self, name):
+        if name in self.values:
+            return self.values[name]
+        if name not in nodes:
+            raise ValueError(f"Unknown quantity '{name}'.")
+        dependencies, function = nodes[name]
+        value = function(*(self.get(dependency) for dependency in dependencies))
+        self.values[name] = value
+        self.computations[name] += 1
+        return value
+
+    def evaluate(self):
+        components = {name: self.get(name) for name in outputs}
+        components['OPS_penalty'], components['OPS_cost'] = self.get('OPS')
+        return components
+###############################################################################
+
+# Total cost (or another node) for every value of one input, the others fixed
+def what_if(graph, name, values, output='total_cost'):
+    results = []
+    for value in values:
+        graph.update(**{name: value})
+        results.append(graph.get(output))
+    return results
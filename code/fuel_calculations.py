@@ -1,34 +1,63 @@
 import json
+import os
 
 ############################## LOAD FUNCTIONS ##############################
+# Parsed factor tables, keyed by (absolute path, transform). An entry is reused
+# until the file's mtime changes, so each process parses a table once per file
+# revision. differential_evolution worker processes get their own copy (or
+# inherit the parent's when forked). Callers must treat the tables as read-only.
+_factor_cache = {}
+
+# Factor tables ship in json/ next to code/, whatever the working directory
+json_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'json')
+
+def _load_cached_json(filename, transform=None):
+    path = os.path.abspath(filename)
+    mtime = os.stat(path).st_mtime_ns
+    key = (path, transform)
+    cached = _factor_cache.get(key)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    with open(path, 'r') as file:
+        data = json.load(file)
+    if transform is not None:
+        data = transform(data)
+    _factor_cache[key] = (mtime, data)
+    return data
+
+def _upper_keys(data):
+    return {key.upper(): value for key, value in data.items()}
+
+def clear_factor_cache():
+    _factor_cache.clear()
+
 # Load WtW factors
-def load_wtw_factors(filename='../json/wtw_factors.json'):
-    with open(filename, 'r') as file:
-        wtw_factors = json.load(file)
-    return {key.upper(): value for key, value in wtw_factors.items()}
+def load_wtw_factors(filename=os.path.join(json_dir, 'wtw_factors.json')):
+    return _load_cached_json(filename, _upper_keys)
 
 # Load fuel data
-def load_fuel_data(filename='../json/fuel_prices.json'):
-    with open(filename, 'r') as file:
-        fuel_data = json.load(file)
-    return fuel_data
+def load_fuel_data(filename=os.path.join(json_dir, 'fuel_prices.json')):
+    return _load_cached_json(filename)
 
 # Load fuel densities
-def load_fuel_density(filename='../json/fuel_density.json'):
-    with open(filename, 'r') as file:
-        return json.load(file)
+def load_fuel_density(filename=os.path.join(json_dir, 'fuel_density.json')):
+    return _load_cached_json(filename)
     
 # Load CO2 emission factors
-def load_co2_emission_factors(filename='../json/co2_emission_factors.json'):
-    with open(filename, 'r') as file:
-        co2_factors = json.load(file)
-    return {key.upper(): value for key, value in co2_factors.items()}
+def load_co2_emission_factors(filename=os.path.join(json_dir, 'co2_emission_factors.json')):
+    return _load_cached_json(filename, _upper_keys)
 
 # Load GHG reduction targets
-def load_ghgi_targets(filename='../json/ghgi_targets.json'):
-    with open(filename, 'r') as file:
-        ghgi_targets = json.load(file)
-    return ghgi_targets
+def load_ghgi_targets(filename=os.path.join(json_dir, 'ghgi_targets.json')):
+    return _load_cached_json(filename)
+
+# Warm every factor table, e.g. before differential_evolution forks its workers
+def load_factor_tables():
+    load_wtw_factors()
+    load_fuel_data()
+    load_fuel_density()
+    load_co2_emission_factors()
+    load_ghgi_targets()
 ###############################################################################
 
 ############################## FUEL EU PENENALTY ##############################
@@ -0,0 +1,136 @@
+from dataclasses import dataclass
+import numpy as np
+from cost_kernel import trip_types
+
+# Result of optimize_fuel_mix (optimize.py, optimize2.py, optimize_graph.py). Every
+# component is computed once after the solve by the shared cost kernel, so the
+# record always agrees with the objective the solver minimised.
+
+@dataclass
+class FuelMixResult:
+    x: np.ndarray               # solution vector, one entry per fuel type
+    fuel_types: list
+    year: int
+    CO2_price_per_ton: float
+    fuel_amounts: dict          # trip type -> {fuel: tonnes}
+    total_fuel_amounts: dict    # fuel -> tonnes over all trips
+    energy_required: dict       # trip type -> MJ
+    energy_provided: dict       # trip type -> MJ delivered by the fuel amounts
+    Total_CB: float
+    GHGi_actual: float
+    GHGi_target: float
+    fuel_costs: float
+    CO2_emissions: float        # EU ETS allowances (tonnes)
+    EU_ETS_penalty: float
+    FuelEU_penalty: float
+    OPS_cost: float
+    OPS_penalty: float
+    total_cost: float
+    solver: str
+    success: bool
+    message: str
+    nit: int
+    nfev: int
+    trace: dict = None          # instrumentation.SolveTrace output of a traced solve
+    sensitivities: dict = None  # sensitivities.cost_sensitivities of the optimal mix, when requested
+
+    # The per-scenario dict run.py stores
+    @property
+    def summary(self):
+        return {
+            'fuel_amounts': self.total_fuel_amounts,
+            'Total_CB': self.Total_CB,
+            'FuelEU_penalty': self.FuelEU_penalty,
+            'EU_ETS_penalty': self.EU_ETS_penalty,
+            'OPS_cost': self.OPS_cost,
+            'OPS_penalty': self.OPS_penalty,
+            'total_cost': self.total_cost
+        }
+
+    # Row of graphs/data.csv and of the graphicRepresentation.py workbook
+    def chart_row(self):
+        return {
+            'year': self.year,
+            'CO2_price': self.CO2_price_per_ton,
+            'total_cost': self.total_cost,
+            'fuel_cost': self.fuel_costs,
+            'eu_ets_penalty': self.EU_ETS_penalty,
+            'fuelEU_penalty': self.FuelEU_penalty,
+            'eu_ets_allowances': self.CO2_emissions,
+            'scenario': self.fuel_types
+        }
+
+# Build the record from the kernel components of a single mix (S = 1)
+def build_result(x, fuel_types, fuel_columns, components, densities, E_totals, year, CO2_price_per_ton, solver, scipy_result):
+    fuel_amounts = {}
+    energy_provided = {}
+    for trip_type in trip_types:
+        amounts = components['fuel_amounts'][trip_type][0]
+        fuel_amounts[trip_type] = {fuel: float(amount) for fuel, amount in zip(fuel_columns, amounts)}
+        energy_provided[trip_type] = float(sum(amount * densities[fuel] for fuel, amount in fuel_amounts[trip_type].items()))
+
+    total_fuel_amounts = {}
+    for trip_type in trip_types:
+        for fuel, amount in fuel_amounts[trip_type].items():
+            total_fuel_amounts[fuel] = total_fuel_amounts.get(fuel, 0) + amount
+
+    return FuelMixResult(
+        x=np.asarray(x, dtype=float),
+        fuel_types=list(fuel_types),
+        year=year,
+        CO2_price_per_ton=CO2_price_per_ton,
+        fuel_amounts=fuel_amounts,
+        total_fuel_amounts=total_fuel_amounts,
+        energy_required={trip_type: float(E_totals[trip_type]) for trip_type in trip_types},
+        energy_provided=energy_provided,
+        Total_CB=float(components['CB'][0]),
+        GHGi_actual=float(components['GHGi_actual'][0]),
+        GHGi_target=float(components['GHGi_target']),
+        fuel_costs=float(components['fuel_costs'][0]),
+        CO2_emissions=float(components['CO2_emissions'][0]),
+        EU_ETS_penalty=float(components['EU_ETS_penalty'][0]),
+        FuelEU_penalty=float(components['Fuel_EU_penalty'][0]),
+        OPS_cost=float(components['OPS_cost']),
+        OPS_penalty=float(components['OPS_penalty']),
+        total_cost=float(components['total_cost'][0]),
+        solver=solver,
+        success=bool(scipy_result.success),
+        message=str(scipy_result.message),
+        nit=int(getattr(scipy_result, 'nit', 0)),
+        nfev=int(getattr(scipy_result, 'nfev', 0))
+    )
+
+############################## CONSOLE OUTPUT ##############################
+def format_result(result):
+    lines = ["--- Optimization Results ---"]
+    lines.append(f"Solver: {result.solver} ({result.message}) after {result.nit} iterations and {result.nfev} evaluations")
+    lines.append(f"Intra EU energy [MJ]: {result.energy_required['intra-eu']}")
+    lines.append(f"Inter EU energy [MJ]: {result.energy_required['inter-eu']}")
+    lines.append(f"Berth EU energy [MJ]: {result.energy_required['berth']}")
+    lines.append(f"Total Applicable Energy [MJ]: {sum(result.energy_required.values())}")
+    lines.append(f"Optimal fuel amounts (tonnes): {result.total_fuel_amounts}")
+    lines.append(f"Optimal fuel amounts for Intra EU (tonnes): {result.fuel_amounts['intra-eu']}")
+    lines.append(f"Optimal fuel amounts for Inter EU (tonnes): {result.fuel_amounts['inter-eu']}")
+    lines.append(f"Optimal fuel amounts for Berth (tonnes): {result.fuel_amounts['berth']}")
+    lines.append(f"AFTER OPTIMIZATION Intra EU energy [MJ]: {result.energy_provided['intra-eu']}")
+    lines.append(f"AFTER OPTIMIZATION Inter EU energy [MJ]: {result.energy_provided['inter-eu']}")
+    lines.append(f"AFTER OPTIMIZATION Berth EU energy [MJ]: {result.energy_provided['berth']}")
+    lines.append(f"GHGi actual / target [gCO2eq/MJ]: {result.GHGi_actual} / {result.GHGi_target}")
+    lines.append(f"Total CB: {result.Total_CB}")
+    lines.append(f"Final FuelEU penalty: {result.FuelEU_penalty}")
+    lines.append(f"Final EU ETS penalty: {result.EU_ETS_penalty}")
+    lines.append(f"EU ETS Allowances [tonnes]: {result.CO2_emissions}")
+    lines.append(f"OPS cost: {result.OPS_cost}")
+    lines.append(f"OPS penalty: {result.OPS_penalty}")
+    lines.append(f"Fuel costs: {result.fuel_costs}")
+    lines.append(f"Optimal total cost: {result.total_cost}")
+    if result.sensitivities:
+        lines.append(f"Total cost per EUR/t of CO2: {result.sensitivities['CO2_price_per_ton']}")
+        lines.append(f"Total cost per gCO2eq/MJ of GHGi target: {result.sensitivities['GHGi_target']}")
+        for factor, unit in [('price', 'EUR/t of price'), ('wtw', 'gCO2eq/MJ of WtW'), ('co2', 't CO2/t of CO2 factor'), ('lcv', 'MJ/t of LCV')]:
+            lines.append(f"Total cost per {unit}: {result.sensitivities[factor]}")
+    return "\n".join(lines)
+
+def print_result(result):
+    print("\n" + format_result(result))
+###############################################################################
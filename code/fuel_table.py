@@ -0,0 +1,83 @@
+from dataclasses import dataclass
+import numpy as np
+from fuel_calculations import (
+                            load_wtw_factors, load_fuel_data, load_co2_emission_factors, load_fuel_density,
+                            load_ghgi_targets, calculate_GHGi_target
+                        )
+
+# Compiled fuel properties for one (year, fuel set). Fuel i of the set is column i
+# of every array, so the cost kernels index by position instead of looking fuels
+# up by name, upper-casing them or resolving str(year) prices on every
+# evaluation. Tables are built once and shared; they are rebuilt when a factor
+# file changes (fuel_calculations reloads it) or the densities differ.
+
+@dataclass(frozen=True)
+class FuelTable:
+    fuels: tuple
+    year: int
+    index: dict             # fuel -> column
+    lcv: np.ndarray         # MJ per tonne (fuel_density.json)
+    wtw: np.ndarray         # gCO2eq per MJ
+    co2: np.ndarray         # tonnes CO2 per tonne of fuel, 0 when not listed
+    price_min: np.ndarray   # EUR per tonne for the year
+    price_max: np.ndarray
+    price: np.ndarray       # average of min and max, as calculate_fuel_costs
+    scalars: tuple          # (lcv, wtw, co2, price) per fuel as floats, for the scalar kernel
+    GHGi_target: float      # FuelEU target of the year
+
+# (fuels, year, densities) -> (factor tables it was built from, FuelTable)
+_tables = {}
+
+def year_prices(fuel_data, fuel_type, year):
+    if fuel_type not in fuel_data:
+        raise ValueError(f"Fuel type '{fuel_type}' not found in the data.")
+    # Year-specific prices first, generic prices otherwise (as in calculate_fuel_costs)
+    prices = fuel_data[fuel_type].get(str(year))
+    if not prices:
+        if 'price_min' in fuel_data[fuel_type]:
+            prices = fuel_data[fuel_type]
+        else:
+            raise ValueError(f"No price data available for '{year}' or generic for '{fuel_type}'.")
+    return prices['price_min'], prices['price_max']
+
+def _build(fuels, year, densities, WtW_factors, co2_factors, fuel_data, ghgi_targets):
+    def array(values):
+        values = np.array(values, dtype=float)
+        values.setflags(write=False)
+        return values
+
+    prices = [year_prices(fuel_data, fuel, year) for fuel in fuels]
+    lcv = array([densities[fuel] for fuel in fuels])
+    wtw = array([WtW_factors[fuel] for fuel in fuels])
+    co2 = array([co2_factors.get(fuel.upper(), 0) for fuel in fuels])
+    price_min = array([price_min for price_min, _ in prices])
+    price_max = array([price_max for _, price_max in prices])
+    price = array([(price_min + price_max) / 2 for price_min, price_max in prices])
+    return FuelTable(
+        fuels=fuels,
+        year=year,
+        index={fuel: i for i, fuel in enumerate(fuels)},
+        lcv=lcv,
+        wtw=wtw,
+        co2=co2,
+        price_min=price_min,
+        price_max=price_max,
+        price=price,
+        scalars=tuple(zip(lcv.tolist(), wtw.tolist(), co2.tolist(), price.tolist())),
+        GHGi_target=calculate_GHGi_target(year)
+    )
+
+def fuel_table(fuel_types, year, densities=None):
+    densities = load_fuel_density() if densities is None else densities
+    fuels = tuple(fuel_types)
+    key = (fuels, year, tuple(densities[fuel] for fuel in fuels))
+    sources = (load_wtw_factors(), load_co2_emission_factors(), load_fuel_data(), load_ghgi_targets())
+    cached = _tables.get(key)
+    if cached is not None and all(a is b for a, b in zip(cached[0], sources)):
+        return cached[1]
+    table = _build(fuels, year, densities, *sources)
+    _tables[key] = (sources, table)
+    return table
+
+def clear_fuel_tables():
+    _tables.clear()
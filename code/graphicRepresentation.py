@@ -1,35 +1,85 @@
-import openpyxl
-from openpyxl.chart import LineChart, BarChart, DoughnutChart, Reference, Series
-from optimize_graph import *
-
-def create_excel(data):
-    # Create a new workbook and select the active worksheet
-    wb = openpyxl.load_workbook("./Charts_Nemo.xlsx")
-    # Select the sheet you want to edit
-    sheetname = 'Data'  # Replace with your sheet nam
-    ws = wb[sheetname]
-
-    # Clear the existing data in the sheet
-    ws.delete_rows(1, ws.max_row)
-    
-    # Create an array of data
-    # Write header to worksheet
-    ws.append(list(data.keys()))
+import itertools
+import os
+from optimize_graph import get_user_input_FAST, optimize_fuel_mix
+
+# openpyxl is imported by the export functions, when a workbook is written
+chart_template = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Charts_Nemo.xlsx')
+
+# Sheet names Excel accepts
+invalid_sheet_characters = set('[]:*?/\\')
+
+def excel_row(row):
+    # Fuel lists become "HFO-MDO-VLSFO" (the BAU set), numbers are rounded
+    formatted = []
+    for value in row:
+        if isinstance(value, (list, tuple)):
+            value = '-'.join(value)
+            if value == "HFO-MDO-VLSFO":
+                value = "BAU"
+        elif not isinstance(value, str):
+            value = round(value)
+        formatted.append(value)
+    return formatted
+
+def _header_and_rows(data):
+    # Columns dict ({'year': [...], ...}, as create_excel takes) or an iterable of row dicts
+    if isinstance(data, dict):
+        return list(data), zip(*data.values())
+    rows = iter(data)
+    first = next(rows, None)
+    if first is None:
+        return [], iter(())
+    header = list(first)
+    return header, itertools.chain([[first[key] for key in header]], ([row[key] for key in header] for row in rows))
+
+def _write_sheet(ws, header, rows):
+    ws.append(header)
+    for row in rows:
+        ws.append(excel_row(row))
+
+# Write-only workbook with one sheet per entry of sheets (name -> columns dict or
+# iterable of row dicts). Rows are formatted and streamed to disk one at a time, so
+# memory does not grow with the row count when the rows come from a generator.
+def stream_excel(filename, sheets):
+    import openpyxl
+    wb = openpyxl.Workbook(write_only=True)
+    for name, data in sheets.items():
+        if not name or len(name) > 31 or set(name) & invalid_sheet_characters:
+            raise ValueError(f"Invalid sheet name '{name}': at most 31 characters and none of []:*?/\\.")
+        _write_sheet(wb.create_sheet(name), *_header_and_rows(data))
+    wb.save(filename)
+
+# Chart workbook from the Charts_Nemo.xlsx template. The template's charts read
+# fixed ranges of its Data sheet (18 rows: three fuel sets x six years); with
+# data_file the full table is streamed there instead and the chart workbook only
+# gets the rows its charts show.
+def create_excel(data, template=chart_template, filename="sample_chart.xlsx", data_file=None, sheetname='Data'):
+    import openpyxl
+    wb = openpyxl.load_workbook(template)
+    chart_rows = wb[sheetname].max_row - 1
 
-    # Write data to worksheet
-    for i in range(len(data['year'])):
-        row = [data[key][i] for key in data]
-        for i in range(len(row)):
-            if isinstance(row[i],list):
-                row[i] = '-'.join(row[i])
-                if row[i] == "HFO-MDO-VLSFO":
-                    row[i] = "BAU"
-            else:
-                row[i] = round(row[i])
-        ws.append(row)
+    # A fresh sheet in place of the old one is much faster than deleting its rows;
+    # the charts refer to it by name
+    position = wb.sheetnames.index(sheetname)
+    wb.remove(wb[sheetname])
+    ws = wb.create_sheet(sheetname, position)
 
+    header, rows = _header_and_rows(data)
+    if data_file is not None:
+        # One pass over the rows, keeping the first chart_rows for the charts
+        chart_data = []
+        def kept(rows):
+            for row in rows:
+                if len(chart_data) < chart_rows:
+                    chart_data.append(row)
+                yield row
+        data_wb = openpyxl.Workbook(write_only=True)
+        _write_sheet(data_wb.create_sheet(sheetname), header, kept(rows))
+        data_wb.save(data_file)
+        rows = chart_data
+    _write_sheet(ws, header, rows)
 
-    wb.save("sample_chart.xlsx")
+    wb.save(filename)
 
 def main():
     data = {
@@ -57,6 +107,7 @@ def main():
     # total_results = []
 
     for selected_fuels in all_selected_fuels:
+        x0 = None  # each year starts from the previous year's optimum
         for year in total_years:
             # Optimizing fuel mix
             result = optimize_fuel_mix(
@@ -68,10 +119,14 @@ def main():
                 year=year,
                 CO2_price_per_ton=CO2_price_per_ton,
                 fwind=fwind,
-                cost_per_MWh=cost_per_MWh
+                cost_per_MWh=cost_per_MWh,
+                x0=x0,
+                use_cache=True  # re-running the charts reuses the stored solves
             )
-            for key in result:
-                data[key].append(result[key])
+            x0 = result.x
+            row = result.chart_row()
+            for key in data:
+                data[key].append(row[key])
             print(data)
     
     create_excel(data)
@@ -0,0 +1,251 @@
+import numpy as np
+from fuel_calculations import load_ghgi_targets
+from cost_kernel import mix_coefficients, linear_costs, evaluate_fuel_mixes, ops_costs, fuel_eu_penalty_rate, fuel_eu_penalty_amount
+from lp_solver import blend_terms, blend_mix
+
+# Multi-year optimization of the optimize2.py model with FuelEU banking and
+# borrowing. Each year has its own mix, prices and target, and the years are
+# coupled only through the compliance balance carried between them:
+#   - a surplus (adjusted CB > 0) is banked into the next year;
+#   - a deficit may be covered by borrowing up to borrow_limit * target * energy
+#     from the next year, which then starts with borrow_factor times that amount
+#     as a deficit; borrowing is not allowed in two consecutive years nor in the
+#     last year of the horizon;
+#   - the deficit left after borrowing pays the FuelEU penalty.
+# The escalation of the penalty for consecutive deficit years is not modelled.
+#
+# For a given mass-weighted intensity g the cheapest mix blends at most two fuels
+# (see lp_solver.py), so each year reduces to a cost curve over a grid of g. The
+# horizon is then a dynamic program over the carried balance: backward induction
+# on a grid of banked balances (and of borrowed amounts), and a forward pass that
+# follows the optimal policy from an empty bank.
+
+default_years = list(range(2025, 2051))
+
+# Targets hold from their year until the next listed year, so annual horizons use
+# the 2025 target for 2026-2029 and so on
+def horizon_GHGi_target(year):
+    ghgi_targets = load_ghgi_targets()
+    listed = sorted(int(target_year) for target_year in ghgi_targets['targets'])
+    in_force = [target_year for target_year in listed if target_year <= year]
+    if not in_force:
+        raise ValueError(f"No FuelEU target applies to {year}.")
+    reduction_percentage = ghgi_targets['targets'][str(in_force[-1])]
+    return ghgi_targets['reference_value'] * (1 - reduction_percentage / 100)
+
+############################## YEARLY COST CURVES ##############################
+def intensity_grid(coefficients, targets, resolution):
+    # Mass-weighted intensities reachable by the fuels, with every single fuel and
+    # every year's compliance kink on the grid
+    wtw = coefficients['wtw']
+    kinks = np.array(targets) / coefficients['GHGi_weight']
+    kinks = kinks[(kinks >= wtw.min()) & (kinks <= wtw.max())]
+    return np.unique(np.concatenate([np.linspace(wtw.min(), wtw.max(), resolution), wtw, kinks]))
+
+def cheapest_blends(coefficients, costs, g):
+    # Cheapest mix of mass-weighted intensity g (per grid point): cost and blend (i, j, lam).
+    # Every candidate is scored at once, one row each in the order single fuel i, then
+    # the pairs (i, j > i); ties go to the first candidate
+    n_fuels = len(costs)
+    g = np.asarray(g, dtype=float)[np.newaxis, :]
+    pairs = np.array([(i, j) for i in range(n_fuels) for j in range(i, n_fuels)])
+    i, j = pairs[:, [0]], pairs[:, [1]]
+    single = i == j
+    r0, r1, q0, q1 = blend_terms(coefficients, i, j)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        lam = np.where(single, 1.0, (g * r0 - q0) / (q1 - g * r1))
+        cost = 100 * (costs[j] + (costs[i] - costs[j]) * lam)
+    feasible = np.where(single, np.isclose(g, coefficients['wtw'][i], rtol=0, atol=1e-12), (lam >= 0) & (lam <= 1))
+    cost = np.where(feasible, np.where(single, 100 * costs[i], cost), np.inf)
+    best = np.argmin(cost, axis=0)
+    columns = np.arange(g.shape[1])
+    return cost[best, columns], pairs[best], lam[best, columns]
+###############################################################################
+
+############################## DYNAMIC PROGRAM ##############################
+class _Horizon:
+    def __init__(self, years, curves, bank_grid, borrow_grids, banking, borrowing, borrow_factor):
+        self.years = years
+        self.curves = curves
+        self.bank_grid = bank_grid
+        self.borrow_grids = borrow_grids
+        self.banking = banking
+        self.borrowing = borrowing
+        self.borrow_factor = borrow_factor
+        # bank_values[t]: cost of years t.. when year t starts with a banked balance;
+        # owed_values[t]: the same when year t - 1 borrowed (one per borrow_grids[t - 1] amount)
+        self.bank_values = [None] * len(years) + [np.zeros(len(bank_grid))]
+        self.owed_values = [None] * (len(years) + 1)
+        # Best borrowed amount on the grid up to each grid amount, per year (set by the first step(t))
+        self.borrow_prefixes = [None] * len(years)
+
+    def step(self, t, carry, can_borrow):
+        # Cost of years t.. for each carried balance, with the best intensity, borrowed
+        # amount and banked balance of year t
+        curve = self.curves[t]
+        adjusted = curve['CB'][np.newaxis, :] + carry[:, np.newaxis]
+        deficit = np.maximum(-adjusted, 0)
+        banked = np.maximum(adjusted, 0) if self.banking else np.zeros_like(adjusted)
+        values = curve['cost'] + deficit * curve['rate'] + np.interp(banked, self.bank_grid, self.bank_values[t + 1])
+        borrowed = np.zeros_like(adjusted)
+
+        if can_borrow and self.borrowing and t + 1 < len(self.years):
+            # Borrowing b saves rate * b now and starts next year owing borrow_factor * b;
+            # the best amount on the grid up to each cap, plus the cap itself
+            grid = self.borrow_grids[t]
+            owed = self.owed_values[t + 1]
+            if self.borrow_prefixes[t] is None:
+                savings = owed[np.newaxis, :] - curve['rate'][:, np.newaxis] * grid[np.newaxis, :]
+                prefix_best = np.minimum.accumulate(savings, axis=1)
+                prefix_index = np.maximum.accumulate(np.where(savings == prefix_best, np.arange(len(grid)), 0), axis=1)
+                self.borrow_prefixes[t] = prefix_best, prefix_index
+            prefix_best, prefix_index = self.borrow_prefixes[t]
+            cap = np.minimum(deficit, grid[-1])
+            last = np.searchsorted(grid, cap, side='right') - 1
+            columns = np.arange(len(curve['cost']))[np.newaxis, :]
+            grid_saving = prefix_best[columns, last]
+            cap_saving = np.interp(cap, grid, owed) - curve['rate'] * cap
+            amount = np.where(cap_saving < grid_saving, cap, grid[prefix_index[columns, last]])
+            saving = np.minimum(cap_saving, grid_saving)
+            # Only worth it when it beats carrying the unborrowed deficit
+            with_borrowing = curve['cost'] + deficit * curve['rate'] + saving
+            use = (amount > 0) & (with_borrowing < values)
+            values = np.where(use, with_borrowing, values)
+            borrowed = np.where(use, amount, 0)
+
+        choice = np.argmin(values, axis=1)
+        rows = np.arange(len(carry))
+        values, g = values[rows, choice], curve['g'][choice]
+        borrowed, banked = borrowed[rows, choice], banked[rows, choice]
+
+        # Off the grid: the intensity at which the carried balance leaves the year exactly
+        # compliant, taken only when strictly cheaper than the best grid point
+        exact_g = (curve['GHGi_target'] + carry / curve['CB_per_g']) / curve['GHGi_weight']
+        exact_cost = cheapest_blends(curve['coefficients'], curve['costs'], exact_g)[0]
+        exact_values = exact_cost + self.bank_values[t + 1][0]
+        exact = exact_values < values
+        return (np.where(exact, exact_values, values), np.where(exact, exact_g, g),
+                np.where(exact, 0.0, borrowed), np.where(exact, 0.0, banked))
+
+    def solve(self):
+        for t in reversed(range(len(self.years))):
+            self.bank_values[t] = self.step(t, self.bank_grid, True)[0]
+            if t > 0 and self.borrowing:
+                self.owed_values[t] = self.step(t, -self.borrow_factor * self.borrow_grids[t - 1], False)[0]
+
+        # Follow the policy from an empty bank
+        decisions = []
+        carry, can_borrow = 0.0, True
+        for t in range(len(self.years)):
+            _, g, borrowed, banked = self.step(t, np.array([carry]), can_borrow)
+            decisions.append({'carry': carry, 'g': float(g[0]), 'borrowed': float(borrowed[0]), 'banked': float(banked[0])})
+            if borrowed[0] > 0:
+                carry, can_borrow = -self.borrow_factor * float(borrowed[0]), False
+            else:
+                carry, can_borrow = float(banked[0]), True
+        return decisions
+###############################################################################
+
+# Jointly optimal mixes for `years` with banking and borrowing. CO2_prices is one
+# price for every year or a year -> price mapping; fuel prices are the year-specific
+# ones of fuel_prices.json. resolution is the number of points of the intensity and
+# balance grids.
+def optimize_horizon(E_totals, fuel_types, densities, OPS_flags, OPS_details, CO2_prices, fwind, cost_per_MWh,
+                     years=default_years, banking=True, borrowing=True, borrow_limit=0.02, borrow_factor=1.1, resolution=401):
+    years = sorted(years)
+    if not years:
+        raise ValueError("The horizon needs at least one year.")
+    if not isinstance(CO2_prices, dict):
+        CO2_prices = {year: CO2_prices for year in years}
+    missing = [year for year in years if year not in CO2_prices]
+    if missing:
+        raise ValueError(f"No CO2 price for {missing}.")
+
+    coefficients = []
+    for year in years:
+        year_coefficients = mix_coefficients(E_totals, fuel_types, densities, OPS_flags, year)
+        year_coefficients['GHGi_target'] = horizon_GHGi_target(year)
+        coefficients.append(year_coefficients)
+    g = intensity_grid(coefficients[0], [c['GHGi_target'] for c in coefficients], resolution)
+    weight = coefficients[0]['GHGi_weight']
+    summed_E_total = coefficients[0]['summed_E_total']
+
+    curves = []
+    for year, year_coefficients in zip(years, coefficients):
+        costs = linear_costs(year_coefficients, CO2_prices[year])
+        curves.append({
+            'coefficients': year_coefficients,
+            'costs': costs,
+            'g': g,
+            'cost': cheapest_blends(year_coefficients, costs, g)[0],
+            'CB': fwind * (year_coefficients['GHGi_target'] - weight * g) * summed_E_total,
+            'CB_per_g': fwind * summed_E_total,
+            'GHGi_target': year_coefficients['GHGi_target'],
+            'GHGi_weight': weight,
+            'rate': fuel_eu_penalty_rate(weight * g)
+        })
+
+    most_banked = sum(max(curve['CB'].max(), 0) for curve in curves) if banking else 0
+    bank_grid = np.linspace(0, most_banked, resolution) if most_banked > 0 else np.zeros(1)
+    borrow_grids = [np.linspace(0, borrow_limit * c['GHGi_target'] * summed_E_total, resolution) for c in coefficients]
+
+    horizon = _Horizon(years, curves, bank_grid, borrow_grids, banking, borrowing, borrow_factor)
+    decisions = horizon.solve()
+
+    # Report every year with the cost kernel at the chosen mix
+    OPS_penalty, OPS_cost = ops_costs(E_totals, OPS_flags, OPS_details, cost_per_MWh)
+    records = []
+    for year, year_coefficients, curve, decision in zip(years, coefficients, curves, decisions):
+        _, pair, lam = cheapest_blends(year_coefficients, curve['costs'], np.array([decision['g']]))
+        i, j = pair[0]
+        x = blend_mix(len(fuel_types), i, j, lam)[0] if i != j else 100 * np.eye(len(fuel_types))[i]
+        components = evaluate_fuel_mixes(x, E_totals, fuel_types, densities, OPS_flags, OPS_details, year, CO2_prices[year], fwind, cost_per_MWh)
+        GHGi_actual = float(components['GHGi_actual'][0])
+        CB = fwind * (year_coefficients['GHGi_target'] - GHGi_actual) * summed_E_total
+        adjusted_CB = CB + decision['carry'] + decision['borrowed']
+        FuelEU_penalty = fuel_eu_penalty_amount(max(-adjusted_CB, 0), GHGi_actual)
+        fuel_costs = float(components['fuel_costs'][0])
+        EU_ETS_penalty = float(components['EU_ETS_penalty'][0])
+        records.append({
+            'year': year,
+            'x': x,
+            'CO2_price': CO2_prices[year],
+            'GHGi_actual': GHGi_actual,
+            'GHGi_target': year_coefficients['GHGi_target'],
+            'CB': CB,
+            'carried_in': decision['carry'],
+            'borrowed': decision['borrowed'],
+            'adjusted_CB': adjusted_CB,
+            'banked': max(adjusted_CB, 0) if banking and not decision['borrowed'] else 0.0,
+            'fuel_costs': fuel_costs,
+            'EU_ETS_penalty': EU_ETS_penalty,
+            'FuelEU_penalty': FuelEU_penalty,
+            'OPS_cost': OPS_cost,
+            'OPS_penalty': OPS_penalty,
+            'total_cost': fuel_costs + EU_ETS_penalty + FuelEU_penalty + OPS_cost + OPS_penalty
+        })
+
+    return {
+        'years': records,
+        'total_cost': sum(record['total_cost'] for record in records),
+        'banking': banking,
+        'borrowing': borrowing
+    }
+
+def main():
+    # Imported here: optimize_graph pulls in the whole optimizer, which the functions above do not need
+    from optimize_graph import get_user_input_FAST
+    year, CO2_price_per_ton, cost_per_MWh, E_totals, fuel_amounts, selected_fuels, OPS_flags, OPS_details, fwind, fuel_densities = get_user_input_FAST()
+    fuel_types = sorted(set(fuel for trip_fuels in selected_fuels.values() for fuel in trip_fuels))
+    result = optimize_horizon(E_totals, fuel_types, fuel_densities, OPS_flags, OPS_details, CO2_price_per_ton, fwind, cost_per_MWh)
+
+    print("--- Horizon Results ---")
+    for record in result['years']:
+        mix = ", ".join(f"{fuel} {share:.1f}%" for fuel, share in zip(fuel_types, record['x']) if share > 0)
+        print(f"{record['year']}: {mix} | CB {record['CB']:.4g} carried {record['carried_in']:.4g} "
+              f"borrowed {record['borrowed']:.4g} banked {record['banked']:.4g} | "
+              f"FuelEU penalty {record['FuelEU_penalty']:.2f} total cost {record['total_cost']:.2f}")
+    print(f"Total cost over {len(result['years'])} years: {result['total_cost']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+import contextlib
+import functools
+import json
+import math
+import time
+import fuel_calculations
+import fuel_table
+import cost_kernel
+import lp_solver
+
+# Opt-in instrumentation for optimize_fuel_mix. While a solve is traced, the cost
+# functions are swapped for timing wrappers in every module that references them
+# (fuel_calculations and the optimizer module, which imports them by name) and put
+# back afterwards, so an untraced solve runs the original functions untouched.
+# Times are inclusive: calculate_total_Fuel_EU_Penalty includes its
+# calculate_GHGi_actual calls. Only calls made in this process are counted, so a
+# traced solve runs differential_evolution with one worker (the results do not
+# depend on the worker count).
+
+# Optimizer and kernel functions traced when present, on top of fuel_calculations.calculate_*
+traced_names = [
+    'objective_function', 'total_energy_constraint', 'batch_objective_function', 'batch_energy_constraint',
+    'batch_total_costs', 'batch_energy_shortfall', 'calculate_fuel_amounts', 'berth_scenario',
+    'scalar_fuel_amounts', 'scalar_total_cost', 'table_fuel_amounts', 'fuel_table',
+    'evaluate_fuel_mixes', 'evaluate_fuel_amounts', 'fuel_property_arrays', 'ops_costs',
+    'batch_fuel_costs', 'batch_EU_ETS_penalty', 'batch_Fuel_EU_penalty',
+    'scalar_fuel_costs', 'scalar_EU_ETS_penalty', 'scalar_Fuel_EU_penalty',
+    'solve_fuel_mix_lp', 'mix_coefficients', 'linear_costs', 'GHGi_mix', 'fuel_eu_penalty'
+]
+
+# Modules patched in every traced solve, next to the optimizer module
+kernel_modules = [fuel_calculations, fuel_table, cost_kernel, lp_solver]
+
+class SolveTrace:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.functions = {}
+        self.best_costs = []
+        self.generation_times = []
+        self.phases = {}
+        self._phase_start = self.start
+
+    def _wrap(self, function):
+        name = f"{function.__module__}.{function.__qualname__}"
+        counter = self.functions.setdefault(name, {'calls': 0, 'seconds': 0.0})
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                counter['calls'] += 1
+                counter['seconds'] += time.perf_counter() - start
+        wrapper.__wrapped_by_trace__ = True
+        return wrapper
+
+    # differential_evolution callback, called once per generation
+    def de_callback(self, intermediate_result):
+        # Infeasible generations have no finite best cost; None keeps the trace valid JSON
+        best_cost = float(intermediate_result.fun)
+        self.best_costs.append(best_cost if math.isfinite(best_cost) else None)
+        self.generation_times.append(time.perf_counter() - self.start)
+
+    def end_phase(self, name):
+        now = time.perf_counter()
+        self.phases[name] = now - self._phase_start
+        self._phase_start = now
+
+    def as_dict(self):
+        phases = dict(self.phases)
+        # The polish step runs after the last generation and before the solver returns
+        if self.generation_times and 'solve' in phases:
+            solve_end = phases.get('setup', 0) + phases['solve']
+            phases['polish'] = max(0.0, solve_end - self.generation_times[-1])
+        return {
+            'wall_time': time.perf_counter() - self.start,
+            'generations': len(self.best_costs),
+            'best_cost': self.best_costs,
+            'generation_time': self.generation_times,
+            'phases': phases,
+            'functions': {name: dict(counter) for name, counter in sorted(self.functions.items()) if counter['calls']}
+        }
+
+    def write(self, filename):
+        with open(filename, 'w') as f:
+            json.dump(self.as_dict(), f, indent=4)
+
+def _targets(module):
+    names = [name for name in dir(fuel_calculations) if name.startswith('calculate_')]
+    return [name for name in names + traced_names if callable(getattr(module, name, None))]
+
+@contextlib.contextmanager
+def _patched(trace, modules):
+    originals = []
+    wrappers = {}
+    try:
+        for module in kernel_modules + list(modules):
+            for name in _targets(module):
+                function = getattr(module, name)
+                if getattr(function, '__wrapped_by_trace__', False):
+                    continue
+                # One wrapper per function, shared by every module that references it
+                if function not in wrappers:
+                    wrappers[function] = trace._wrap(function)
+                originals.append((module, name, function))
+                setattr(module, name, wrappers[function])
+        yield trace
+    finally:
+        for module, name, function in reversed(originals):
+            setattr(module, name, function)
+
+# Context for the solve: traces `modules` when trace is a SolveTrace, does nothing for None
+def instrumented(trace, *modules):
+    if trace is None:
+        return contextlib.nullcontext()
+    return _patched(trace, modules)
@@ -0,0 +1,122 @@
+import numpy as np
+from cost_kernel import batch_total_costs, mix_coefficients, linear_costs, penalty_per_tonne_VLSFO, VLSFO_MJ_per_tonne
+
+# Exact solver for the optimize2.py model. Fuel costs and EU ETS are linear in the
+# energy percentages p (sum(p) = 100). The FuelEU penalty is zero while the mix is
+# compliant and otherwise depends on p only through the mass-weighted intensity
+#     GHGi_mix(p) = sum(wtw_i * p_i / lcv_i) / sum(p_i / lcv_i),
+# which is linear-fractional, so the penalty branch is not itself an LP.
+#
+# Compliant region: "weighted GHGi <= target" is the linear constraint
+#     sum((GHGi_weight * wtw_i - target) * p_i / lcv_i) <= 0
+# and the problem is an LP, solved with HiGHS.
+#
+# Deficit region: at an optimum p*, p* also minimises the linear costs over
+# {sum(p) = 100, GHGi_mix(p) = GHGi_mix(p*)}, a system of two linear equalities,
+# so some optimum uses at most two fuels. Along each pair of fuels the penalty is
+# monotone in the blend and the objective has at most one stationary point, found
+# in closed form. Evaluating every single fuel, pair kink and pair stationary point
+# therefore finds the global optimum of the deficit branch.
+
+def blend_terms(coefficients, i, j):
+    # Blend lam of fuel i and (1 - lam) of fuel j: GHGi_mix = (q0 + q1 lam) / (r0 + r1 lam)
+    lcv, wtw = coefficients['lcv'], coefficients['wtw']
+    r0, r1 = 1 / lcv[j], 1 / lcv[i] - 1 / lcv[j]
+    q0, q1 = wtw[j] / lcv[j], wtw[i] / lcv[i] - wtw[j] / lcv[j]
+    return r0, r1, q0, q1
+
+def kink_blend(coefficients, i, j):
+    # Blend at which the pair is exactly compliant, None if it does not cross the target
+    lcv, wtw = coefficients['lcv'], coefficients['wtw']
+    weight, target = coefficients['GHGi_weight'], coefficients['GHGi_target']
+    s_i = (weight * wtw[i] - target) / lcv[i]
+    s_j = (weight * wtw[j] - target) / lcv[j]
+    if s_i == s_j:
+        return None
+    lam = -s_j / (s_i - s_j)
+    return lam if 0 < lam < 1 else None
+
+def stationary_blend(coefficients, i, j, cost_i, cost_j, fwind):
+    # Stationary point of 100 * (cost_j + (cost_i - cost_j) lam) + K * (1 - target / weight * (r0 + r1 lam) / (q0 + q1 lam)),
+    # the pair objective on its deficit branch. cost_i/cost_j may be arrays (e.g. one per
+    # CO2 price); the result is nan where there is no stationary point inside (0, 1).
+    r0, r1, q0, q1 = blend_terms(coefficients, i, j)
+    K = fwind * coefficients['summed_E_total'] * penalty_per_tonne_VLSFO / VLSFO_MJ_per_tonne
+    slope = 100 * (np.asarray(cost_i, dtype=float) - np.asarray(cost_j, dtype=float))
+    curvature = K * coefficients['GHGi_target'] / coefficients['GHGi_weight'] * (r1 * q0 - r0 * q1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = np.where(slope != 0, curvature / slope, np.nan)
+        lam = (np.sqrt(np.where(ratio > 0, ratio, np.nan)) - q0) / q1 if q1 != 0 else np.full(slope.shape, np.nan)
+    return np.where((lam > 0) & (lam < 1), lam, np.nan)
+
+def blend_mix(n_fuels, i, j, lam):
+    # Mix(es) of lam of fuel i and (1 - lam) of fuel j, one row per lam
+    lam = np.atleast_1d(lam)
+    X = np.zeros((len(lam), n_fuels))
+    X[:, i] = 100 * lam
+    X[:, j] = 100 * (1 - lam)
+    return X
+
+def fixed_candidates(coefficients, n_fuels):
+    # Mixes that do not depend on the CO2 price, with their pair (None for single fuels)
+    mixes = [100 * np.eye(n_fuels)[i] for i in range(n_fuels)]
+    pairs = [None] * n_fuels
+    for i in range(n_fuels):
+        for j in range(i + 1, n_fuels):
+            lam = kink_blend(coefficients, i, j)
+            if lam is not None:
+                mixes.append(blend_mix(n_fuels, i, j, lam)[0])
+                pairs.append((i, j))
+    return np.array(mixes), pairs
+
+def _pair_candidates(coefficients, costs, fwind):
+    n_fuels = len(costs)
+    candidates = []
+    for i in range(n_fuels):
+        for j in range(i + 1, n_fuels):
+            lam = kink_blend(coefficients, i, j)
+            if lam is not None:
+                candidates.append(blend_mix(n_fuels, i, j, lam)[0])
+            lam = stationary_blend(coefficients, i, j, costs[i], costs[j], fwind)
+            if not np.isnan(lam):
+                candidates.append(blend_mix(n_fuels, i, j, lam)[0])
+    return candidates
+
+def solve_fuel_mix_lp(E_totals, fuel_types, densities, OPS_flags, OPS_details, year, CO2_price_per_ton, fwind, cost_per_MWh):
+    # Imported here: the blend helpers above are used without scipy (co2_sweep.py, horizon.py)
+    from scipy.optimize import linprog, OptimizeResult
+    coefficients = mix_coefficients(E_totals, fuel_types, densities, OPS_flags, year)
+    costs = linear_costs(coefficients, CO2_price_per_ton)
+    n_fuels = len(fuel_types)
+
+    # Compliant region
+    compliance_row = (coefficients['GHGi_weight'] * coefficients['wtw'] - coefficients['GHGi_target']) / coefficients['lcv']
+    lp = linprog(
+        costs,
+        A_ub=compliance_row[np.newaxis, :], b_ub=[0],
+        A_eq=np.ones((1, n_fuels)), b_eq=[100],
+        bounds=[(0, 100) for _ in fuel_types],
+        method='highs'
+    )
+
+    # Deficit region: single fuels and the pair candidates
+    candidates = [100 * np.eye(n_fuels)[i] for i in range(n_fuels)]
+    candidates += _pair_candidates(coefficients, costs, fwind)
+    if lp.status == 0:
+        candidates.append(np.clip(lp.x, 0, 100))
+    candidates = np.array(candidates)
+
+    # Score every candidate with the same kernel as the DE objective
+    total_costs = batch_total_costs(candidates, E_totals, fuel_types, densities, OPS_flags, OPS_details, year, CO2_price_per_ton, fwind, cost_per_MWh)
+    best = int(np.argmin(total_costs))
+
+    return OptimizeResult(
+        x=candidates[best],
+        fun=float(total_costs[best]),
+        success=True,
+        status=0,
+        message='Optimal mix found by the LP solver (HiGHS) and the deficit-branch enumeration.',
+        nfev=len(candidates),
+        nit=getattr(lp, 'nit', 0),
+        compliant_lp=lp
+    )
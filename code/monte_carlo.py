@@ -0,0 +1,118 @@
+import numpy as np
+from cost_kernel import mix_coefficients, GHGi_mix, fuel_eu_penalty, ops_costs, normalize_percentages
+from fuel_table import fuel_table
+from lp_solver import fixed_candidates, stationary_blend, blend_mix
+
+# Monte Carlo price uncertainty for the optimize2.py model. fuel_prices.json gives a
+# price_min/price_max range per fuel and year and the optimizers only use the
+# average; here every draw samples each fuel price uniformly in its range and,
+# optionally, the CO2 price uniformly in CO2_price_range. For a given mix the fuel
+# tonnes, ETS-counted CO2 and FuelEU penalty do not depend on the prices, so the
+# cost of a draw is
+#     fuel_prices @ tonnes + ETS_factor * CO2_price * ETS_CO2 + penalty + OPS
+# and a whole batch of draws is a few array products.
+#
+# Re-optimizing per draw uses the candidates of the exact solver (lp_solver.py):
+# single fuels and pair kinks do not move with the prices, pair stationary points
+# do but are in closed form, so each draw's optimum is the cheapest of a fixed set
+# of columns, evaluated for all draws at once.
+
+############################## SAMPLING ##############################
+def sample_prices(fuel_types, year, draws, CO2_price_per_ton, CO2_price_range=None, seed=None, densities=None):
+    # (draws, fuels) fuel prices in EUR per tonne and (draws,) CO2 prices
+    if draws < 1:
+        raise ValueError("At least one draw is required.")
+    table = fuel_table(fuel_types, year, densities)
+    rng = np.random.default_rng(seed)
+    fuel_prices = rng.uniform(table.price_min, table.price_max, (draws, len(table.fuels)))
+    if CO2_price_range is None:
+        CO2_prices = np.full(draws, float(CO2_price_per_ton))
+    else:
+        CO2_price_min, CO2_price_max = CO2_price_range
+        if CO2_price_max < CO2_price_min:
+            raise ValueError("The CO2 price range must not end below its start.")
+        CO2_prices = rng.uniform(CO2_price_min, CO2_price_max, draws)
+    return fuel_prices, CO2_prices
+
+def _summary(total_costs, percentiles):
+    return {
+        'expected_cost': float(total_costs.mean()),
+        'std': float(total_costs.std(ddof=1)) if len(total_costs) > 1 else 0.0,
+        'percentiles': dict(zip(percentiles, np.percentile(total_costs, percentiles).tolist())),
+        'total_cost': total_costs
+    }
+###############################################################################
+
+############################## FIXED MIX ##############################
+# Cost distribution of one mix (energy percentages of fuel_types) over the draws
+def mix_cost_distribution(x, E_totals, fuel_types, densities, OPS_flags, OPS_details, year, CO2_price_per_ton, fwind, cost_per_MWh,
+                          draws=100000, CO2_price_range=None, seed=None, percentiles=(5, 50, 95)):
+    coefficients = mix_coefficients(E_totals, fuel_types, densities, OPS_flags, year)
+    OPS_penalty, OPS_cost = ops_costs(E_totals, OPS_flags, OPS_details, cost_per_MWh)
+    x = normalize_percentages(np.atleast_2d(np.asarray(x, dtype=float)))[0]
+    _, Fuel_EU_penalty = fuel_eu_penalty(GHGi_mix(x, coefficients), coefficients, fwind)
+
+    fuel_prices, CO2_prices = sample_prices(fuel_types, year, draws, CO2_price_per_ton, CO2_price_range, seed, densities)
+    total_costs = (
+        fuel_prices @ (x * coefficients['fuel_tonnes'])
+        + coefficients['ETS_factor'] * CO2_prices * (x @ coefficients['ETS_CO2'])
+        + Fuel_EU_penalty[0] + OPS_penalty + OPS_cost
+    )
+    result = _summary(total_costs, percentiles)
+    result['x'] = x
+    return result
+###############################################################################
+
+############################## RE-OPTIMIZED PER DRAW ##############################
+def _draw_costs(X, fuel_prices, CO2_prices, coefficients, fwind, OPS_total):
+    # Cost of mix X[k] under draw k
+    _, Fuel_EU_penalty = fuel_eu_penalty(GHGi_mix(X, coefficients), coefficients, fwind)
+    return (
+        (X * coefficients['fuel_tonnes'] * fuel_prices).sum(axis=1)
+        + coefficients['ETS_factor'] * CO2_prices * (X @ coefficients['ETS_CO2'])
+        + Fuel_EU_penalty + OPS_total
+    )
+
+def _optimal_mixes(fuel_prices, CO2_prices, coefficients, fixed_mixes, fwind, OPS_total):
+    n_fuels = fixed_mixes.shape[1]
+    # Per-draw cost of one percentage point of each fuel (fuel plus EU ETS)
+    unit_costs = fuel_prices * coefficients['fuel_tonnes'] + coefficients['ETS_factor'] * CO2_prices[:, np.newaxis] * coefficients['ETS_CO2']
+
+    _, fixed_penalties = fuel_eu_penalty(GHGi_mix(fixed_mixes, coefficients), coefficients, fwind)
+    fixed_costs = unit_costs @ fixed_mixes.T + fixed_penalties + OPS_total
+    best = np.argmin(fixed_costs, axis=1)
+    best_costs = fixed_costs[np.arange(len(best)), best]
+    best_mixes = fixed_mixes[best]
+
+    for i in range(n_fuels):
+        for j in range(i + 1, n_fuels):
+            lam = stationary_blend(coefficients, i, j, unit_costs[:, i], unit_costs[:, j], fwind)
+            X = blend_mix(n_fuels, i, j, np.nan_to_num(lam))
+            costs = np.where(np.isnan(lam), np.inf, _draw_costs(X, fuel_prices, CO2_prices, coefficients, fwind, OPS_total))
+            better = costs < best_costs
+            best_costs = np.where(better, costs, best_costs)
+            best_mixes[better] = X[better]
+    return best_costs, best_mixes
+
+# Distribution of the optimal cost when the mix is re-optimized for every draw.
+# Draws are evaluated in batches of batch_size to bound memory.
+def optimal_cost_distribution(E_totals, fuel_types, densities, OPS_flags, OPS_details, year, CO2_price_per_ton, fwind, cost_per_MWh,
+                              draws=100000, CO2_price_range=None, seed=None, percentiles=(5, 50, 95), batch_size=20000):
+    coefficients = mix_coefficients(E_totals, fuel_types, densities, OPS_flags, year)
+    OPS_penalty, OPS_cost = ops_costs(E_totals, OPS_flags, OPS_details, cost_per_MWh)
+    fixed_mixes, _ = fixed_candidates(coefficients, len(fuel_types))
+
+    fuel_prices, CO2_prices = sample_prices(fuel_types, year, draws, CO2_price_per_ton, CO2_price_range, seed, densities)
+    total_costs = np.empty(draws)
+    mixes = np.empty((draws, len(fuel_types)))
+    for start in range(0, draws, batch_size):
+        batch = slice(start, start + batch_size)
+        total_costs[batch], mixes[batch] = _optimal_mixes(
+            fuel_prices[batch], CO2_prices[batch], coefficients, fixed_mixes, fwind, OPS_penalty + OPS_cost
+        )
+
+    result = _summary(total_costs, percentiles)
+    result['x'] = mixes
+    result['mean_x'] = mixes.mean(axis=0)
+    return result
+###############################################################################
@@ -1,9 +1,10 @@
-from scipy.optimize import differential_evolution
-from scipy.optimize import NonlinearConstraint
-from fuel_calculations import (
-                            calculate_total_Fuel_EU_Penalty, calculate_total_fuel_costs_and_EU_ETS_penalties,
-                            load_fuel_density
-                        )
+import sys
+from warm_start import warm_start_population
+from cost_kernel import evaluate_fixed_fuel_mixes, fixed_fuel_columns, ops_costs, scalar_total_cost
+from fuel_table import fuel_table
+from fuel_mix_result import build_result, print_result
+from instrumentation import SolveTrace, instrumented
+from fuel_calculations import load_fuel_density, load_factor_tables
 
 # Pre-load all necessary data
 fuel_density = load_fuel_density()
@@ -74,45 +75,38 @@ def calculate_fuel_amounts(percentages, E_total, densities, fixed_fuel, fixed_am
 
     return fuel_amounts
 
-def objective_function(x, E_totals, fuel_types, densities, fixed_fuel, MDO_tonnes, OPS_flags, OPS_details, year, CO2_price_per_ton, fwind, cost_per_MWh):
-    percentages = {fuel_types[i]: x[i] for i in range(len(fuel_types))}
-    percentages[fixed_fuel] = 100 - sum(x)  # Ensure total is 100%
-
-    # Separate fuel amounts for each trip type
-    fuel_amounts_intra = calculate_fuel_amounts(percentages, E_totals['intra-eu'], densities, fixed_fuel, MDO_tonnes['intra-eu'])
-    fuel_amounts_inter = calculate_fuel_amounts(percentages, E_totals['inter-eu'], densities, fixed_fuel, MDO_tonnes['inter-eu'])
-    
-    if OPS_flags['berth']:
-        fuel_amounts_berth, OPS_penalty, OPS_cost = berth_scenario(E_totals['berth'], OPS_flags['berth'], 
-                                            OPS_details['berth']['total_installed_power'],
-                                            OPS_details['berth']['established_power_demand'],
-                                            OPS_details['berth']['hours_at_berth'], cost_per_MWh)
-    else:
-        fuel_amounts_berth, OPS_penalty, OPS_cost = berth_scenario(E_totals['berth'], OPS_flags['berth'], 0, 0, 0, cost_per_MWh)
-
-    # Calculate total fuel costs and EU ETS penalties
-    total_fuel_costs, total_EU_ETS_penalty, c02 = calculate_total_fuel_costs_and_EU_ETS_penalties(
-        year, CO2_price_per_ton, fuel_amounts_intra, fuel_amounts_inter, fuel_amounts_berth
+def objective_function(x, E_totals, fuel_types, densities, fixed_fuel, MDO_tonnes, OPS_flags, OPS_details, year, CO2_price_per_ton, fwind, cost_per_MWh, table=None):
+    # Fuel properties by position in the compiled fuel table (see fuel_table.py):
+    # the fixed fuel, the optimized fuels and MDO for the berth. optimize_fuel_mix
+    # passes the table it built for the solve.
+    if table is None:
+        table = fuel_table(fixed_fuel_columns(fuel_types, fixed_fuel), year, densities)
+
+    # Separate fuel amounts for each trip type, one entry per table column
+    fuel_amounts_intra = table_fuel_amounts(x, E_totals['intra-eu'], table, fuel_types, fixed_fuel, MDO_tonnes['intra-eu'])
+    fuel_amounts_inter = table_fuel_amounts(x, E_totals['inter-eu'], table, fuel_types, fixed_fuel, MDO_tonnes['inter-eu'])
+    fuel_amounts_berth = [0.0] * len(table.fuels)
+    if not OPS_flags['berth']:
+        # Standard calculation if OPS is not used: the berth runs on MDO
+        fuel_amounts_berth[table.index['MDO']] = E_totals['berth'] / table.scalars[table.index['MDO']][0]
+    OPS_penalty, OPS_cost = ops_costs(E_totals, OPS_flags, OPS_details, cost_per_MWh)
+
+    return scalar_total_cost(
+        fuel_amounts_intra, fuel_amounts_inter, fuel_amounts_berth, table,
+        E_totals, OPS_flags, year, CO2_price_per_ton, fwind, OPS_penalty, OPS_cost
     )
 
-    # Calculate total Fuel EU penalty
-    fuel_percentages_intra = {fuel: amount / sum(fuel_amounts_intra.values()) * 100 for fuel, amount in fuel_amounts_intra.items()}
-    fuel_percentages_inter = {fuel: amount / sum(fuel_amounts_inter.values()) * 100 for fuel, amount in fuel_amounts_inter.items()}
-    
-    if OPS_flags['berth']:
-        fuel_percentages_berth = {'MDO': 0}  # No MDO usage if OPS is used
-    else:
-        fuel_percentages_berth = {fuel: amount / sum(fuel_amounts_berth.values()) * 100 for fuel, amount in fuel_amounts_berth.items()}
-
-    total_CB, total_Fuel_EU_penalty = calculate_total_Fuel_EU_Penalty(
-        year, E_totals['intra-eu'], E_totals['inter-eu'], E_totals['berth'], fwind,
-        fuel_percentages_intra, fuel_percentages_inter, fuel_percentages_berth
-    )
-
-    # Calculate total cost
-    total_cost = total_fuel_costs['average'] + total_Fuel_EU_penalty + total_EU_ETS_penalty + OPS_cost + OPS_penalty
-
-    return total_cost
+def table_fuel_amounts(x, E_total, table, fuel_types, fixed_fuel, fixed_amount):
+    # As calculate_fuel_amounts, as a list over the table columns (fixed fuel first)
+    scalars = table.scalars
+    remaining_E_total = E_total - fixed_amount * scalars[0][0]
+    fuel_amounts = [0.0] * len(scalars)
+    fuel_amounts[0] = fixed_amount
+    for i, fuel in enumerate(fuel_types):
+        if fuel != fixed_fuel:
+            column = table.index[fuel]
+            fuel_amounts[column] = (x[i] / 100) * remaining_E_total / scalars[column][0]
+    return fuel_amounts
 
 def total_energy_constraint(x, E_total, fuel_types, densities, fixed_fuel, fixed_amount):
     percentages = {fuel_types[i]: x[i] for i in range(len(fuel_types))}
@@ -121,91 +115,70 @@ def total_energy_constraint(x, E_total, fuel_types, densities, fixed_fuel, fixed
     total_energy_provided = sum(amount * densities[fuel] for fuel, amount in fuel_amounts.items())
     return total_energy_provided - E_total
 
-def optimize_fuel_mix(E_totals, fuel_types, densities, fixed_fuel, MDO_tonnes, OPS_flags, OPS_details, year, CO2_price_per_ton, fwind, cost_per_MWh):
-    print(fuel_types)
+def optimize_fuel_mix(E_totals, fuel_types, densities, fixed_fuel, MDO_tonnes, OPS_flags, OPS_details, year, CO2_price_per_ton, fwind, cost_per_MWh, verbose=True, workers=8, seed=None, x0=None, init=None, instrument=False, trace_file=None):
+    # scipy is imported on the first solve, so --help and cached runs do not pay for it
+    from scipy.optimize import differential_evolution, NonlinearConstraint
+    # Call counts, timings and the best-cost trajectory (see instrumentation.py)
+    trace = SolveTrace() if instrument or trace_file else None
+    load_factor_tables()  # parse the factor tables once, before any worker processes start
+    if verbose:
+        print(fuel_types)
     bounds = [(0, 100) for _ in fuel_types]
 
     # Define the constraint for total energy
     constraint_fun = lambda x: total_energy_constraint(x, sum(E_totals.values()), fuel_types, densities, fixed_fuel, sum(MDO_tonnes.values()))
     energy_constraint = NonlinearConstraint(constraint_fun, lb=0, ub=0)
 
-    result = differential_evolution(
-        objective_function,
-        bounds,
-        args=(E_totals, fuel_types, densities, fixed_fuel, MDO_tonnes, OPS_flags, OPS_details, year, CO2_price_per_ton, fwind, cost_per_MWh),
-        constraints=(energy_constraint,),
-        strategy='best1bin',  # Try different strategy
-        maxiter=10000,  # Increased iterations
-        popsize=10,  # Larger population size
-        tol=0.0001,
-        mutation=(0.5, 1.5),  # Adjust mutation
-        recombination=0.9,  # Higher recombination
-        seed=None,
-        callback=None,
-        disp=True,
-        polish=True,
-        init='latinhypercube',  # Different initialization strategy
-        workers=8,
-        atol=0
-    )
-
-    # Extract the optimal percentages
-    optimal_percentages = result.x
-
-    percentages = {fuel_types[i]: optimal_percentages[i] for i in range(len(fuel_types))}
-    percentages[fixed_fuel] = 100 - sum(optimal_percentages)  # Ensure total is 100%
-
-    # Separate fuel amounts for each trip type
-    fuel_amounts_intra = calculate_fuel_amounts(percentages, E_totals['intra-eu'], densities, fixed_fuel, MDO_tonnes['intra-eu'])
-    fuel_amounts_inter = calculate_fuel_amounts(percentages, E_totals['inter-eu'], densities, fixed_fuel, MDO_tonnes['inter-eu'])
-    
-    if OPS_flags['berth']:
-        fuel_amounts_berth, OPS_penalty, OPS_cost = berth_scenario(E_totals['berth'], OPS_flags['berth'], 
-                                            OPS_details['berth']['total_installed_power'],
-                                            OPS_details['berth']['established_power_demand'],
-                                            OPS_details['berth']['hours_at_berth'], cost_per_MWh)
-    else:
-        fuel_amounts_berth, OPS_penalty, OPS_cost = berth_scenario(E_totals['berth'], OPS_flags['berth'], 0, 0, 0, cost_per_MWh)
-
-    total_fuel_amounts = {}
-    for fuel_amounts in [fuel_amounts_intra, fuel_amounts_inter, fuel_amounts_berth]:
-        for fuel, amount in fuel_amounts.items():
-            if fuel in total_fuel_amounts:
-                total_fuel_amounts[fuel] += amount
-            else:
-                total_fuel_amounts[fuel] = amount
-
-    # Calculate total fuel costs and EU ETS penalties
-    total_fuel_costs, total_EU_ETS_penalty, c02 = calculate_total_fuel_costs_and_EU_ETS_penalties(
-        year, CO2_price_per_ton, fuel_amounts_intra, fuel_amounts_inter, fuel_amounts_berth
-    )
-
-    # Calculate total Fuel EU penalty
-    fuel_percentages_intra = {fuel: amount / sum(fuel_amounts_intra.values()) * 100 for fuel, amount in fuel_amounts_intra.items()}
-    fuel_percentages_inter = {fuel: amount / sum(fuel_amounts_inter.values()) * 100 for fuel, amount in fuel_amounts_inter.items()}
-    
-    if OPS_flags['berth']:
-        fuel_percentages_berth = {'MDO': 0}  # No MDO usage if OPS is used
-    else:
-        fuel_percentages_berth = {fuel: amount / sum(fuel_amounts_berth.values()) * 100 for fuel, amount in fuel_amounts_berth.items()}
-
-    total_CB, total_Fuel_EU_penalty = calculate_total_Fuel_EU_Penalty(
-        year, E_totals['intra-eu'], E_totals['inter-eu'], E_totals['berth'], fwind,
-        fuel_percentages_intra, fuel_percentages_inter, fuel_percentages_berth
+    # Fuel properties for every evaluation of this solve
+    table = fuel_table(fixed_fuel_columns(fuel_types, fixed_fuel), year, densities)
+
+    # Start from the given population, or around a known good point (warm start)
+    popsize = 10
+    if init is None:
+        init = warm_start_population(x0, bounds, popsize, seed=seed) if x0 is not None else 'latinhypercube'
+
+    if trace is not None:
+        trace.end_phase('setup')
+    with instrumented(trace, sys.modules[__name__]):
+        result = differential_evolution(
+            objective_function,
+            bounds,
+            args=(E_totals, fuel_types, densities, fixed_fuel, MDO_tonnes, OPS_flags, OPS_details, year, CO2_price_per_ton, fwind, cost_per_MWh, table),
+            constraints=(energy_constraint,),
+            strategy='best1bin',  # Try different strategy
+            maxiter=10000,  # Increased iterations
+            popsize=popsize,  # Larger population size
+            tol=0.0001,
+            mutation=(0.5, 1.5),  # Adjust mutation
+            recombination=0.9,  # Higher recombination
+            seed=seed,
+            callback=trace.de_callback if trace is not None else None,
+            disp=verbose,
+            polish=True,
+            init=init,  # Latin hypercube, or a warm-start population
+            workers=workers if trace is None else 1,
+            updating='deferred',  # Same trajectory for any number of workers
+            atol=0
+        )
+    if trace is not None:
+        trace.end_phase('solve')
+
+    # Every reported component comes from one pass of the cost kernel
+    components = evaluate_fixed_fuel_mixes(
+        result.x, E_totals, fuel_types, densities, fixed_fuel, MDO_tonnes, OPS_flags, OPS_details, year, CO2_price_per_ton, fwind, cost_per_MWh
     )
+    fuel_mix_result = build_result(result.x, fuel_types, components['fuel_columns'], components, densities, E_totals, year, CO2_price_per_ton, 'de', result)
 
-    # Calculate total cost
-    total_cost = total_fuel_costs['average'] + total_Fuel_EU_penalty + total_EU_ETS_penalty + OPS_cost + OPS_penalty
+    if trace is not None:
+        trace.end_phase('post_solve')
+        fuel_mix_result.trace = trace.as_dict()
+        if trace_file:
+            trace.write(trace_file)
 
-    print(f"Optimal fuel amounts (tonnes): {total_fuel_amounts}")
-    print(f"Total CB: {total_CB}")
-    print(f"Final FuelEU penalty: {total_Fuel_EU_penalty}")
-    print(f"Final EU ETS penalty: {total_EU_ETS_penalty}")
-    print(f"OPS cost: {OPS_cost}")
-    print(f"OPS penalty: {OPS_penalty}")
-    print(f"Optimal total cost: {total_cost}")
+    if verbose:
+        print_result(fuel_mix_result)
 
-    return result
+    return fuel_mix_result
 
 def berth_scenario(E_total, OPS_use, total_installed_power, established_power_demand, hours_at_berth, cost_per_MWh):
     MJ_to_MWh = 0.0002777778  # Conversion factor from MJ to MWh
@@ -1,12 +1,26 @@
-from scipy.optimize import differential_evolution, NonlinearConstraint, minimize
-from fuel_calculations import (
-                            calculate_total_Fuel_EU_Penalty, calculate_total_fuel_costs_and_EU_ETS_penalties,
-                            load_fuel_density, load_fuel_data
-                        )
-import pandas as pd
+from fuel_calculations import load_fuel_density, load_factor_tables, load_fuel_data
+from cost_kernel import batch_total_costs, batch_energy_shortfall, evaluate_fuel_mixes, ops_costs, scalar_fuel_amounts, scalar_total_cost
+from fuel_table import fuel_table
+from fuel_mix_result import build_result, print_result
+from sensitivities import cost_sensitivities
+from instrumentation import SolveTrace, instrumented
+from lp_solver import solve_fuel_mix_lp
+from warm_start import warm_start_population
+from result_cache import cached_call
+from scenario_file import load_scenarios, fast_inputs
+import os
+import sys
+import numpy as np
 
 fuel_densities = load_fuel_density()
-def get_user_input_FAST():
+fast_input_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fast.toml')
+chart_data_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'graphs', 'data.csv')
+
+# Inputs of one vessel of a scenario file (JSON, JSONL or TOML, see scenario_file.py),
+# or of a legacy .nigga file with one value per line in fuel_density.json order
+def get_user_input_FAST(filename=fast_input_file, vessel=0):
+    if not filename.endswith('.nigga'):
+        return fast_inputs(load_scenarios(filename, fuel_densities), vessel)
     fwind = 1.0
     fuel_amounts = {}
     selected_fuels = {}
@@ -16,7 +30,7 @@ def get_user_input_FAST():
     fuel_types = ['HFO', 'VLSFO', 'MDO', 'BIO-DIESEL', 'LNG', 'E-METHANOL']
 
     trip_types = ['intra-eu', 'inter-eu', 'berth']
-    with open("C:\\Users\\Lenovo\\Desktop\\skatouts9\\maritime_optimization\\code\\fast.nigga", 'r') as file:
+    with open(filename, 'r') as file:
             year = int(file.readline().strip())
             CO2_price_per_ton = float(file.readline().strip())
             cost_per_MWh = float(file.readline().strip())
@@ -111,50 +125,30 @@ def calculate_fuel_amounts(percentages, E_total, densities):
         fuel_amounts[fuel] = required_energy / energy_content_per_tonne
     return fuel_amounts
 
-def objective_function(x, E_totals, fuel_types, densities, OPS_flags, OPS_details, year, CO2_price_per_ton, fwind, cost_per_MWh):
-    percentages = {fuel_types[i]: x[i] for i in range(len(fuel_types))}
-    percentages_sum = sum(percentages.values())
+def objective_function(x, E_totals, fuel_types, densities, OPS_flags, OPS_details, year, CO2_price_per_ton, fwind, cost_per_MWh, table=None):
+    # Fuel properties by position in the compiled fuel table (see fuel_table.py).
+    # optimize_fuel_mix passes the table it built for the solve.
+    if table is None:
+        table = fuel_table(fuel_types, year, densities)
+    percentages = list(x)
+    percentages_sum = sum(percentages)
     if percentages_sum > 100:  # Ensure the percentages sum to 100
-        percentages = {fuel: (percentage / percentages_sum) * 100 for fuel, percentage in percentages.items()}
-    else:
-        percentages = {fuel: percentage for fuel, percentage in percentages.items()}
+        percentages = [(percentage / percentages_sum) * 100 for percentage in percentages]
 
-    # Separate fuel amounts for each trip type
-    fuel_amounts_intra = calculate_fuel_amounts(percentages, E_totals['intra-eu'], densities)
-    fuel_amounts_inter = calculate_fuel_amounts(percentages, E_totals['inter-eu'], densities)
-    
+    # Separate fuel amounts for each trip type, one entry per fuel
+    fuel_amounts_intra = scalar_fuel_amounts(percentages, E_totals['intra-eu'], table)
+    fuel_amounts_inter = scalar_fuel_amounts(percentages, E_totals['inter-eu'], table)
     if OPS_flags['berth']:
-        fuel_amounts_berth, OPS_penalty, OPS_cost = berth_scenario(percentages, E_totals['berth'], densities, OPS_flags['berth'], 
-                                            OPS_details['berth']['total_installed_power'],
-                                            OPS_details['berth']['established_power_demand'],
-                                            OPS_details['berth']['hours_at_berth'], cost_per_MWh)
+        fuel_amounts_berth = [0.0] * len(percentages)
     else:
-        fuel_amounts_berth, OPS_penalty, OPS_cost = berth_scenario(percentages, E_totals['berth'], densities, OPS_flags['berth'], 0, 0, 0, cost_per_MWh)
+        fuel_amounts_berth = scalar_fuel_amounts(percentages, E_totals['berth'], table)
+    OPS_penalty, OPS_cost = ops_costs(E_totals, OPS_flags, OPS_details, cost_per_MWh)
 
-    # Calculate total fuel costs and EU ETS penalties
-    total_fuel_costs, total_EU_ETS_penalty, _  = calculate_total_fuel_costs_and_EU_ETS_penalties(
-        year, CO2_price_per_ton, fuel_amounts_intra, fuel_amounts_inter, fuel_amounts_berth
+    return scalar_total_cost(
+        fuel_amounts_intra, fuel_amounts_inter, fuel_amounts_berth, table,
+        E_totals, OPS_flags, year, CO2_price_per_ton, fwind, OPS_penalty, OPS_cost
     )
 
-    # Calculate total Fuel EU penalty
-    fuel_percentages_intra = {fuel: amount / sum(fuel_amounts_intra.values()) * 100 for fuel, amount in fuel_amounts_intra.items()}
-    fuel_percentages_inter = {fuel: amount / sum(fuel_amounts_inter.values()) * 100 for fuel, amount in fuel_amounts_inter.items()}
-    
-    if OPS_flags['berth']:
-        fuel_percentages_berth = {fuel: 0 for fuel in fuel_types}
-    else:
-        fuel_percentages_berth = {fuel: amount / sum(fuel_amounts_berth.values()) * 100 for fuel, amount in fuel_amounts_berth.items()}
-
-    _, total_Fuel_EU_penalty = calculate_total_Fuel_EU_Penalty(
-        year, E_totals['intra-eu'], E_totals['inter-eu'], E_totals['berth'], fwind,
-        fuel_percentages_intra, fuel_percentages_inter, fuel_percentages_berth
-    )
-
-    # Calculate total cost
-    total_cost = total_fuel_costs['average'] + total_Fuel_EU_penalty + total_EU_ETS_penalty + OPS_cost + OPS_penalty
-
-    return total_cost
-
 def total_energy_constraint(x, E_total, fuel_types, densities):
     percentages = {fuel_types[i]: x[i] for i in range(len(fuel_types))}
     percentages_sum = sum(percentages.values())
@@ -167,125 +161,134 @@ def total_energy_constraint(x, E_total, fuel_types, densities):
     total_energy_provided = sum(amount * densities[fuel] for fuel, amount in fuel_amounts.items())
     return total_energy_provided - E_total
 
-def optimize_fuel_mix(E_totals, fuel_types, densities, OPS_flags, OPS_details, year, CO2_price_per_ton, fwind, cost_per_MWh):
+# Vectorized objective: x is (n_fuels, S) for a whole differential_evolution
+# population and (n_fuels,) when polishing
+def batch_objective_function(x, E_totals, fuel_types, densities, OPS_flags, OPS_details, year, CO2_price_per_ton, fwind, cost_per_MWh, table=None):
+    x = np.asarray(x)
+    total_costs = batch_total_costs(x.T, E_totals, fuel_types, densities, OPS_flags, OPS_details, year, CO2_price_per_ton, fwind, cost_per_MWh, table)
+    return total_costs if x.ndim > 1 else total_costs[0]
+
+def batch_energy_constraint(x, E_total, fuel_types, densities, table=None):
+    x = np.asarray(x)
+    shortfall = batch_energy_shortfall(x.T, E_total, fuel_types, densities, table)
+    return shortfall[np.newaxis, :] if x.ndim > 1 else shortfall[0]
+
+def optimize_fuel_mix(E_totals, fuel_types, densities, OPS_flags, OPS_details, year, CO2_price_per_ton, fwind, cost_per_MWh, vectorized=True, solver='de', x0=None, init=None, verbose=True, seed=None, instrument=False, trace_file=None, sensitivities=False, chart_file=None, use_cache=False):
+    # scipy is imported on the first solve, so importing this module stays cheap
+    from scipy.optimize import differential_evolution, NonlinearConstraint
+    # Call counts, timings and the best-cost trajectory (see instrumentation.py)
+    trace = SolveTrace() if instrument or trace_file else None
+    if solver not in ('de', 'lp'):
+        raise ValueError(f"Unknown solver '{solver}', expected 'de' or 'lp'.")
+    if use_cache and trace is None:
+        # Opt-in on-disk result cache (see result_cache.py), so repeated chart runs do
+        # not re-solve; traced solves always run
+        def solve():
+            return optimize_fuel_mix(E_totals, fuel_types, densities, OPS_flags, OPS_details, year, CO2_price_per_ton, fwind, cost_per_MWh,
+                                     vectorized=vectorized, solver=solver, x0=x0, init=init, verbose=False, seed=seed, sensitivities=sensitivities)
+        cache_inputs = {
+            'solver': f"optimize2.optimize_fuel_mix/{solver}", 'E_totals': E_totals, 'fuel_types': fuel_types, 'densities': densities,
+            'OPS_flags': OPS_flags, 'OPS_details': OPS_details, 'year': year, 'CO2_price_per_ton': CO2_price_per_ton, 'fwind': fwind,
+            'cost_per_MWh': cost_per_MWh, 'vectorized': vectorized, 'x0': x0, 'init': init, 'seed': seed, 'sensitivities': sensitivities
+        }
+        fuel_mix_result = cached_call(solve, cache_inputs)
+        if verbose:
+            print_result(fuel_mix_result)
+        if chart_file is not None:
+            append_chart_row(chart_file, fuel_mix_result, verbose)
+        return fuel_mix_result
+    load_factor_tables()  # parse the factor tables once, before any worker processes start
     bounds = [(0, 100) for _ in fuel_types]
 
+    # Fuel properties for every evaluation of this solve
+    table = fuel_table(fuel_types, year, densities)
+
     # # Define the constraint for total energy
     # constraint_fun = lambda x: total_energy_constraint(x, sum(E_totals.values()), fuel_types, densities)
     # energy_constraint = NonlinearConstraint(constraint_fun, lb=0, ub=0)
 
+    # Evaluate the whole population per call unless the scalar path is requested. The
+    # functions are looked up when called, so a traced solve sees the timing wrappers.
+    def energy_constraint_function(x, E_total, fuel_types, densities):
+        if vectorized:
+            return batch_energy_constraint(x, E_total, fuel_types, densities, table)
+        return total_energy_constraint(x, E_total, fuel_types, densities)
+
     # Define the constraints for total energy for each trip type
     constraints = []
     for trip_type in E_totals.keys():
-        constraint_fun = lambda x, trip_type=trip_type: total_energy_constraint(x, E_totals[trip_type], fuel_types, densities)
+        constraint_fun = lambda x, trip_type=trip_type: energy_constraint_function(x, E_totals[trip_type], fuel_types, densities)
         energy_constraint = NonlinearConstraint(constraint_fun, lb=0, ub=0)
         constraints.append(energy_constraint)
 
-    result = differential_evolution(
-        objective_function,
-        bounds,
-        args=(E_totals, fuel_types, densities, OPS_flags, OPS_details, year, CO2_price_per_ton, fwind, cost_per_MWh),
-        constraints=(energy_constraint,),
-        strategy='best1bin',  # Try different strategy
-        maxiter=3000,  # Increased iterations
-        popsize=250,  # Larger population size
-        tol=1e-8,
-        mutation=(0.1, 1.9),  # Adjust mutation
-        recombination=0.9,  # Higher recombination
-        seed=None,
-        callback=None,
-        disp=True,
-        polish=True,
-        init='latinhypercube',  # Different initialization strategy
-        atol=0,
-        # workers=4
-    )
-
-    # Extract the optimal percentages
-    optimal_percentages = result.x
-
-    percentages = {fuel_types[i]: optimal_percentages[i] for i in range(len(fuel_types))}
-    percentages_sum = sum(percentages.values())
-    if percentages_sum > 100:  # Ensure the percentages sum to 100
-        percentages = {fuel: (percentage / percentages_sum) * 100 for fuel, percentage in percentages.items()}
-    else:
-        percentages = {fuel: percentage for fuel, percentage in percentages.items()}
-
-    # Separate fuel amounts for each trip type
-    fuel_amounts_intra = calculate_fuel_amounts(percentages, E_totals['intra-eu'], densities)
-    fuel_amounts_inter = calculate_fuel_amounts(percentages, E_totals['inter-eu'], densities)
-    
-    if OPS_flags['berth']:
-        fuel_amounts_berth, OPS_penalty, OPS_cost = {}, 0, 0
-    else:
-        fuel_amounts_berth = calculate_fuel_amounts(percentages, E_totals['berth'], densities)
-        OPS_penalty, OPS_cost = 0, 0
-
-    total_fuel_amounts = {}
-    for fuel_amounts in [fuel_amounts_intra, fuel_amounts_inter, fuel_amounts_berth]:
-        for fuel, amount in fuel_amounts.items():
-            if fuel in total_fuel_amounts:
-                total_fuel_amounts[fuel] += amount
-            else:
-                total_fuel_amounts[fuel] = amount
-
-    # Calculate total fuel costs and EU ETS penalties
-    total_fuel_costs, total_EU_ETS_penalty, total_CO2_emissions = calculate_total_fuel_costs_and_EU_ETS_penalties(
-        year, CO2_price_per_ton, fuel_amounts_intra, fuel_amounts_inter, fuel_amounts_berth
-    )
-
-    # Calculate total Fuel EU penalty
-    fuel_percentages_intra = {fuel: amount / sum(fuel_amounts_intra.values()) * 100 for fuel, amount in fuel_amounts_intra.items()}
-    fuel_percentages_inter = {fuel: amount / sum(fuel_amounts_inter.values()) * 100 for fuel, amount in fuel_amounts_inter.items()}
-    
-    if OPS_flags['berth']:
-        fuel_percentages_berth = {fuel: 0 for fuel in fuel_types}
-    else:
-        fuel_percentages_berth = {fuel: amount / sum(fuel_amounts_berth.values()) * 100 for fuel, amount in fuel_amounts_berth.items()}
-
-    total_CB, total_Fuel_EU_penalty = calculate_total_Fuel_EU_Penalty(
-        year, E_totals['intra-eu'], E_totals['inter-eu'], E_totals['berth'], fwind,
-        fuel_percentages_intra, fuel_percentages_inter, fuel_percentages_berth,True
-    )
-
-    # Calculate total cost
-    total_cost = total_fuel_costs['average'] + total_Fuel_EU_penalty + total_EU_ETS_penalty + OPS_cost + OPS_penalty
-    fuel_costs = total_cost - total_Fuel_EU_penalty - total_EU_ETS_penalty - OPS_cost - OPS_penalty
-
-    # Print results
-    print("\n--- Optimization Results ---")
-    print(f"Intra EU energy [MJ]: {E_totals['intra-eu']}")
-    print(f"Inter EU energy [MJ]: {E_totals['inter-eu']}")
-    print(f"Berth EU energy [MJ]: {E_totals['berth']}")
-    print(f"Total Applicable Energy [MJ]: {sum(E_totals.values())}")
-    print(f"Optimal fuel amounts (tonnes): {total_fuel_amounts}")
-    print(f"Optimal fuel amounts for Intra EU (tonnes): {fuel_amounts_intra}")
-    print(f"Optimal fuel amounts for Inter EU (tonnes): {fuel_amounts_inter}")
-    print(f"Optimal fuel amounts for Berth (tonnes): {fuel_amounts_berth}")
-    print(f"AFTER OPTIMIZATION Intra EU energy [MJ]: {sum(fuel_amounts_intra[fuel] * fuel_densities[fuel] for fuel in fuel_types)}")
-    print(f"AFTER OPTIMIZATION Inter EU energy [MJ]: {sum(fuel_amounts_inter[fuel] * fuel_densities[fuel] for fuel in fuel_types)}")
-    print(f"AFTER OPTIMIZATION Berth EU energy [MJ]: {sum(fuel_amounts_berth[fuel] * fuel_densities[fuel] for fuel in fuel_types)}")
-    print(f"Total CB: {total_CB}")
-    print(f"Final FuelEU penalty: {total_Fuel_EU_penalty}")
-    print(f"Final EU ETS penalty: {total_EU_ETS_penalty}")
-    print(f"EU ETS Allowances [tonnes]: {total_CO2_emissions}")
-    print(f"OPS cost: {OPS_cost}")
-    print(f"OPS penalty: {OPS_penalty}")
-    print(f"Fuel costs: {fuel_costs}")
-    print(f"Optimal total cost: {total_cost}")
-    
-    df = pd.read_csv('../graphs/data.csv')
-    new_row = {'year': year, 'CO2_price': CO2_price_per_ton, 'total_cost':total_cost, 'fuel_cost': fuel_costs, 'eu_ets_penalty': total_EU_ETS_penalty, 'fuelEU_penalty':total_Fuel_EU_penalty, 'eu_ets_allowances':total_CO2_emissions, 'scenario': fuel_types}
-    new_row_df = pd.DataFrame([new_row])
+    # Start from the given population, or around a known good point (warm start)
+    popsize = 250
+    if init is None:
+        init = warm_start_population(x0, bounds, popsize, seed=seed) if x0 is not None else 'latinhypercube'
+
+    if trace is not None:
+        trace.end_phase('setup')
+    with instrumented(trace, sys.modules[__name__]):
+        if solver == 'lp':
+            # Exact solve, see lp_solver.py
+            result = solve_fuel_mix_lp(E_totals, fuel_types, densities, OPS_flags, OPS_details, year, CO2_price_per_ton, fwind, cost_per_MWh)
+        else:
+            result = differential_evolution(
+                batch_objective_function if vectorized else objective_function,
+                bounds,
+                args=(E_totals, fuel_types, densities, OPS_flags, OPS_details, year, CO2_price_per_ton, fwind, cost_per_MWh, table),
+                constraints=(energy_constraint,),
+                strategy='best1bin',  # Try different strategy
+                maxiter=3000,  # Increased iterations
+                popsize=popsize,  # Larger population size
+                tol=1e-8,
+                mutation=(0.1, 1.9),  # Adjust mutation
+                recombination=0.9,  # Higher recombination
+                seed=seed,
+                callback=trace.de_callback if trace is not None else None,
+                disp=verbose,
+                polish=True,
+                init=init,  # Latin hypercube, or a warm-start population
+                atol=0,
+                vectorized=vectorized,
+                # workers=4
+            )
+    if trace is not None:
+        trace.end_phase('solve')
+
+    # Every reported component comes from one pass of the cost kernel
+    components = evaluate_fuel_mixes(result.x, E_totals, fuel_types, densities, OPS_flags, OPS_details, year, CO2_price_per_ton, fwind, cost_per_MWh, table)
+    fuel_mix_result = build_result(result.x, fuel_types, fuel_types, components, densities, E_totals, year, CO2_price_per_ton, solver, result)
+    if sensitivities:
+        # Derivatives of the optimal cost with respect to every input, see sensitivities.py
+        fuel_mix_result.sensitivities = cost_sensitivities(result.x, E_totals, fuel_types, densities, OPS_flags, OPS_details, year, CO2_price_per_ton, fwind, cost_per_MWh)
+
+    if trace is not None:
+        trace.end_phase('post_solve')
+        fuel_mix_result.trace = trace.as_dict()
+        if trace_file:
+            trace.write(trace_file)
+
+    if verbose:
+        print_result(fuel_mix_result)
+
+    # Appending to the chart table (e.g. chart_data_file) is opt-in: batch and pool
+    # callers would pay the file I/O on every solve and race on the file
+    if chart_file is not None:
+        append_chart_row(chart_file, fuel_mix_result, verbose)
+
+    return fuel_mix_result
+
+def append_chart_row(chart_file, fuel_mix_result, verbose=False):
+    import pandas as pd
+    df = pd.read_csv(chart_file)
+    new_row_df = pd.DataFrame([fuel_mix_result.chart_row()])
 
     df = pd.concat([df, new_row_df], ignore_index=True)
 
-    df.to_csv('../graphs/data.csv', index=False)
-    print(df)
-
-    # recalculated_cost = objective_function(result.x, E_totals, fuel_types, densities, OPS_flags, OPS_details, year, CO2_price_per_ton, fwind, cost_per_MWh)
-    # print(f"Optimal total RECALCULATED cost: {recalculated_cost}")
-    return result
+    df.to_csv(chart_file, index=False)
+    if verbose:
+        print(df)
 
 def berth_scenario(percentages, E_total, densities, OPS_use, total_installed_power, established_power_demand, hours_at_berth, cost_per_MWh):
     MJ_to_MWh = 0.0002777778  # Conversion factor from MJ to MWh
@@ -320,7 +323,9 @@ def main():
         year=year,
         CO2_price_per_ton=CO2_price_per_ton,
         fwind=fwind,
-        cost_per_MWh=cost_per_MWh
+        cost_per_MWh=cost_per_MWh,
+        chart_file=chart_data_file,
+        use_cache=True
     )
 
     # print("Optimized result:", result)
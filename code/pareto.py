@@ -0,0 +1,127 @@
+import numpy as np
+from cost_kernel import mix_coefficients, linear_costs, evaluate_fuel_mixes, GHGi_mix, fuel_eu_penalty, ops_costs
+from lp_solver import fixed_candidates, stationary_blend, blend_mix
+from horizon import cheapest_blends
+
+# Cost versus GHG intensity frontier of the optimize2.py model: for each level e of
+# the weighted GHGi (as calculate_total_Fuel_EU_Penalty computes it), the cheapest
+# total cost (fuel + EU ETS + FuelEU + OPS) of a mix whose weighted GHGi is at most
+# e, i.e. the epsilon-constraint problem swept over e.
+#
+# The weighted GHGi is GHGi_weight times the mass-weighted intensity g of the mix,
+# so a level is a bound g <= e / GHGi_weight. As in lp_solver.py some optimum blends
+# at most two fuels, and along a pair the cost is linear plus a penalty term, so the
+# optimum under the bound is either
+#   - on the bound: the cheapest blend of intensity exactly e / GHGi_weight (one
+#     closed-form blend per pair, see horizon.cheapest_blends), or
+#   - one of the unbounded candidates below it: single fuels, pair kinks and pair
+#     stationary points.
+# The unbounded candidates do not depend on e, so they are scored once and their
+# running minimum over increasing intensity is carried along the sweep; each level
+# only adds its on-bound blends.
+
+############################## CANDIDATES ##############################
+def _unbounded_candidates(coefficients, costs, fwind, n_fuels):
+    mixes, _ = fixed_candidates(coefficients, n_fuels)
+    mixes = list(mixes)
+    for i in range(n_fuels):
+        for j in range(i + 1, n_fuels):
+            lam = stationary_blend(coefficients, i, j, costs[i], costs[j], fwind)
+            if not np.isnan(lam):
+                mixes.append(blend_mix(n_fuels, i, j, lam)[0])
+    return np.array(mixes)
+
+def _mix_costs(X, g, coefficients, costs, fwind, OPS_total):
+    _, Fuel_EU_penalty = fuel_eu_penalty(g, coefficients, fwind)
+    return X @ costs + Fuel_EU_penalty + OPS_total
+###############################################################################
+
+############################## FRONTIER ##############################
+# Cheapest mix for every level of weighted GHGi in GHGi_levels (by default
+# resolution levels from the lowest reachable intensity up to that of the
+# unconstrained optimum, plus the FuelEU target and the intensity of every single
+# fuel in that range). Returns the levels in increasing order with, per level, the
+# mix x, its weighted GHGi and cost components from the cost kernel, the extra cost
+# over the unconstrained optimum and whether the point is efficient (strictly
+# cheaper than every lower level, i.e. not a repeat of a point below it).
+def pareto_frontier(E_totals, fuel_types, densities, OPS_flags, OPS_details, year, CO2_price_per_ton, fwind, cost_per_MWh,
+                    GHGi_levels=None, resolution=101):
+    coefficients = mix_coefficients(E_totals, fuel_types, densities, OPS_flags, year)
+    costs = linear_costs(coefficients, CO2_price_per_ton)
+    OPS_penalty, OPS_cost = ops_costs(E_totals, OPS_flags, OPS_details, cost_per_MWh)
+    OPS_total = OPS_penalty + OPS_cost
+    n_fuels = len(fuel_types)
+    weight = coefficients['GHGi_weight']
+
+    # Unbounded candidates by increasing intensity, with the best one up to each
+    unbounded = _unbounded_candidates(coefficients, costs, fwind, n_fuels)
+    unbounded_g = GHGi_mix(unbounded, coefficients)
+    unbounded_costs = _mix_costs(unbounded, unbounded_g, coefficients, costs, fwind, OPS_total)
+    order = np.argsort(unbounded_g, kind='stable')
+    unbounded, unbounded_g, unbounded_costs = unbounded[order], unbounded_g[order], unbounded_costs[order]
+    running_best = np.minimum.accumulate(unbounded_costs)
+    running_index = np.maximum.accumulate(np.where(unbounded_costs == running_best, np.arange(len(order)), 0))
+
+    lowest = weight * coefficients['wtw'].min()
+    if GHGi_levels is None:
+        highest = weight * unbounded_g[running_index[-1]]
+        levels = [np.linspace(lowest, highest, resolution), weight * coefficients['wtw'], [coefficients['GHGi_target']]]
+        levels = np.unique(np.concatenate(levels))
+        levels = levels[(levels >= lowest) & (levels <= highest)]
+    else:
+        levels = np.unique(np.asarray(GHGi_levels, dtype=float))
+        if levels.size == 0:
+            raise ValueError("At least one GHGi level is required.")
+        if levels[0] < lowest * (1 - 1e-12):
+            raise ValueError(f"GHGi level {levels[0]} is below {lowest}, the lowest weighted GHGi the fuels can reach.")
+
+    # Best unbounded candidate at or below each level
+    g = np.minimum(levels / weight, coefficients['wtw'].max())
+    below = np.searchsorted(unbounded_g, g * (1 + 1e-12), side='right') - 1
+    best_costs = np.where(below >= 0, running_best[np.maximum(below, 0)], np.inf)
+    X = unbounded[running_index[np.maximum(below, 0)]]
+
+    # Cheapest blend on the bound
+    bound_linear, pair, lam = cheapest_blends(coefficients, costs, g)
+    bound_costs = _mix_costs(np.zeros((len(g), n_fuels)), g, coefficients, costs, fwind, OPS_total) + bound_linear
+    on_bound = bound_costs < best_costs
+    for k in np.flatnonzero(on_bound):
+        i, j = pair[k]
+        X[k] = blend_mix(n_fuels, i, j, lam[k])[0] if i != j else 100 * np.eye(n_fuels)[i]
+
+    # Report every point with the cost kernel
+    components = evaluate_fuel_mixes(X, E_totals, fuel_types, densities, OPS_flags, OPS_details, year, CO2_price_per_ton, fwind, cost_per_MWh)
+    total_costs = components['total_cost']
+    efficient = np.concatenate([[True], total_costs[1:] < np.minimum.accumulate(total_costs)[:-1] * (1 - 1e-12)])
+    return {
+        'fuel_types': list(fuel_types),
+        'GHGi_levels': levels,
+        'GHGi_actual': components['GHGi_actual'],
+        'GHGi_target': coefficients['GHGi_target'],
+        'x': X,
+        'fuel_costs': components['fuel_costs'],
+        'EU_ETS_penalty': components['EU_ETS_penalty'],
+        'Fuel_EU_penalty': components['Fuel_EU_penalty'],
+        'OPS_penalty': OPS_penalty,
+        'OPS_cost': OPS_cost,
+        'total_cost': total_costs,
+        'extra_cost': total_costs - running_best[-1],
+        'efficient': efficient
+    }
+###############################################################################
+
+def main():
+    # Imported here: optimize_graph pulls in the whole optimizer, which the functions above do not need
+    from optimize_graph import get_user_input_FAST
+    year, CO2_price_per_ton, cost_per_MWh, E_totals, fuel_amounts, selected_fuels, OPS_flags, OPS_details, fwind, fuel_densities = get_user_input_FAST()
+    fuel_types = sorted(set(fuel for trip_fuels in selected_fuels.values() for fuel in trip_fuels))
+    result = pareto_frontier(E_totals, fuel_types, fuel_densities, OPS_flags, OPS_details, year, CO2_price_per_ton, fwind, cost_per_MWh, resolution=21)
+
+    print(f"--- Cost versus GHGi frontier ({year}, target {result['GHGi_target']:.2f}) ---")
+    for k in np.flatnonzero(result['efficient']):
+        mix = ", ".join(f"{fuel} {share:.1f}%" for fuel, share in zip(fuel_types, result['x'][k]) if share > 0)
+        print(f"GHGi {result['GHGi_actual'][k]:.2f}: total cost {result['total_cost'][k]:.2f} "
+              f"(+{result['extra_cost'][k]:.2f}) | {mix}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+import numpy as np
+
+# Content-addressed on-disk cache for solver results. The key is the SHA-256 of the
+# normalised inputs plus the contents of every factor table under json/, so editing
+# a price or an emission factor invalidates the affected entries by itself. Entries
+# are pickle files; the least recently used ones are evicted once the directory
+# grows past max_bytes. MARITIME_RESULT_CACHE=off bypasses the cache and
+# MARITIME_RESULT_CACHE_DIR moves it.
+
+cache_version = 1  # bump when a solver change makes the stored results stale
+default_max_bytes = 256 * 1024 * 1024
+json_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'json')
+default_cache_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '.result_cache')
+
+_json_digest_cache = {}
+
+def cache_dir_path(cache_dir=None):
+    return cache_dir or os.environ.get('MARITIME_RESULT_CACHE_DIR') or default_cache_dir
+
+def cache_enabled():
+    return os.environ.get('MARITIME_RESULT_CACHE', 'on').lower() not in ('off', '0', 'false', 'no')
+
+############################## KEYS ##############################
+def _normalize(value):
+    # JSON-ready copy with a stable representation of numpy values and containers
+    if isinstance(value, dict):
+        return {str(key): _normalize(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return [_normalize(item) for item in value]
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+def json_digest(directory=json_dir):
+    # Digest of the factor tables, re-read only when a file changes
+    files = sorted(name for name in os.listdir(directory) if name.endswith('.json'))
+    stats = [os.stat(os.path.join(directory, name)) for name in files]
+    stamp = tuple((name, stat.st_mtime_ns, stat.st_size) for name, stat in zip(files, stats))
+    cached = _json_digest_cache.get(directory)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+    digest = hashlib.sha256()
+    for name in files:
+        digest.update(name.encode())
+        with open(os.path.join(directory, name), 'rb') as f:
+            digest.update(hashlib.sha256(f.read()).digest())
+    _json_digest_cache[directory] = (stamp, digest.hexdigest())
+    return digest.hexdigest()
+
+def cache_key(inputs):
+    payload = json.dumps({
+        'version': cache_version,
+        'json': json_digest(),
+        'inputs': _normalize(inputs)
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+###############################################################################
+
+############################## STORAGE ##############################
+def _entry_path(key, cache_dir):
+    return os.path.join(cache_dir, f"{key}.pkl")
+
+def _remove(path):
+    # Another process may have evicted the file already
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+def load_entry(key, cache_dir=None):
+    path = _entry_path(key, cache_dir_path(cache_dir))
+    try:
+        with open(path, 'rb') as f:
+            value = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except (pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+        # Unreadable entry (interrupted write, renamed class): drop it and recompute
+        _remove(path)
+        return None
+    # The modification time doubles as the last-use time for the LRU eviction
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        pass
+    return value
+
+def store_entry(key, value, cache_dir=None, max_bytes=default_max_bytes):
+    cache_dir = cache_dir_path(cache_dir)
+    os.makedirs(cache_dir, exist_ok=True)
+    # Write to a temporary file and rename, so concurrent workers never read half an entry
+    handle, temporary_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+    with os.fdopen(handle, 'wb') as f:
+        pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temporary_path, _entry_path(key, cache_dir))
+    evict(cache_dir, max_bytes)
+
+def evict(cache_dir=None, max_bytes=default_max_bytes):
+    # Remove the least recently used entries until the cache fits in max_bytes
+    cache_dir = cache_dir_path(cache_dir)
+    entries = []
+    for entry in os.scandir(cache_dir):
+        if entry.name.endswith('.pkl'):
+            stat = entry.stat()
+            entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+    total_bytes = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total_bytes <= max_bytes:
+            break
+        _remove(path)
+        total_bytes -= size
+
+def clear_result_cache(cache_dir=None):
+    cache_dir = cache_dir_path(cache_dir)
+    if not os.path.isdir(cache_dir):
+        return 0
+    removed = 0
+    for entry in os.scandir(cache_dir):
+        if entry.name.endswith(('.pkl', '.tmp')):
+            _remove(entry.path)
+            removed += 1
+    return removed
+###############################################################################
+
+# Return compute() for these inputs, from the cache when possible. use_cache=False
+# bypasses the cache entirely, refresh=True recomputes and overwrites the entry.
+def cached_call(compute, inputs, use_cache=True, refresh=False, cache_dir=None, max_bytes=default_max_bytes):
+    if not use_cache or not cache_enabled():
+        return compute()
+    key = cache_key(inputs)
+    if not refresh:
+        value = load_entry(key, cache_dir)
+        if value is not None:
+            return value
+    value = compute()
+    store_entry(key, value, cache_dir, max_bytes)
+    return value
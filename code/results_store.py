@@ -0,0 +1,119 @@
+import os
+import shutil
+import uuid
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+# Columnar store for sweep results. Each solved scenario is flattened into one row
+# per fuel (the layout of run/total_output_results.csv) and appended to a Parquet
+# dataset partitioned by year and scenario number, so a sweep writes its results
+# batch by batch and readers load only the columns and partitions they use.
+
+results_schema = pa.schema([
+    ('year', pa.int32()),
+    ('CO2_price', pa.float64()),
+    ('total_cost', pa.float64()),
+    ('fuel_costs', pa.float64()),
+    ('EU_ETS_penalty', pa.float64()),
+    ('FuelEU_penalty', pa.float64()),
+    ('OPS_penalty', pa.float64()),
+    ('OPS_cost', pa.float64()),
+    ('fuel_type', pa.string()),
+    ('total_fuel_amount', pa.float64()),
+    ('scenario', pa.int32()),
+    ('OPS_at_berth', pa.bool_())
+])
+partition_columns = ['year', 'scenario']
+# Written into every dataset append_results creates, so a sweep only ever deletes
+# its own output; dataset readers skip files starting with '_'
+marker_file = '_MARITIME_RESULTS'
+_partitioning = ds.partitioning(pa.schema([results_schema.field(name) for name in partition_columns]), flavor='hive')
+
+# Flatten (index, {'scenario': ..., 'results': ...}) entries into column lists.
+# The scenario number is index % 4 + 1, as in convert_totals_to_csv.py.
+def results_columns(entries):
+    columns = {name: [] for name in results_schema.names}
+    for index, entry in entries:
+        scenario = entry['scenario']
+        results = entry['results']
+        total_cost = results.get('total_cost', 0)
+        FuelEU_penalty = results.get('FuelEU_penalty', 0)
+        EU_ETS_penalty = results.get('EU_ETS_penalty', 0)
+        OPS_cost = results.get('OPS_cost', 0)
+        OPS_penalty = results.get('OPS_penalty', 0)
+        fuel_costs = total_cost - (FuelEU_penalty + EU_ETS_penalty + OPS_cost + OPS_penalty)
+
+        for fuel, total_amount in results.get('fuel_amounts', {}).items():
+            columns['year'].append(scenario['year'])
+            columns['CO2_price'].append(scenario['CO2_price'])
+            columns['total_cost'].append(total_cost)
+            columns['fuel_costs'].append(fuel_costs)
+            columns['EU_ETS_penalty'].append(EU_ETS_penalty)
+            columns['FuelEU_penalty'].append(FuelEU_penalty)
+            columns['OPS_penalty'].append(OPS_penalty)
+            columns['OPS_cost'].append(OPS_cost)
+            columns['fuel_type'].append(fuel)
+            columns['total_fuel_amount'].append(total_amount)
+            columns['scenario'].append(index % 4 + 1)
+            columns['OPS_at_berth'].append(scenario.get('OPS_at_berth', False))
+    return columns
+
+############################## DATASET DIRECTORY ##############################
+def _mark(root):
+    os.makedirs(root, exist_ok=True)
+    marker = os.path.join(root, marker_file)
+    if not os.path.exists(marker):
+        open(marker, 'w').close()
+
+def is_results_dataset(root):
+    # Our marker, or (datasets written before the marker existed) only year=* partitions
+    if not os.path.isdir(root):
+        return False
+    if os.path.isfile(os.path.join(root, marker_file)):
+        return True
+    entries = os.listdir(root)
+    return bool(entries) and all(entry.startswith('year=') and os.path.isdir(os.path.join(root, entry)) for entry in entries)
+
+def _protected(path):
+    # The working directory, its parents and the home directory are never deleted
+    path = os.path.realpath(path)
+    cwd = os.path.realpath(os.getcwd())
+    return path in (os.path.realpath(os.path.expanduser('~')), os.path.dirname(path)) or os.path.commonpath([path, cwd]) == path
+
+# Empty dataset at root. An existing path is only replaced when it is a results
+# dataset or an empty directory, or when overwrite is set; anything else raises
+# ValueError instead of being deleted.
+def reset_results(root, overwrite=False):
+    if os.path.lexists(root):
+        if os.path.isdir(root) and not os.path.islink(root) and not os.listdir(root):
+            pass
+        elif not (is_results_dataset(root) or overwrite):
+            raise ValueError(f"'{root}' exists and is not a results dataset; choose another output or pass --overwrite to replace it.")
+        elif _protected(root):
+            raise ValueError(f"Refusing to delete '{root}': it is the working directory, one of its parents or the home directory.")
+        elif os.path.isdir(root) and not os.path.islink(root):
+            shutil.rmtree(root)
+        else:
+            os.remove(root)
+    _mark(root)
+###############################################################################
+
+# Append one batch of results to the dataset at root (created if missing)
+def append_results(root, entries):
+    _mark(root)
+    table = pa.table(results_columns(entries), schema=results_schema)
+    if table.num_rows == 0:
+        return 0
+    ds.write_dataset(
+        table, root, format='parquet',
+        partitioning=_partitioning,
+        basename_template=f"part-{uuid.uuid4().hex}-{{i}}.parquet",
+        existing_data_behavior='overwrite_or_ignore'
+    )
+    return table.num_rows
+
+# Read the results back as a DataFrame. columns limits the columns loaded and
+# filter is a pyarrow.dataset expression, e.g. ds.field('year') == 2030.
+def read_results(root, columns=None, filter=None):
+    dataset = ds.dataset(root, format='parquet', schema=results_schema, partitioning=_partitioning)
+    return dataset.to_table(columns=columns, filter=filter).to_pandas()
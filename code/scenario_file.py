@@ -0,0 +1,233 @@
+import json
+import math
+import os
+from dataclasses import dataclass
+import numpy as np
+from cost_kernel import trip_types
+from fuel_calculations import load_fuel_density
+
+# Declarative scenario files for the optimize2.py model: many vessels, years and
+# price assumptions per file, in place of the one-value-per-line fast.nigga format.
+# A file is JSON or TOML with an optional "defaults" table and a "vessels" list, or
+# JSONL with one vessel per line (a line holding only "defaults" applies to the
+# lines after it). A vessel is
+#     name          unique name
+#     years         list of years (or year)
+#     CO2_prices    list of EUR per tonne of CO2 (or CO2_price)
+#     cost_per_MWh  shore power price, EUR per MWh
+#     fwind         wind reward factor, 1.0 by default
+#     fuel_tonnes   {trip type: {fuel: tonnes}} of the reference year
+#     fuel_types    fuels the optimizer may use (default: those with Intra/Inter EU tonnes)
+#     OPS           optional {total_installed_power, established_power_demand, hours_at_berth}
+# and every key may also be given in defaults. Files are parsed once into a
+# ScenarioBatch of arrays; vessel_inputs turns one of its rows into optimizer arguments.
+
+vessel_keys = {'name', 'year', 'years', 'CO2_price', 'CO2_prices', 'cost_per_MWh', 'fwind', 'fuel_tonnes', 'fuel_types', 'OPS'}
+OPS_keys = ('total_installed_power', 'established_power_demand', 'hours_at_berth')
+alternatives = {'year': 'years', 'years': 'year', 'CO2_price': 'CO2_prices', 'CO2_prices': 'CO2_price'}
+
+@dataclass(frozen=True)
+class ScenarioBatch:
+    vessels: tuple            # vessel names
+    fuels: tuple              # fuel of each column (fuel_density.json order)
+    densities: dict           # fuel -> MJ per tonne the energies were computed with
+    tonnes: np.ndarray        # (vessels, trip types, fuels) tonnes
+    E_totals: np.ndarray      # (vessels, trip types) MJ
+    candidates: np.ndarray    # (vessels, fuels) fuels the optimizer may use
+    years: tuple              # per vessel, tuple of years
+    CO2_prices: tuple         # per vessel, tuple of CO2 prices
+    cost_per_MWh: np.ndarray  # (vessels,)
+    fwind: np.ndarray         # (vessels,)
+    OPS: np.ndarray           # (vessels,) shore power at berth
+    OPS_details: np.ndarray   # (vessels, 3) columns as OPS_keys
+
+############################## VALIDATION ##############################
+def _number(value, where, minimum=0.0):
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value) or value < minimum:
+        raise ValueError(f"{where}: expected a finite number >= {minimum:g}, got {value!r}.")
+    return float(value)
+
+def _year(value, where):
+    if isinstance(value, bool) or not isinstance(value, int):
+        raise ValueError(f"{where}: expected an integer year, got {value!r}.")
+    return value
+
+def _one_or_many(vessel, single, plural, where):
+    if single in vessel and plural in vessel:
+        raise ValueError(f"{where}: give either {single} or {plural}, not both.")
+    if plural in vessel:
+        values = vessel[plural]
+        if not isinstance(values, list) or not values:
+            raise ValueError(f"{where}.{plural}: expected a non-empty list.")
+        return values, f"{where}.{plural}"
+    if single in vessel:
+        return [vessel[single]], f"{where}.{single}"
+    raise ValueError(f"{where}: {plural} is required.")
+
+def _fuel(name, densities, where):
+    fuel = str(name).strip().upper()
+    if fuel not in densities:
+        raise ValueError(f"{where}: unknown fuel '{name}'. Available types are: {', '.join(densities)}")
+    return fuel
+
+def _vessel_row(vessel, defaults, densities, fuel_index, where):
+    if not isinstance(vessel, dict):
+        raise ValueError(f"{where}: expected a table of vessel settings.")
+    unknown = set(vessel) - vessel_keys
+    if unknown:
+        raise ValueError(f"{where}: unknown keys {sorted(unknown)}.")
+    # Vessel settings replace the defaults; year/years and CO2_price/CO2_prices replace each other
+    merged = {key: value for key, value in defaults.items() if key not in vessel and alternatives.get(key) not in vessel}
+    merged.update(vessel)
+
+    if 'name' not in merged:
+        raise ValueError(f"{where}: name is required.")
+    years, years_where = _one_or_many(merged, 'year', 'years', where)
+    CO2_prices, CO2_where = _one_or_many(merged, 'CO2_price', 'CO2_prices', where)
+    if 'cost_per_MWh' not in merged:
+        raise ValueError(f"{where}: cost_per_MWh is required.")
+
+    tonnes = np.zeros((len(trip_types), len(fuel_index)))
+    fuel_tonnes = merged.get('fuel_tonnes')
+    if not isinstance(fuel_tonnes, dict):
+        raise ValueError(f"{where}.fuel_tonnes: expected a table of trip types.")
+    for trip_type, amounts in fuel_tonnes.items():
+        if trip_type not in trip_types:
+            raise ValueError(f"{where}.fuel_tonnes: unknown trip type '{trip_type}', expected one of {trip_types}.")
+        if not isinstance(amounts, dict):
+            raise ValueError(f"{where}.fuel_tonnes.{trip_type}: expected a table of fuel tonnes.")
+        row = trip_types.index(trip_type)
+        for name, amount in amounts.items():
+            fuel = _fuel(name, densities, f"{where}.fuel_tonnes.{trip_type}")
+            tonnes[row, fuel_index[fuel]] += _number(amount, f"{where}.fuel_tonnes.{trip_type}.{name}")
+
+    candidates = np.zeros(len(fuel_index), dtype=bool)
+    if 'fuel_types' in merged:
+        if not isinstance(merged['fuel_types'], list) or not merged['fuel_types']:
+            raise ValueError(f"{where}.fuel_types: expected a non-empty list.")
+        for name in merged['fuel_types']:
+            candidates[fuel_index[_fuel(name, densities, f"{where}.fuel_types")]] = True
+    else:
+        # As get_user_input_FAST: the fuels burnt on Intra and Inter EU voyages
+        candidates = tonnes[:2].sum(axis=0) > 0
+        if not candidates.any():
+            raise ValueError(f"{where}: no Intra or Inter EU fuel tonnes, so fuel_types is required.")
+
+    OPS = merged.get('OPS')
+    if OPS is not None and (not isinstance(OPS, dict) or set(OPS) != set(OPS_keys)):
+        raise ValueError(f"{where}.OPS: expected exactly the keys {list(OPS_keys)}.")
+
+    return (
+        str(merged['name']),
+        tonnes,
+        candidates,
+        tuple(_year(year, years_where) for year in years),
+        tuple(_number(price, CO2_where) for price in CO2_prices),
+        _number(merged['cost_per_MWh'], f"{where}.cost_per_MWh"),
+        _number(merged.get('fwind', 1.0), f"{where}.fwind"),
+        OPS is not None,
+        [_number(OPS[key], f"{where}.OPS.{key}") for key in OPS_keys] if OPS is not None else [0.0] * len(OPS_keys)
+    )
+###############################################################################
+
+############################## LOADING ##############################
+# Batch from already parsed data: a {"defaults": ..., "vessels": [...]} document, or
+# a list of vessel dicts (JSONL lines, where {"defaults": ...} entries apply onwards)
+def parse_scenarios(data, densities=None):
+    densities = load_fuel_density() if densities is None else densities
+    fuels = tuple(densities)
+    fuel_index = {fuel: i for i, fuel in enumerate(fuels)}
+
+    if isinstance(data, dict):
+        unknown = set(data) - {'defaults', 'vessels'}
+        if unknown:
+            raise ValueError(f"Unknown top-level keys {sorted(unknown)}, expected defaults and vessels.")
+        if not isinstance(data.get('vessels', []), list):
+            raise ValueError("vessels: expected a list of vessel tables.")
+        entries = [('defaults', data.get('defaults', {}))] + [('vessel', vessel) for vessel in data.get('vessels', [])]
+    else:
+        entries = [('defaults', entry['defaults']) if isinstance(entry, dict) and set(entry) == {'defaults'} else ('vessel', entry) for entry in data]
+
+    defaults = {}
+    rows = []
+    for kind, entry in entries:
+        if kind == 'defaults':
+            if not isinstance(entry, dict) or set(entry) - (vessel_keys - {'name'}):
+                raise ValueError("defaults: expected a table of vessel settings other than name.")
+            defaults = entry
+        else:
+            rows.append(_vessel_row(entry, defaults, densities, fuel_index, f"vessels[{len(rows)}]"))
+    if not rows:
+        raise ValueError("A scenario file must describe at least one vessel.")
+
+    names, tonnes, candidates, years, CO2_prices, cost_per_MWh, fwind, OPS, OPS_details = zip(*rows)
+    if len(set(names)) != len(names):
+        raise ValueError("Vessel names must be unique within a scenario file.")
+    tonnes = np.array(tonnes)
+    lcv = np.array([densities[fuel] for fuel in fuels], dtype=float)
+    return ScenarioBatch(
+        vessels=names,
+        fuels=fuels,
+        densities=dict(densities),
+        tonnes=tonnes,
+        E_totals=tonnes @ lcv,
+        candidates=np.array(candidates),
+        years=years,
+        CO2_prices=CO2_prices,
+        cost_per_MWh=np.array(cost_per_MWh),
+        fwind=np.array(fwind),
+        OPS=np.array(OPS, dtype=bool),
+        OPS_details=np.array(OPS_details)
+    )
+
+def load_scenarios(path, densities=None):
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.toml':
+        import tomllib
+        with open(path, 'rb') as file:
+            data = tomllib.load(file)
+    elif extension == '.jsonl':
+        with open(path, 'r') as file:
+            data = [json.loads(line) for line in file if line.strip()]
+    elif extension == '.json':
+        with open(path, 'r') as file:
+            data = json.load(file)
+    else:
+        raise ValueError(f"Unknown scenario file type '{extension}', expected .json, .jsonl or .toml.")
+    return parse_scenarios(data, densities)
+###############################################################################
+
+############################## OPTIMIZER INPUTS ##############################
+# optimize_fuel_mix / solve_fuel_mix_lp arguments (optimize2.py model) of vessel k,
+# for one of its years and CO2 prices (the first ones by default)
+def vessel_inputs(batch, k, year=None, CO2_price_per_ton=None):
+    OPS = bool(batch.OPS[k])
+    return {
+        'E_totals': dict(zip(trip_types, batch.E_totals[k].tolist())),
+        'fuel_types': [fuel for fuel, used in zip(batch.fuels, batch.candidates[k]) if used],
+        'densities': batch.densities,
+        'OPS_flags': {'intra-eu': False, 'inter-eu': False, 'berth': OPS},
+        'OPS_details': {'berth': dict(zip(OPS_keys, batch.OPS_details[k].tolist()))},
+        'year': batch.years[k][0] if year is None else year,
+        'CO2_price_per_ton': batch.CO2_prices[k][0] if CO2_price_per_ton is None else CO2_price_per_ton,
+        'fwind': float(batch.fwind[k]),
+        'cost_per_MWh': float(batch.cost_per_MWh[k])
+    }
+
+# (vessel, year, CO2 price, inputs) for every vessel x year x CO2 price of the batch
+def scenario_cases(batch):
+    for k, vessel in enumerate(batch.vessels):
+        for year in batch.years[k]:
+            for CO2_price in batch.CO2_prices[k]:
+                yield vessel, year, CO2_price, vessel_inputs(batch, k, year, CO2_price)
+
+# get_user_input_FAST's tuple for vessel k (first year and CO2 price)
+def fast_inputs(batch, k=0):
+    inputs = vessel_inputs(batch, k)
+    fuel_amounts = {trip_type: dict(zip(batch.fuels, batch.tonnes[k, row].tolist())) for row, trip_type in enumerate(trip_types)}
+    selected_fuels = {trip_type: [fuel for fuel in batch.fuels if fuel_amounts[trip_type][fuel] > 0] for trip_type in trip_types[:2]}
+    return (
+        inputs['year'], inputs['CO2_price_per_ton'], inputs['cost_per_MWh'], inputs['E_totals'], fuel_amounts,
+        selected_fuels, inputs['OPS_flags'], inputs['OPS_details'], inputs['fwind'], batch.densities
+    )
+###############################################################################
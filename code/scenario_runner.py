@@ -0,0 +1,173 @@
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from optimize import optimize_fuel_mix, fuel_density
+from result_cache import cached_call
+
+# In-process batch runner for run/run.py style scenarios. Each scenario is solved
+# by calling optimize_fuel_mix directly, so a sweep pays the scipy import and the
+# factor table parsing once instead of once per scenario, and the results come
+# back as dicts instead of being scraped from the printed output.
+
+# Translate a scenario dict into optimize_fuel_mix arguments (the answers run.py
+# used to type into the get_user_input prompts)
+def scenario_inputs(scenario):
+    E_totals = {
+        'intra-eu': float(scenario['Etotal_Intra']),
+        'inter-eu': float(scenario['Etotal_Inter']),
+        'berth': float(scenario['Etotal_Berth'])
+    }
+    MDO_tonnes = {
+        'intra-eu': float(scenario['MDO_tonnes_Intra']),
+        'inter-eu': float(scenario['MDO_tonnes_Inter'])
+    }
+
+    selected_fuels = {
+        'intra-eu': [fuel.upper() for fuel in scenario['fuel_types_Intra']],
+        'inter-eu': [fuel.upper() for fuel in scenario['fuel_types_Inter']]
+    }
+    for trip_type, trip_fuels in selected_fuels.items():
+        for fuel in trip_fuels:
+            if fuel not in fuel_density:
+                raise ValueError(f"Invalid fuel type '{fuel}' for {trip_type}! Available types are: {', '.join(fuel_density)}")
+    # Keep the first-seen order so the solution vector is stable between runs
+    fuel_types = list(dict.fromkeys(selected_fuels['intra-eu'] + selected_fuels['inter-eu']))
+
+    OPS_use = bool(scenario.get('OPS_at_berth', False))
+    if OPS_use:
+        OPS_details = {'berth': {
+            'total_installed_power': float(scenario['total_installed_power']),
+            'established_power_demand': float(scenario['established_power_demand']),
+            'hours_at_berth': int(scenario['hours_at_berth'])
+        }}
+    else:
+        OPS_details = {'berth': {
+            'total_installed_power': 0,
+            'established_power_demand': 0,
+            'hours_at_berth': 0
+        }}
+
+    return {
+        'E_totals': E_totals,
+        'fuel_types': fuel_types,
+        'densities': fuel_density,
+        'fixed_fuel': 'MDO',
+        'MDO_tonnes': MDO_tonnes,
+        'OPS_flags': {'berth': OPS_use},
+        'OPS_details': OPS_details,
+        'year': int(scenario['year']),
+        'CO2_price_per_ton': float(scenario['CO2_price']),
+        'fwind': 1.0,
+        'cost_per_MWh': float(scenario['cost_per_MWh'])
+    }
+
+# Stable identity of a scenario, independent of dict ordering
+def scenario_key(scenario):
+    return json.dumps(scenario, sort_keys=True)
+
+# Reproducible 32-bit seed derived from the scenario key
+def scenario_seed(scenario, base_seed=0):
+    digest = hashlib.sha256(f"{base_seed}:{scenario_key(scenario)}".encode()).digest()
+    return int.from_bytes(digest[:4], 'little')
+
+def available_cores():
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+# Solve one scenario. Results are cached on disk by their inputs (see result_cache.py);
+# the worker count does not change the result, so it is not part of the key.
+def run_scenario(scenario, verbose=False, workers=8, seed=None, x0=None, use_cache=True):
+    inputs = scenario_inputs(scenario)
+
+    def solve():
+        result = optimize_fuel_mix(**inputs, verbose=verbose, workers=workers, seed=seed, x0=x0)
+        return result.summary, result.x
+
+    cache_inputs = {'solver': 'optimize.optimize_fuel_mix', **inputs, 'seed': seed, 'x0': x0}
+    return cached_call(solve, cache_inputs, use_cache=use_cache)
+
+# Scenarios of the same year that differ only in CO2 price form a chain. A chain is
+# solved in CO2 price order and each solve is warm-started from the nearest solved
+# neighbour (the closest CO2 price); the first solve of a chain starts from a fresh
+# population. Chains are one block of CO2 prices rather than the whole year x CO2
+# price grid, so the run.py sweep has 48 chains (8 base scenarios x 6 years) for
+# the pool instead of 8, at the price of one cold start per year.
+def _chain_key(scenario):
+    return json.dumps({key: value for key, value in scenario.items() if key != 'CO2_price'}, sort_keys=True)
+
+def _build_chains(scenarios, warm_start):
+    if not warm_start:
+        return [[index] for index in range(len(scenarios))]
+    chains = {}
+    for index, scenario in enumerate(scenarios):
+        chains.setdefault(_chain_key(scenario), []).append(index)
+    return [sorted(chain, key=lambda index: (scenarios[index]['year'], scenarios[index]['CO2_price'])) for chain in chains.values()]
+
+def _nearest_solution(solved, year, CO2_price):
+    nearest = min(solved, key=lambda point: (abs(point[0] - year), abs(point[1] - CO2_price)))
+    return solved[nearest]
+
+def _run_chain(chain, seeds, verbose, workers, use_cache):
+    solved = {}
+    summaries = []
+    for scenario, seed in zip(chain, seeds):
+        x0 = _nearest_solution(solved, scenario['year'], scenario['CO2_price']) if solved else None
+        summary, x = run_scenario(scenario, verbose=verbose, workers=workers, seed=seed, x0=x0, use_cache=use_cache)
+        solved[(scenario['year'], scenario['CO2_price'])] = x
+        summaries.append(summary)
+    return summaries
+
+# Solve every scenario, spreading the chains over a process pool of `processes`
+# workers (all available cores by default, 1 solves in this process). The cores
+# left over are handed to differential_evolution's own workers so the machine is
+# never oversubscribed. Every scenario is seeded from its key and the chains do not
+# depend on the pool size, so a sweep gives the same results whatever the pool
+# size, and results come back in scenario order. warm_start=False solves every
+# scenario from a fresh Latin hypercube population. use_cache=False solves every
+# scenario even if its result is in the on-disk cache.
+# progress, if given, is called with (index, scenario) as each result is collected,
+# and on_batch with the [(index, result), ...] of each chain once it is complete.
+# keep_results=False streams the results through on_batch only and returns None,
+# so a sweep never holds more than one chain's results.
+def run_scenarios(scenarios, verbose=False, progress=None, processes=None, base_seed=0, warm_start=True, on_batch=None, use_cache=True, keep_results=True):
+    scenarios = list(scenarios)
+    chains = _build_chains(scenarios, warm_start)
+    cores = available_cores()
+    if processes is None:
+        processes = cores
+    processes = max(1, min(processes, len(chains)))
+    workers = max(1, cores // processes)
+    seeds = [scenario_seed(scenario, base_seed) for scenario in scenarios]
+
+    chain_scenarios = [[scenarios[index] for index in chain] for chain in chains]
+    chain_seeds = [[seeds[index] for index in chain] for chain in chains]
+    if processes == 1:
+        chain_summaries = (_run_chain(chain, chain_seed, verbose, workers, use_cache) for chain, chain_seed in zip(chain_scenarios, chain_seeds))
+        return _collect(scenarios, chains, chain_summaries, progress, on_batch, keep_results)
+
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        chain_summaries = executor.map(
+            _run_chain, chain_scenarios, chain_seeds,
+            [verbose] * len(chains), [workers] * len(chains), [use_cache] * len(chains)
+        )
+        return _collect(scenarios, chains, chain_summaries, progress, on_batch, keep_results)
+
+def _collect(scenarios, chains, chain_summaries, progress, on_batch, keep_results):
+    results = [None] * len(scenarios) if keep_results else None
+    for chain, summaries in zip(chains, chain_summaries):
+        batch = []
+        for index, summary in zip(chain, summaries):
+            if progress is not None:
+                progress(index, scenarios[index])
+            batch.append((index, {
+                'scenario': scenarios[index],
+                'results': summary
+            }))
+        if on_batch is not None:
+            on_batch(batch)
+        if keep_results:
+            for index, result in batch:
+                results[index] = result
+    return results
@@ -0,0 +1,74 @@
+import numpy as np
+from cost_kernel import mix_coefficients, linear_costs, GHGi_mix, fuel_eu_penalty, normalize_percentages, MJ_to_MWh, penalty_per_tonne_VLSFO, VLSFO_MJ_per_tonne
+
+# Derivatives of the optimal total cost of the optimize2.py model with respect to
+# its inputs, from the optimal mix alone (no re-solves). The mix constraints
+# (percentages summing to 100, each in [0, 100]) do not depend on any input, so by
+# the envelope theorem the derivative of the optimal cost is the partial derivative
+# of the cost at the optimal mix. The one exception is a mix that is exactly
+# compliant (the kink of lp_solver.py): there the compliance constraint
+#     h(p) = sum((GHGi_weight * wtw_k - target) * p_k / lcv_k) <= 0
+# is active and moves with wtw, lcv and the target, and its shadow price (the KKT
+# multiplier on the fuels of the mix) is added to the derivative.
+#
+# Per-fuel derivatives are per unit of the factor: EUR per EUR/t of price, per
+# gCO2eq/MJ of WtW, per t CO2/t of CO2 factor and per MJ/t of LCV.
+
+def cost_sensitivities(x, E_totals, fuel_types, densities, OPS_flags, OPS_details, year, CO2_price_per_ton, fwind, cost_per_MWh, tol=1e-6):
+    coefficients = mix_coefficients(E_totals, fuel_types, densities, OPS_flags, year)
+    p = normalize_percentages(np.atleast_2d(np.asarray(x, dtype=float)))[0]
+    lcv, wtw = coefficients['lcv'], coefficients['wtw']
+    weight, target = coefficients['GHGi_weight'], coefficients['GHGi_target']
+    costs = linear_costs(coefficients, CO2_price_per_ton)
+    ETS_factor = coefficients['ETS_factor']
+
+    # Fuel costs and EU ETS, linear in p
+    d_price = coefficients['fuel_tonnes'] * p
+    # ETS-counted tonnes of fuel per percentage point
+    E_ETS = E_totals['intra-eu'] + E_totals['inter-eu'] / 2.0 + (0 if OPS_flags['berth'] else E_totals['berth'])
+    d_co2 = ETS_factor * CO2_price_per_ton * E_ETS / 100 / lcv * p
+    d_CO2_price = ETS_factor * float(coefficients['ETS_CO2'] @ p)
+    d_lcv = -costs * p / lcv
+    d_wtw = np.zeros(len(p))
+    d_target = 0.0
+    d_fwind = 0.0
+
+    # FuelEU penalty K * (1 - target / D) on the deficit branch, D = GHGi_weight * GHGi_mix
+    masses = p / lcv
+    G = float(GHGi_mix(p, coefficients)[0])
+    D = weight * G
+    _, Fuel_EU_penalty = fuel_eu_penalty(G, coefficients, fwind)
+    relative_gap = (D - target) / target
+    if relative_gap > tol:
+        K = fwind * coefficients['summed_E_total'] * penalty_per_tonne_VLSFO / VLSFO_MJ_per_tonne
+        d_D = K * target / D ** 2
+        d_wtw += d_D * weight * masses / masses.sum()
+        d_lcv += d_D * weight * (wtw - G) / masses.sum() * (-masses / lcv)
+        d_target += -K / D
+        d_fwind += float(Fuel_EU_penalty) / fwind
+        branch = 'deficit'
+    elif relative_gap >= -tol:
+        # Exactly compliant: costs_k + multiplier * s_k = nu on the fuels of the mix
+        s = (weight * wtw - target) / lcv
+        used = p > 100 * tol
+        A = np.column_stack([s[used], -np.ones(used.sum())])
+        multiplier = max(float(np.linalg.lstsq(A, -costs[used], rcond=None)[0][0]), 0.0) if used.sum() > 1 else 0.0
+        d_wtw += multiplier * weight * masses
+        d_target += -multiplier * masses.sum()
+        d_lcv += multiplier * (-s * p / lcv)
+        branch = 'compliant'
+    else:
+        branch = 'surplus'
+
+    return {
+        'fuel_types': list(fuel_types),
+        'price': dict(zip(fuel_types, d_price.tolist())),
+        'wtw': dict(zip(fuel_types, d_wtw.tolist())),
+        'co2': dict(zip(fuel_types, d_co2.tolist())),
+        'lcv': dict(zip(fuel_types, d_lcv.tolist())),
+        'CO2_price_per_ton': d_CO2_price,
+        'GHGi_target': d_target,
+        'fwind': d_fwind,
+        'cost_per_MWh': E_totals['berth'] * MJ_to_MWh if OPS_flags['berth'] else 0.0,
+        'FuelEU_branch': branch
+    }
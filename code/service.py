@@ -0,0 +1,251 @@
+import argparse
+import json
+import queue
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+import numpy as np
+from fuel_calculations import load_factor_tables
+from cost_kernel import batch_total_costs
+from scenario_file import parse_scenarios, scenario_cases, vessel_inputs
+from result_cache import cached_call, cache_key
+
+# Long-running local HTTP/JSON service for what-if questions on the optimize2.py
+# model. The factor tables, fuel tables and scipy are loaded once at start-up and a
+# warm-up solve runs before the port opens, so a request only pays for its own work.
+#   GET  /health    liveness and request counters
+#   POST /solve     optimal mix of every vessel x year x CO2 price of a scenario
+#                   document (scenario_file.py format, or a single vessel table);
+#                   ?solver=de for differential_evolution instead of the exact LP,
+#                   ?cache=0 to bypass the result cache
+#   POST /evaluate  {"scenario": document, "x": mix or list of mixes}: cost of each
+#                   mix (energy percentages of the vessel's fuel_types) in every case
+# Solves go through the result cache (result_cache.py) and identical solves in
+# flight at the same time share one computation. Evaluations arriving within
+# `window` seconds of each other are grouped by scenario and scored with one
+# batch_total_costs call.
+
+############################## COALESCING ##############################
+class _EvaluationBatcher:
+    def __init__(self, window):
+        self.window = window
+        self.requests = queue.Queue()
+        self.batches = 0
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def evaluate(self, inputs, X):
+        slot = {'key': json.dumps(inputs, sort_keys=True), 'inputs': inputs, 'X': X, 'done': threading.Event()}
+        self.requests.put(slot)
+        slot['done'].wait()
+        if 'error' in slot:
+            raise slot['error']
+        return slot['costs']
+
+    def _run(self):
+        while True:
+            batch = [self.requests.get()]
+            deadline = time.perf_counter() + self.window
+            while True:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.requests.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            groups = {}
+            for slot in batch:
+                groups.setdefault(slot['key'], []).append(slot)
+            for slots in groups.values():
+                self._evaluate_group(slots)
+            self.batches += 1
+
+    def _evaluate_group(self, slots):
+        try:
+            costs = batch_total_costs(np.vstack([slot['X'] for slot in slots]), **slots[0]['inputs'])
+            for slot, part in zip(slots, np.split(costs, np.cumsum([len(slot['X']) for slot in slots])[:-1])):
+                slot['costs'] = part
+        except Exception as error:
+            for slot in slots:
+                slot['error'] = error
+        for slot in slots:
+            slot['done'].set()
+
+class _SingleFlight:
+    # Concurrent calls with the same key run compute once and share its result
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+
+    def run(self, key, compute):
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = {'done': threading.Event()}
+        if leader:
+            try:
+                call['value'] = compute()
+            except Exception as error:
+                call['error'] = error
+            finally:
+                with self.lock:
+                    del self.calls[key]
+                call['done'].set()
+        call['done'].wait()
+        if 'error' in call:
+            raise call['error']
+        return call['value']
+###############################################################################
+
+############################## MODEL ##############################
+class OptimizationService:
+    def __init__(self, use_cache=True, window=0.002):
+        # optimize_graph pulls in the kernels; scipy is imported by the warm-up solve
+        import optimize_graph
+        self.optimize_fuel_mix = optimize_graph.optimize_fuel_mix
+        load_factor_tables()
+        self.use_cache = use_cache
+        self.batcher = _EvaluationBatcher(window)
+        self.single_flight = _SingleFlight()
+        self.started = time.time()
+        self.counters = {'solve': 0, 'evaluate': 0, 'cases': 0}
+        self.counter_lock = threading.Lock()
+        self.solve_case(vessel_inputs(parse_scenarios(_warm_up_scenario), 0), 'lp', use_cache=False)
+
+    def solve_case(self, inputs, solver, use_cache=True):
+        def compute():
+            result = self.optimize_fuel_mix(**inputs, solver=solver, verbose=False, seed=0)
+            return result.summary, result.x
+        cache_inputs = {'solver': f"optimize_graph.optimize_fuel_mix/{solver}", **inputs, 'seed': 0}
+        return self.single_flight.run(
+            cache_key(cache_inputs),
+            lambda: cached_call(compute, cache_inputs, use_cache=use_cache and self.use_cache)
+        )
+
+    def solve(self, document, solver='lp', use_cache=True):
+        if solver not in ('lp', 'de'):
+            raise ValueError(f"Unknown solver '{solver}', expected 'de' or 'lp'.")
+        results = []
+        for vessel, year, CO2_price, inputs in scenario_cases(parse_scenarios(_document(document))):
+            summary, x = self.solve_case(inputs, solver, use_cache)
+            results.append({
+                'vessel': vessel,
+                'year': year,
+                'CO2_price': CO2_price,
+                'fuel_types': inputs['fuel_types'],
+                'x': np.asarray(x).tolist(),
+                **summary
+            })
+        self._count(solve=1, cases=len(results))
+        return {'results': results}
+
+    def evaluate(self, request):
+        if not isinstance(request, dict) or 'scenario' not in request or 'x' not in request:
+            raise ValueError("An evaluate request needs a scenario and x.")
+        X = np.atleast_2d(np.asarray(request['x'], dtype=float))
+        results = []
+        for vessel, year, CO2_price, inputs in scenario_cases(parse_scenarios(_document(request['scenario']))):
+            if X.ndim != 2 or X.shape[1] != len(inputs['fuel_types']):
+                raise ValueError(f"Each mix needs one percentage per fuel of {vessel}: {inputs['fuel_types']}.")
+            costs = self.batcher.evaluate(inputs, X)
+            results.append({'vessel': vessel, 'year': year, 'CO2_price': CO2_price, 'fuel_types': inputs['fuel_types'], 'total_cost': costs.tolist()})
+        self._count(evaluate=1)
+        return {'results': results}
+
+    def _count(self, **increments):
+        with self.counter_lock:
+            for name, increment in increments.items():
+                self.counters[name] += increment
+
+    def health(self):
+        return {'status': 'ok', 'uptime': time.time() - self.started, 'requests': dict(self.counters), 'evaluation_batches': self.batcher.batches}
+
+def _document(document):
+    # A bare vessel table is a document with one vessel
+    if isinstance(document, dict) and 'name' in document:
+        return {'vessels': [document]}
+    return document
+
+_warm_up_scenario = {'vessels': [{
+    'name': 'warm-up', 'year': 2030, 'CO2_price': 90, 'cost_per_MWh': 200.8,
+    'fuel_tonnes': {'intra-eu': {'HFO': 1000}, 'inter-eu': {'LNG': 1000}, 'berth': {'MDO': 10}}
+}]}
+###############################################################################
+
+############################## HTTP ##############################
+class _Handler(BaseHTTPRequestHandler):
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if urlparse(self.path).path == '/health':
+            self._send(200, self.server.service.health())
+        else:
+            self._send(404, {'error': f"Unknown path '{self.path}'."})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        options = parse_qs(url.query)
+        service = self.server.service
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'null')
+            if url.path == '/solve':
+                use_cache = options.get('cache', ['1'])[0] not in ('0', 'false', 'no')
+                payload = service.solve(request, options.get('solver', ['lp'])[0], use_cache)
+            elif url.path == '/evaluate':
+                payload = service.evaluate(request)
+            else:
+                self._send(404, {'error': f"Unknown path '{url.path}'."})
+                return
+        except (ValueError, TypeError, KeyError) as error:
+            # Bad JSON or a scenario that fails validation
+            self._send(400, {'error': str(error)})
+            return
+        except Exception as error:
+            self._send(500, {'error': f"{type(error).__name__}: {error}"})
+            return
+        self._send(200, payload)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # Room for a burst of concurrent clients (the default backlog is 5)
+    request_queue_size = 128
+
+def make_server(host='127.0.0.1', port=8765, use_cache=True, window=0.002, verbose=False):
+    server = _Server((host, port), _Handler)
+    server.service = OptimizationService(use_cache, window)
+    server.verbose = verbose
+    return server
+###############################################################################
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve optimize2.py model solves and evaluations over local HTTP/JSON.")
+    parser.add_argument('--host', default='127.0.0.1', help="Address to listen on (local only by default)")
+    parser.add_argument('--port', type=int, default=8765, help="Port to listen on")
+    parser.add_argument('--window', type=float, default=2.0, help="Milliseconds evaluations wait to be batched with others")
+    parser.add_argument('--no-cache', action='store_true', help="Solve every request even if its result is cached")
+    parser.add_argument('--verbose', action='store_true', help="Log every request")
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, not args.no_cache, args.window / 1000, args.verbose)
+    print(f"Serving on http://{args.host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
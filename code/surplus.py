@@ -1,2 +1,167 @@
 # Surplus value calculator
+import numpy as np
+from fuel_calculations import calculate_Fuel_EU_Penalty, calculate_GHGi_target
+from cost_kernel import fuel_eu_penalty_rate
 
+# FuelEU pooling for a fleet. Each ship's compliance balance comes from
+# calculate_Fuel_EU_Penalty; a pool may not have a negative total balance, a ship in
+# deficit may not leave with a bigger deficit and a ship in surplus may not leave in
+# deficit. A deficit ship therefore only gains from pooling when its whole deficit
+# is covered, and the penalty-minimising pool is the set of deficit ships with the
+# largest total penalty whose deficits fit in the fleet's surplus (a 0/1 knapsack).
+# It is solved by branch and bound on the LP relaxation (ships taken by penalty per
+# unit of deficit), starting from the greedy pool. Large fleets may hit the node
+# limit; the result then reports the best pool found and the LP lower bound.
+
+############################## SHIP BALANCES ##############################
+def ship_balance(ship, GHGi_actual, E_total, year, fwind=1.0):
+    # GHGi_actual is the ship's weighted intensity and E_total its in-scope energy
+    # (inter-EU already halved), as in calculate_total_Fuel_EU_Penalty
+    CB, penalty = calculate_Fuel_EU_Penalty(GHGi_actual, E_total, calculate_GHGi_target(year), fwind)
+    return {
+        'ship': ship,
+        'GHGi_actual': GHGi_actual,
+        'CB': CB,
+        'penalty': penalty,
+        # Penalty per gCO2eq of deficit
+        'penalty_rate': fuel_eu_penalty_rate(GHGi_actual)
+    }
+
+def fleet_balances(ships):
+    # ships: dicts with ship, GHGi_actual, E_total, year and optionally fwind
+    return [ship_balance(ship['ship'], ship['GHGi_actual'], ship['E_total'], ship['year'], ship.get('fwind', 1.0)) for ship in ships]
+###############################################################################
+
+############################## POOLING ##############################
+def _select_deficits(deficits, penalties, rates, total_surplus, node_limit):
+    # Ships sorted by penalty rate, so the LP relaxation of any subproblem is a prefix
+    # of the remaining ships plus a fraction of the next one
+    order = np.argsort(-rates, kind='stable')
+    weights = deficits[order]
+    values = penalties[order]
+    n = len(order)
+    cumulative_weight = np.concatenate([[0], np.cumsum(weights)])
+    cumulative_value = np.concatenate([[0], np.cumsum(values)])
+
+    def relaxed_value(k, capacity):
+        j = int(np.searchsorted(cumulative_weight, cumulative_weight[k] + capacity, side='right')) - 1
+        value = cumulative_value[j] - cumulative_value[k]
+        if j < n:
+            value += (cumulative_weight[k] + capacity - cumulative_weight[j]) / weights[j] * values[j]
+        return value
+
+    # Incumbent: greedy by rate, then fill the leftover surplus with the ships that fit
+    best = []
+    remaining = total_surplus
+    for k in range(n):
+        if weights[k] <= remaining:
+            best.append(k)
+            remaining -= weights[k]
+    best_value = values[best].sum()
+    root_bound = relaxed_value(0, total_surplus)
+
+    # Depth-first branch and bound, taking each ship before leaving it out;
+    # chosen ships are kept as (k, parent) chains
+    stack = [(0, total_surplus, 0.0, None)]
+    nodes = 0
+    while stack and nodes < node_limit:
+        k, capacity, value, chosen = stack.pop()
+        nodes += 1
+        if value > best_value:
+            best_value = value
+            best = []
+            link = chosen
+            while link is not None:
+                best.append(link[0])
+                link = link[1]
+        if k == n or value + relaxed_value(k, capacity) <= best_value * (1 + 1e-12):
+            continue
+        stack.append((k + 1, capacity, value, chosen))
+        if weights[k] <= capacity:
+            stack.append((k + 1, capacity - weights[k], value + values[k], (k, chosen)))
+    exact = not stack
+
+    selected = np.zeros(n, dtype=bool)
+    selected[order[best]] = True
+    lower_bound = max(penalties.sum() - (best_value if exact else root_bound), 0.0)
+    return selected, lower_bound, exact
+
+def _transfers(donors, donor_amounts, receivers, receiver_amounts):
+    # Largest surplus to largest deficit, at most len(donors) + len(receivers) - 1 transfers
+    transfers = []
+    donor_amounts = list(donor_amounts)
+    receiver_amounts = list(receiver_amounts)
+    # Rounding leftovers below this are treated as settled
+    tolerance = 1e-12 * max(sum(receiver_amounts), 1)
+    d = r = 0
+    while d < len(donors) and r < len(receivers):
+        amount = min(donor_amounts[d], receiver_amounts[r])
+        if amount > tolerance:
+            transfers.append({'from': donors[d], 'to': receivers[r], 'CB': amount})
+        donor_amounts[d] -= amount
+        receiver_amounts[r] -= amount
+        if donor_amounts[d] <= tolerance:
+            d += 1
+        if receiver_amounts[r] <= tolerance:
+            r += 1
+    return transfers
+
+# Penalty-minimising pool for a fleet. balances are ship_balance dicts; the result
+# lists the pool members, whether the pool is proven optimal, the surplus transfers (in gCO2eq) and each ship's balance
+# and penalty before and after pooling. Surplus that is not transferred stays with
+# its ship, e.g. for banking.
+def optimize_pool(balances, node_limit=100000):
+    ships = [balance['ship'] for balance in balances]
+    if len(set(ships)) != len(ships):
+        raise ValueError("Ship names must be unique within a fleet.")
+    CB = np.array([balance['CB'] for balance in balances], dtype=float)
+    penalties = np.array([balance['penalty'] for balance in balances], dtype=float)
+    rates = np.array([balance['penalty_rate'] for balance in balances], dtype=float)
+
+    deficit_index = np.flatnonzero(CB < 0)
+    surplus_index = np.flatnonzero(CB > 0)
+    total_surplus = CB[surplus_index].sum()
+
+    selected, lower_bound, exact = _select_deficits(-CB[deficit_index], penalties[deficit_index], rates[deficit_index], total_surplus, node_limit)
+    receivers = deficit_index[selected]
+    needed = -CB[receivers].sum()
+
+    # Donors: largest surpluses first, only as many as the receivers need
+    donor_order = surplus_index[np.argsort(-CB[surplus_index], kind='stable')]
+    given_before = np.cumsum(CB[donor_order]) - CB[donor_order]
+    donated = np.minimum(CB[donor_order], np.maximum(needed - given_before, 0))
+    donors = donor_order[donated > 0]
+    donated = donated[donated > 0]
+
+    receiver_order = receivers[np.argsort(CB[receivers], kind='stable')]
+    transfers = _transfers(
+        [ships[i] for i in donors], donated,
+        [ships[i] for i in receiver_order], -CB[receiver_order]
+    )
+
+    CB_after = CB.copy()
+    CB_after[donors] -= donated
+    CB_after[receivers] = 0
+    penalties_after = penalties.copy()
+    penalties_after[receivers] = 0
+
+    return {
+        'pool': [ships[i] for i in np.concatenate([donors, receiver_order])],
+        'transfers': transfers,
+        'penalty_before': float(penalties.sum()),
+        'penalty_after': float(penalties_after.sum()),
+        'penalty_lower_bound': float(lower_bound),
+        'exact': exact,
+        'surplus_left': float(CB_after[CB_after > 0].sum()),
+        'ships': [
+            {
+                'ship': ships[i],
+                'CB_before': float(CB[i]),
+                'CB_after': float(CB_after[i]),
+                'penalty_before': float(penalties[i]),
+                'penalty_after': float(penalties_after[i])
+            }
+            for i in range(len(ships))
+        ]
+    }
+###############################################################################
@@ -0,0 +1,115 @@
+import os
+import numpy as np
+import pandas as pd
+from fuel_calculations import load_fuel_density, load_wtw_factors
+from cost_kernel import trip_types
+
+# Streaming aggregation of per-voyage fuel consumption records (MRV style logs)
+# into the annual totals the optimizers and the pooling calculator take. A log is
+# a CSV or Parquet file with one row per voyage (or voyage leg) and fuel:
+#     ship, year, trip_type (intra-eu / inter-eu / berth), fuel, tonnes
+# Files are read chunk by chunk and every chunk is reduced to tonnes per
+# (ship, year, trip_type, fuel) before it is added to the running totals, so
+# memory depends on the number of ships and fuels, not on the number of rows.
+
+log_columns = ['ship', 'year', 'trip_type', 'fuel', 'tonnes']
+group_columns = ['ship', 'year', 'trip_type', 'fuel']
+
+############################## READING ##############################
+def _read_chunks(path, source_columns, chunksize):
+    if os.path.splitext(path)[1].lower() in ('.parquet', '.pq'):
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize, columns=source_columns):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, usecols=source_columns, chunksize=chunksize)
+
+def _aggregate_chunk(chunk, densities):
+    if chunk[log_columns].isna().any().any():
+        raise ValueError("Voyage logs must not have missing values.")
+    if (chunk['tonnes'] < 0).any():
+        raise ValueError("Fuel consumption must not be negative.")
+    # Reduce first, then clean up the (few) distinct labels and reduce again
+    grouped = chunk.groupby(group_columns, sort=False)['tonnes'].sum().reset_index()
+    grouped = pd.DataFrame({
+        'ship': grouped['ship'].astype(str),
+        'year': grouped['year'].astype(int),
+        'trip_type': grouped['trip_type'].astype(str).str.strip().str.lower(),
+        'fuel': grouped['fuel'].astype(str).str.strip().str.upper(),
+        'tonnes': grouped['tonnes'].astype(float)
+    })
+    unknown_trips = set(grouped['trip_type'].unique()) - set(trip_types)
+    if unknown_trips:
+        raise ValueError(f"Unknown trip types in voyage logs: {sorted(unknown_trips)}.")
+    unknown_fuels = set(grouped['fuel'].unique()) - set(densities)
+    if unknown_fuels:
+        raise ValueError(f"Fuel types {sorted(unknown_fuels)} not found in the fuel density data.")
+    return grouped.groupby(group_columns, sort=False)['tonnes'].sum()
+
+# Tonnes and energy (MJ) per ship, year, trip type and fuel over all the logs.
+# columns maps the names used in the files to ship/year/trip_type/fuel/tonnes.
+def aggregate_voyage_logs(paths, columns=None, chunksize=1_000_000, densities=None):
+    if isinstance(paths, (str, os.PathLike)):
+        paths = [paths]
+    densities = load_fuel_density() if densities is None else densities
+    renames = dict(columns or {})
+    sources = {target: source for source, target in renames.items()}
+    source_columns = [sources.get(column, column) for column in log_columns]
+
+    totals = None
+    for path in paths:
+        for chunk in _read_chunks(os.fspath(path), source_columns, chunksize):
+            grouped = _aggregate_chunk(chunk.rename(columns=renames), densities)
+            if totals is not None:
+                grouped = pd.concat([totals, grouped]).groupby(level=group_columns, sort=False).sum()
+            totals = grouped
+
+    if totals is None:
+        totals = pd.Series([], dtype=float, index=pd.MultiIndex.from_arrays([[]] * len(group_columns), names=group_columns))
+    totals = totals.sort_index().rename('tonnes').reset_index()
+    totals['energy'] = totals['tonnes'] * totals['fuel'].map(densities)
+    return totals
+###############################################################################
+
+############################## OPTIMIZER AND POOLING INPUTS ##############################
+# E_totals, fuel_amounts and selected_fuels of one ship (or the whole fleet when
+# ship is None) for one year, in the format of get_user_input_FAST
+def ship_inputs(totals, year, ship=None, densities=None):
+    densities = load_fuel_density() if densities is None else densities
+    rows = totals[totals['year'] == year]
+    if ship is not None:
+        rows = rows[rows['ship'] == ship]
+    if rows.empty:
+        raise ValueError(f"No voyage records for {'the fleet' if ship is None else ship} in {year}.")
+    tonnes = rows.groupby(['trip_type', 'fuel'])['tonnes'].sum()
+
+    fuel_amounts = {}
+    E_totals = {}
+    selected_fuels = {}
+    for trip_type in trip_types:
+        fuel_amounts[trip_type] = {fuel: float(tonnes.get((trip_type, fuel), 0.0)) for fuel in densities}
+        E_totals[trip_type] = sum(fuel_amounts[trip_type][fuel] * densities[fuel] for fuel in fuel_amounts[trip_type])
+        if trip_type != 'berth':
+            selected_fuels[trip_type] = [fuel for fuel in densities if fuel_amounts[trip_type][fuel] > 0]
+    return E_totals, fuel_amounts, selected_fuels
+
+# One entry per ship for surplus.fleet_balances. As calculate_total_Fuel_EU_Penalty,
+# each trip type's intensity is that of its fuel mass shares and the trip types are
+# weighted by energy, with Inter EU energy counted half.
+def fleet_pool_inputs(totals, year, fwind=1.0):
+    WtW_factors = load_wtw_factors()
+    rows = totals[totals['year'] == year]
+    if rows.empty:
+        raise ValueError(f"No voyage records for the fleet in {year}.")
+    rows = rows.assign(GHG=rows['tonnes'] * rows['fuel'].map(WtW_factors))
+    trips = rows.groupby(['ship', 'trip_type'])[['tonnes', 'GHG', 'energy']].sum()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        GHGi_trip = np.where(trips['tonnes'] > 0, trips['GHG'] / trips['tonnes'], 0)
+    share = np.where(trips.index.get_level_values('trip_type') == 'inter-eu', 0.5, 1.0)
+    weighted = pd.DataFrame({'E': trips['energy'] * share, 'GHGi_E': GHGi_trip * trips['energy'] * share}, index=trips.index)
+    ships = weighted.groupby(level='ship').sum()
+    return [
+        {'ship': ship, 'GHGi_actual': float(row['GHGi_E'] / row['E']), 'E_total': float(row['E']), 'year': year, 'fwind': fwind}
+        for ship, row in ships.iterrows() if row['E'] > 0
+    ]
+###############################################################################
@@ -0,0 +1,19 @@
+import numpy as np
+
+# Initial differential_evolution population around a known good point, e.g. the
+# optimum of a neighbouring year or CO2 price. Most members are Gaussian
+# perturbations of x0 (spread is a fraction of each bound's width), a fifth are
+# uniform draws to keep the search global, and the first member is x0 itself.
+def warm_start_population(x0, bounds, popsize, spread=0.05, seed=None):
+    rng = np.random.default_rng(seed)
+    lower = np.array([bound[0] for bound in bounds], dtype=float)
+    upper = np.array([bound[1] for bound in bounds], dtype=float)
+    x0 = np.clip(np.asarray(x0, dtype=float), lower, upper)
+
+    n_members = max(5, popsize * len(bounds))
+    n_uniform = n_members // 5
+    n_local = n_members - n_uniform - 1
+
+    local = x0 + rng.normal(0, spread, (n_local, len(bounds))) * (upper - lower)
+    uniform = lower + rng.random((n_uniform, len(bounds))) * (upper - lower)
+    return np.vstack([x0, np.clip(local, lower, upper), uniform])
@@ -1,69 +1,112 @@
-import pandas as pd
-import matplotlib.pyplot as plt
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from matplotlib.figure import Figure
 
-# Load the CSV data
-df = pd.read_csv('../run/total_output_results.csv')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'code'))
+from results_store import read_results
 
-# Function to plot total cost over years for different CO2 prices for each scenario
-def plot_total_cost(df, scenario_num, ops_status):
-    plt.figure(figsize=(12, 8))
-    subset = df[(df['scenario'] == scenario_num) & (df['OPS_at_berth'] == ops_status)]
-    for CO2_price in subset['CO2_price'].unique():
-        data = subset[subset['CO2_price'] == CO2_price]
-        plt.plot(data['year'], data['total_cost'], label=f'CO2 Price: {CO2_price}€')
-    plt.xlabel('Year')
-    plt.ylabel('Total Cost (€)')
-    plt.title(f'Scenario {scenario_num + 1} {"with" if ops_status else "without"} OPS: Total Cost over Years for Different CO2 Prices')
-    plt.legend()
-    plt.grid(True)
-    plt.show()
+# Plots of the sweep's results dataset: one figure per scenario, OPS status and
+# metric, with a line per CO2 price. By default every figure is shown
+# interactively; with --output they are rendered headless (plain Figure objects,
+# no pyplot or GUI backend) to files, spread over a process pool.
 
-# Function to plot EU TS penalty over years for different CO2 prices for each scenario
-def plot_eu_ts_penalty(df, scenario_num, ops_status):
-    plt.figure(figsize=(12, 8))
-    subset = df[(df['scenario'] == scenario_num) & (df['OPS_at_berth'] == ops_status)]
-    for CO2_price in subset['CO2_price'].unique():
-        data = subset[subset['CO2_price'] == CO2_price]
-        plt.plot(data['year'], data['EU_TS_penalty'], label=f'CO2 Price: {CO2_price}€')
-    plt.xlabel('Year')
-    plt.ylabel('EU TS Penalty (€)')
-    plt.title(f'Scenario {scenario_num + 1} {"with" if ops_status else "without"} OPS: EU TS Penalty over Years for Different CO2 Prices')
-    plt.legend()
-    plt.grid(True)
-    plt.show()
+# Where run/run.py writes its dataset when run from run/, whatever the working directory here
+default_results = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'run', 'optimization_results')
 
-# Function to plot FuelEU penalty over years for different CO2 prices for each scenario
-def plot_fueleu_penalty(df, scenario_num, ops_status):
-    plt.figure(figsize=(12, 8))
-    subset = df[(df['scenario'] == scenario_num) & (df['OPS_at_berth'] == ops_status)]
-    for CO2_price in subset['CO2_price'].unique():
-        data = subset[subset['CO2_price'] == CO2_price]
-        plt.plot(data['year'], data['FuelEU_penalty'], label=f'CO2 Price: {CO2_price}€')
-    plt.xlabel('Year')
-    plt.ylabel('FuelEU Penalty (€)')
-    plt.title(f'Scenario {scenario_num + 1} {"with" if ops_status else "without"} OPS: FuelEU Penalty over Years for Different CO2 Prices')
-    plt.legend()
-    plt.grid(True)
-    plt.show()
+# Column, axis label and file name of each plotted metric
+metrics = [
+    ('total_cost', 'Total Cost', 'total_cost'),
+    ('EU_ETS_penalty', 'EU TS Penalty', 'eu_ets_penalty'),
+    ('FuelEU_penalty', 'FuelEU Penalty', 'fueleu_penalty'),
+    ('OPS_penalty', 'OPS Penalty', 'ops_penalty')
+]
 
-# Function to plot OPS penalty over years for different CO2 prices for each scenario
-def plot_ops_penalty(df, scenario_num, ops_status):
-    plt.figure(figsize=(12, 8))
-    subset = df[(df['scenario'] == scenario_num) & (df['OPS_at_berth'] == ops_status)]
-    for CO2_price in subset['CO2_price'].unique():
-        data = subset[subset['CO2_price'] == CO2_price]
-        plt.plot(data['year'], data['OPS_penalty'], label=f'CO2 Price: {CO2_price}€')
-    plt.xlabel('Year')
-    plt.ylabel('OPS Penalty (€)')
-    plt.title(f'Scenario {scenario_num + 1} {"with" if ops_status else "without"} OPS: OPS Penalty over Years for Different CO2 Prices')
-    plt.legend()
-    plt.grid(True)
-    plt.show()
+# Load only the columns the plots use
+def load_results(root):
+    return read_results(root, columns=['year', 'CO2_price', 'scenario', 'OPS_at_berth'] + [column for column, _, _ in metrics])
 
-# Generate the plots for each scenario
-for scenario_num in range(4):
-    for ops_status in [True, False]:
-        plot_total_cost(df, scenario_num, ops_status)
-        plot_eu_ts_penalty(df, scenario_num, ops_status)
-        plot_fueleu_penalty(df, scenario_num, ops_status)
-        plot_ops_penalty(df, scenario_num, ops_status)
+# One task per figure: the data is grouped once, by scenario and OPS status and then
+# by CO2 price, and each task carries only its own lines
+def figure_tasks(df):
+    tasks = []
+    for (scenario_num, ops_status), subset in df.groupby(['scenario', 'OPS_at_berth'], sort=True):
+        lines = [(CO2_price, data) for CO2_price, data in subset.groupby('CO2_price', sort=False)]
+        for column, label, name in metrics:
+            tasks.append({
+                'scenario': int(scenario_num),
+                'OPS_at_berth': bool(ops_status),
+                'column': column,
+                'label': label,
+                'name': name,
+                'lines': [(CO2_price, data['year'].to_numpy(), data[column].to_numpy()) for CO2_price, data in lines]
+            })
+    return tasks
+
+def draw_figure(task, figure):
+    ax = figure.subplots()
+    for CO2_price, years, values in task['lines']:
+        ax.plot(years, values, label=f'CO2 Price: {CO2_price}€')
+    ax.set_xlabel('Year')
+    ax.set_ylabel(f"{task['label']} (€)")
+    ax.set_title(f"Scenario {task['scenario']} {'with' if task['OPS_at_berth'] else 'without'} OPS: {task['label']} over Years for Different CO2 Prices")
+    ax.legend()
+    ax.grid(True)
+    return figure
+
+def figure_path(task, output, file_format):
+    ops = 'ops' if task['OPS_at_berth'] else 'no_ops'
+    return os.path.join(output, f"scenario_{task['scenario']}_{ops}_{task['name']}.{file_format}")
+
+# figure may be a Figure reused between calls; it is cleared first
+def render_figure(task, output, file_format='png', dpi=100, figure=None):
+    path = figure_path(task, output, file_format)
+    figure = Figure(figsize=(12, 8)) if figure is None else figure
+    figure.clear()
+    # Fast zlib level for PNG: slightly bigger files, much less encoding time
+    options = {'pil_kwargs': {'compress_level': 1}} if file_format == 'png' else {}
+    draw_figure(task, figure).savefig(path, dpi=dpi, **options)
+    return path
+
+def _render_batch(tasks, output, file_format, dpi):
+    figure = Figure(figsize=(12, 8))
+    return [render_figure(task, output, file_format, dpi, figure) for task in tasks]
+
+# Render every figure to output; processes=1 renders in this process
+def render_report(df, output, file_format='png', dpi=100, processes=None):
+    os.makedirs(output, exist_ok=True)
+    tasks = figure_tasks(df)
+    processes = min(processes or os.cpu_count() or 1, len(tasks)) or 1
+    if processes == 1:
+        return _render_batch(tasks, output, file_format, dpi)
+    # A few figures per task so the worker start-up and pickling are amortised
+    batches = [tasks[i::processes] for i in range(processes)]
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        rendered = executor.map(_render_batch, batches, [output] * processes, [file_format] * processes, [dpi] * processes)
+    return sorted(path for paths in rendered for path in paths)
+
+def show_report(df):
+    import matplotlib.pyplot as plt
+    for task in figure_tasks(df):
+        draw_figure(task, plt.figure(figsize=(12, 8)))
+        plt.show()
+
+def main():
+    parser = argparse.ArgumentParser(description="Plot the costs and penalties of the sweep's results dataset.")
+    parser.add_argument('--results', default=default_results, help="Parquet dataset written by run/run.py")
+    parser.add_argument('--output', default=None, help="Render every figure to files in this directory instead of showing them")
+    parser.add_argument('--format', default='png', help="File format of the rendered figures (png, svg, pdf, ...)")
+    parser.add_argument('--dpi', type=int, default=100, help="Resolution of raster figures")
+    parser.add_argument('--processes', type=int, default=None, help="Figures rendered in parallel (default: all available cores)")
+    args = parser.parse_args()
+
+    df = load_results(args.results)
+    if args.output is None:
+        show_report(df)
+    else:
+        paths = render_report(df, args.output, args.format, args.dpi, args.processes)
+        print(f"Wrote {len(paths)} figures to {args.output}")
+
+if __name__ == "__main__":
+    main()
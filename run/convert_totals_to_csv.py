@@ -1,52 +1,30 @@
-import json
-import pandas as pd
-
-# Load JSON data
-with open('optimization_results.json', 'r') as file:
-    data = json.load(file)
-
-# Flatten the data and convert it to a DataFrame
-rows = []
-scenario_count = 0
-for entry in data:
-    scenario = entry['scenario']
-    results = entry['results']
-    year = scenario['year']
-    CO2_price = scenario['CO2_price']
-    total_cost = results.get('total_cost', 0)
-    FuelEU_penalty = results.get('FuelEU_penalty', 0)
-    EU_ETS_penalty = results.get('EU_ETS_penalty', 0)
-    OPS_cost = results.get('OPS_cost', 0)
-    OPS_penalty = results.get('OPS_penalty', 0)
-    OPS_at_berth = scenario.get('OPS_at_berth', False)
-
-    # Calculate fuel costs
-    fuel_costs = total_cost - (FuelEU_penalty + EU_ETS_penalty + OPS_cost + OPS_penalty)
-
-    # Retrieve total fuel amounts
-    fuel_amounts = results.get('fuel_amounts', {})
-
-    # Create a row for each fuel type for detailed breakdown in the CSV
-    for fuel, total_amount in fuel_amounts.items():
-        row = {
-            'year': year,
-            'CO2_price': CO2_price,
-            'total_cost': total_cost,
-            'fuel_costs': fuel_costs,
-            'EU_ETS_penalty': EU_ETS_penalty,
-            'FuelEU_penalty': FuelEU_penalty,
-            'OPS_penalty': OPS_penalty,
-            'OPS_cost': OPS_cost,
-            'fuel_type': fuel,
-            'total_fuel_amount': total_amount,
-            'scenario': scenario_count % 4 + 1,  # Add a scenario identifier (1, 2, 3, 4)
-            'OPS_at_berth': OPS_at_berth
-        }
-        rows.append(row)
-    scenario_count += 1
-
-# Create DataFrame
-df = pd.DataFrame(rows)
-
-# Save DataFrame to CSV
-df.to_csv('total_output_results.csv', index=False)
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'code'))
+from results_store import read_results
+
+# run.py streams its results into a Parquet dataset that already has one row per
+# fuel (the layout of total_output_results.csv); this exports it as that CSV.
+
+run_dir = os.path.dirname(os.path.abspath(__file__))
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the sweep's results dataset as total_output_results.csv.")
+    parser.add_argument('--results', default=os.path.join(run_dir, 'optimization_results'), help="Parquet dataset written by run.py")
+    parser.add_argument('--output', default=os.path.join(run_dir, 'total_output_results.csv'), help="CSV file to write")
+    args = parser.parse_args()
+
+    # Load the dataset
+    df = read_results(args.results)
+
+    # Scenario order of run.py: year, CO2 price, then the base scenarios without and with OPS
+    df = df.sort_values(['year', 'CO2_price', 'OPS_at_berth', 'scenario'], kind='stable')
+
+    # Save DataFrame to CSV
+    df.to_csv(args.output, index=False)
+    print(f"Wrote {len(df)} rows to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,12 @@
+import os
 import subprocess
+import sys
 
 # Combine all the inputs as a single bytes object
 inputs = b"2025\n90\n200.8\nyes\n4000\n0\n0\n40\n0\n0\n2000\n3000\n0\n0\n0\n0\nno\n10\n500\n0\n0\n0\n0\n"
 
 p = subprocess.Popen(
-    "python C:\\Users\\Lenovo\\Desktop\\skatouts9\\maritime_optimization\\code\\optimize2.py", 
-    shell=True, 
+    [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'code', 'optimize2.py')],
     stdin=subprocess.PIPE,
     stdout=subprocess.PIPE,
     stderr=subprocess.PIPE
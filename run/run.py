@@ -1,58 +1,11 @@
-import subprocess
+import argparse
 import json
-import ast
-
-def run_scenario(scenario):
-    cmd = ['python', '../code/optimize.py']
-    process = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-    inputs = generate_input_from_scenario(scenario)
-    output, errors = process.communicate(input=inputs)
-    if process.returncode != 0:
-        print("Error:", errors)
-    return parse_output(output)
-
-def generate_input_from_scenario(scenario):
-    inputs = (
-        f"{scenario['year']}\n"
-        f"{scenario['CO2_price']}\n"
-        f"{scenario['cost_per_MWh']}\n"
-        f"{scenario['Etotal_Intra']}\n"
-        f"{scenario['MDO_tonnes_Intra']}\n"
-        f"{len(scenario['fuel_types_Intra'])}\n" + "\n".join(scenario['fuel_types_Intra']) + "\n"
-        f"{scenario['Etotal_Inter']}\n"
-        f"{scenario['MDO_tonnes_Inter']}\n"
-        f"{len(scenario['fuel_types_Inter'])}\n" + "\n".join(scenario['fuel_types_Inter']) + "\n"
-        f"{scenario['Etotal_Berth']}\n"
-    )
-    if scenario.get('OPS_at_berth', False):
-        inputs += "yes\n" + f"{scenario['total_installed_power']}\n" + f"{scenario['established_power_demand']}\n" + f"{scenario['hours_at_berth']}\n"
-    else:
-        inputs += "no\n"
-    return inputs
-
-def parse_output(output):
-    results = {}
-    lines = output.splitlines()
-
-    for line in lines:
-        line = line.strip()
-
-        if "Optimal fuel amounts (tonnes)" in line:
-            results["fuel_amounts"] = ast.literal_eval(line.split(':', 1)[1].strip())
-        elif "Total CB" in line:
-            results["Total_CB"] = float(line.split(':', 1)[1].strip())
-        elif "Final FuelEU penalty" in line:
-            results["FuelEU_penalty"] = float(line.split(':', 1)[1].strip())
-        elif "Final EU ETS penalty" in line:
-            results["EU_ETS_penalty"] = float(line.split(':', 1)[1].strip())
-        elif "OPS cost" in line:
-            results["OPS_cost"] = float(line.split(':', 1)[1].strip())
-        elif "OPS penalty" in line:
-            results["OPS_penalty"] = float(line.split(':', 1)[1].strip())
-        elif "Optimal total cost" in line:
-            results["total_cost"] = float(line.split(':', 1)[1].strip())
-
-    return results
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'code'))
+from scenario_runner import run_scenarios
+from result_cache import clear_result_cache
 
 def calculate_total_costs_and_penalties(results):
     total_costs = 0
@@ -164,31 +117,59 @@ base_scenarios = [
     }
 ]
 
-# Results list
-results = []
-
-# Constant cost per MWh
-cost_per_MWh = 200.8
-
-# Iterate over years and CO2 prices
-for year in range(2025, 2051, 5):
-    for CO2_price in range(90, 191, 20):
-        scenario_count = 1
-        for base_scenario in base_scenarios:
-            if scenario_count > 4:
-                scenario_count = 1
-            scenario = {'year': year, 'CO2_price': CO2_price, 'cost_per_MWh': cost_per_MWh, **base_scenario}
-            scenario_desc = "with OPS" if scenario.get("OPS_at_berth", False) else "without OPS"
-            print(f"Running scenario {scenario_count} for year {year} with CO2 price {CO2_price} {scenario_desc}")
-            scenario_count += 1
-            scenario_result = run_scenario(scenario)  # Running scenario
-            results.append({
-                'scenario': scenario,
-                'results': scenario_result
-            })
-
-# Save the results to a JSON file
-with open('optimization_results.json', 'w') as f:
-    json.dump(results, f, indent=4)
-
-print("All scenarios have been run. Check 'optimization_results.json' for the detailed results.")
+def build_scenarios(base_scenarios, cost_per_MWh):
+    # Iterate over years and CO2 prices
+    scenarios = []
+    for year in range(2025, 2051, 5):
+        for CO2_price in range(90, 191, 20):
+            for base_scenario in base_scenarios:
+                scenarios.append({'year': year, 'CO2_price': CO2_price, 'cost_per_MWh': cost_per_MWh, **base_scenario})
+    return scenarios
+
+def print_progress(index, scenario):
+    scenario_count = index % len(base_scenarios) % 4 + 1
+    scenario_desc = "with OPS" if scenario.get("OPS_at_berth", False) else "without OPS"
+    print(f"Solved scenario {scenario_count} for year {scenario['year']} with CO2 price {scenario['CO2_price']} {scenario_desc}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the year x CO2 price x base scenario sweep.")
+    parser.add_argument('--processes', type=int, default=None, help="Scenarios solved in parallel (default: all available cores)")
+    parser.add_argument('--seed', type=int, default=0, help="Base seed mixed into every scenario's seed")
+    parser.add_argument('--output', default='optimization_results', help="Parquet dataset the results are written to (replaced on every run)")
+    parser.add_argument('--overwrite', action='store_true', help="Replace --output even if it is not a results dataset from an earlier run")
+    parser.add_argument('--json', action='store_true', help="Also write the full results list to optimization_results.json")
+    parser.add_argument('--no-cache', action='store_true', help="Solve every scenario even if its result is cached")
+    parser.add_argument('--clear-cache', action='store_true', help="Empty the result cache before the sweep")
+    args = parser.parse_args()
+    # pyarrow is only loaded once there are results to write
+    from results_store import append_results, reset_results
+
+    # Start from an empty dataset, then append each batch of results as it comes in
+    try:
+        reset_results(args.output, overwrite=args.overwrite)
+    except ValueError as error:
+        parser.error(str(error))
+
+    if args.clear_cache:
+        print(f"Removed {clear_result_cache()} cached results.")
+
+    # Constant cost per MWh
+    cost_per_MWh = 200.8
+
+    def save_batch(entries):
+        append_results(args.output, entries)
+
+    # Independent scenarios are spread over a process pool
+    # Results are streamed into the dataset batch by batch and only kept in memory for --json
+    results = run_scenarios(build_scenarios(base_scenarios, cost_per_MWh), progress=print_progress,
+                            processes=args.processes, base_seed=args.seed, on_batch=save_batch,
+                            use_cache=not args.no_cache, keep_results=args.json)
+
+    if args.json:
+        with open('optimization_results.json', 'w') as f:
+            json.dump(results, f, indent=4)
+
+    print(f"All scenarios have been run. Check '{args.output}' for the detailed results.")
+
+if __name__ == "__main__":
+    main()